@@ -0,0 +1,96 @@
+"""Time storing synthetic listings: the original per-row INSERT vs ListingDatabase.upsert_listings.
+
+Each is run twice over the same URLs, as two scrapes of the same ads would
+be; the row counts show the duplicates the per-row INSERT leaves behind.
+
+Usage: python benchmarks/bench_database.py [--rows 1000000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from classified_scrapper import ListingDatabase  # noqa: E402
+
+LOCATIONS = ['Warszawa, Mokotów', 'Kraków', 'Gdańsk', 'Poznań, Jeżyce', 'Wrocław', 'Łódź']
+
+
+def synthetic_listings(count, scraped_date, seed=0):
+    """Return `count` listing records with random URLs; the same seed gives the same URLs."""
+    rng = random.Random(seed)
+    listings = []
+    for i in range(count):
+        area = rng.randint(20, 200)
+        price = rng.randint(100, 3000) * 1000
+        listings.append({
+            'title': f"Mieszkanie {area} m2 nr {i}", 'location': rng.choice(LOCATIONS),
+            'price': f"{price:,} zł".replace(',', ' '), 'price_value': float(price),
+            'url': f"https://www.olx.pl/d/oferta/{rng.getrandbits(64):016x}.html", 'date_posted': "Dzisiaj",
+            'category': 'real estate', 'square_meters': float(area), 'price_per_sqm': price / area,
+            'search_phrase': "mieszkanie", 'scraped_date': scraped_date,
+        })
+    return listings
+
+
+def insert_per_row(conn, listings):
+    """The original save_to_database: one INSERT per listing, one commit at the end."""
+    cursor = conn.cursor()
+    for listing in listings:
+        cursor.execute('''
+        INSERT INTO listings (
+            title, location, price, price_value, url, date_posted,
+            category, square_meters, price_per_sqm, search_phrase, scraped_date
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', tuple(listing[column] for column in ListingDatabase.LISTING_COLUMNS))
+    conn.commit()
+
+
+def bench_per_row(path, scrapes):
+    """Store each scrape with insert_per_row into a table without a URL index, as before."""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE listings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, location TEXT, price TEXT, price_value REAL,
+        url TEXT, date_posted TEXT, category TEXT, square_meters REAL, price_per_sqm REAL,
+        search_phrase TEXT, scraped_date TEXT
+    )
+    ''')
+    for run, listings in enumerate(scrapes, 1):
+        started = time.perf_counter()
+        insert_per_row(conn, listings)
+        rows = conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+        print(f"per-row INSERT, scrape {run}: {time.perf_counter() - started:7.2f}s, {rows:,} rows in table")
+    conn.close()
+
+
+def bench_upsert(path, scrapes):
+    """Store each scrape with ListingDatabase.upsert_listings."""
+    db = ListingDatabase(path)
+    db.connect()
+    for run, listings in enumerate(scrapes, 1):
+        started = time.perf_counter()
+        db.upsert_listings(listings)
+        rows = db.conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0]
+        print(f"upsert,         scrape {run}: {time.perf_counter() - started:7.2f}s, {rows:,} rows in table")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="listings per scrape")
+    args = parser.parse_args()
+
+    scrapes = [synthetic_listings(args.rows, "2025-05-07 10:00:00"), synthetic_listings(args.rows, "2025-05-14 10:00:00")]
+    with tempfile.TemporaryDirectory() as directory:
+        bench_per_row(os.path.join(directory, "per_row.db"), scrapes)
+        bench_upsert(os.path.join(directory, "upsert.db"), scrapes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Micro-benchmark of price, area and category extraction on synthetic titles and prices.
+
+Compares the module-level compiled helpers with the per-call regex code
+they replaced, and reports how often both give the same result. They
+differ on purpose for prices like "1.200.000 zł", which the old code
+could not parse.
+
+Usage: python benchmarks/bench_extraction.py [--count 1000000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classified_scrapper import classify_category, parse_price, parse_square_meters  # noqa: E402
+
+WORDS = ['Mieszkanie', 'Dom', 'Laptop', 'Rower', 'Sofa', 'Kurtka', 'Zegarek', 'Telefon', 'Działka', 'Praca',
+         'nowy', 'okazja', 'Warszawa', 'Kraków', 'stan bardzo dobry', 'z balkonem', 'pilnie']
+UNITS = ['m2', ' m2', ' mkw', ' m²', ' metrów', 'M2']
+
+
+def old_price(price_text):
+    """Price parsing before the compiled helpers."""
+    try:
+        price_digits = re.sub(r'[^\d.]', '', price_text.replace(',', '.'))
+        if price_digits:
+            return float(price_digits)
+        return 0.0
+    except:  # noqa: E722
+        return 0.0
+
+
+def old_square_meters(text):
+    """Area parsing before the compiled helpers: one fresh pattern per unit."""
+    try:
+        patterns = [
+            r'(\d+[\.,]?\d*)\s*m2',
+            r'(\d+[\.,]?\d*)\s*mkw',
+            r'(\d+[\.,]?\d*)\s*m²',
+            r'(\d+[\.,]?\d*)\s*metr[óy]w'
+        ]
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                return float(match.group(1).replace(',', '.'))
+        return 0.0
+    except:  # noqa: E722
+        return 0.0
+
+
+def old_category(title):
+    """Category matching before the compiled helpers: a dict per call and a scan per keyword."""
+    title_lower = title.lower()
+    categories = {
+        'electronics': ['laptop', 'komputer', 'telefon', 'smartfon', 'tablet', 'tv', 'telewizor', 'elektronika'],
+        'vehicles': ['samochód', 'auto', 'samochod', 'pojazd', 'motocykl', 'skuter', 'rower'],
+        'real estate': ['mieszkanie', 'dom', 'działka', 'dzialka', 'nieruchomość', 'nieruchomosc'],
+        'jobs': ['praca', 'etat', 'zatrudnienie', 'zatrudnię', 'zatrudnie', 'job'],
+        'services': ['usługa', 'usluga', 'usługi', 'uslugi', 'serwis'],
+        'fashion': ['ubranie', 'odzież', 'odziez', 'buty', 'kurtka', 'spodnie', 'sukienka'],
+        'furniture': ['meble', 'stół', 'stol', 'krzesło', 'krzeslo', 'szafa', 'łóżko', 'lozko', 'sofa'],
+        'other': []
+    }
+    for category, keywords in categories.items():
+        if any(keyword in title_lower for keyword in keywords):
+            return category
+    return 'other'
+
+
+def synthetic_data(count, seed=0):
+    """Return `count` titles and `count` price texts in the formats seen on OLX and Allegro."""
+    rng = random.Random(seed)
+    titles, prices = [], []
+    for _ in range(count):
+        words = rng.sample(WORDS, 3)
+        if rng.random() < 0.6:
+            area = rng.choice([str(rng.randint(15, 250)), f"{rng.randint(15, 250)},{rng.randint(1, 9)}"])
+            words.insert(rng.randint(0, 3), area + rng.choice(UNITS))
+        titles.append(' '.join(words))
+        value = rng.randint(10, 2_000_000)
+        prices.append(rng.choice([
+            f"{value:,} zł".replace(',', ' '), f"{value},{rng.randint(0, 99):02d} zł", f"{value} zł do negocjacji",
+            f"{value:,} zł".replace(',', '.'), "Zamienię",
+        ]))
+    return titles, prices
+
+
+def bench(name, old, new, inputs):
+    """Time both functions over the inputs and print the speed-up and agreement."""
+    started = time.perf_counter()
+    old_results = [old(text) for text in inputs]
+    old_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    new_results = [new(text) for text in inputs]
+    new_seconds = time.perf_counter() - started
+    same = sum(a == b for a, b in zip(old_results, new_results)) / len(inputs)
+    print(f"{name:9} {old_seconds:6.2f}s -> {new_seconds:6.2f}s ({old_seconds / new_seconds:.1f}x), "
+          f"same result {same:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=1_000_000, help="synthetic titles and prices")
+    args = parser.parse_args()
+
+    titles, prices = synthetic_data(args.count)
+    bench("area", old_square_meters, parse_square_meters, titles)
+    bench("price", old_price, parse_price, prices)
+    bench("category", old_category, classify_category, titles)
+
+
+if __name__ == "__main__":
+    main()
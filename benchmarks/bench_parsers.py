@@ -0,0 +1,57 @@
+"""Listings per second of each parser backend on large pages built from the saved fixtures.
+
+Usage: python benchmarks/bench_parsers.py [--cards 2000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import lxml.html
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from classified_scrapper import SITE_ADAPTERS  # noqa: E402
+
+FIXTURES = {'olx': 'olx_search.html', 'allegro': 'allegro_search.html'}
+
+
+def build_page(site, cards):
+    """Return a results page holding `cards` listing cards, repeating the fixture's cards."""
+    with open(os.path.join(ROOT, 'tests', 'fixtures', FIXTURES[site]), encoding='utf-8') as f:
+        root = lxml.html.document_fromstring(f.read())
+    adapter = SITE_ADAPTERS[site]
+    markup = [lxml.html.tostring(card, encoding='unicode') for card in adapter.card_xpath(root)]
+    body = ''.join(markup[i % len(markup)] for i in range(cards))
+    return f'<html><body><div>{body}</div></body></html>'
+
+
+def bench(extract, page, repeat):
+    """Return the best time of `repeat` extractions and the cards extracted."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cards = extract(page)
+        best = min(best, time.perf_counter() - started)
+    return best, cards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cards', type=int, default=2000, help="listing cards per page")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per backend; the best is reported")
+    args = parser.parse_args()
+
+    for site, adapter in ((site, SITE_ADAPTERS[site]) for site in FIXTURES):
+        page = build_page(site, args.cards)
+        results = {backend: bench(extract, page, args.repeat) for backend, extract in adapter.extractors.items()}
+        cards = [result[1] for result in results.values()]
+        same = all(other == cards[0] for other in cards[1:])
+        for backend, (seconds, extracted) in results.items():
+            print(f"{site:8} {backend:12} {len(extracted) / seconds:10,.0f} listings/s  ({seconds * 1000:.1f} ms/page)")
+        print(f"{site:8} identical output: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,21 @@
 import time
 import random
+import asyncio
+import threading
+import queue
+import concurrent.futures
+import hashlib
+import bisect
+import contextlib
+import json
+import socket
+import sys
+import argparse
+import math
+import gzip
+import shutil
+import zlib
 import pandas as pd
-import matplotlib.pyplot as plt
 import seaborn as sns
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -9,24 +23,2479 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 import re
 import os
 import numpy as np
 from webdriver_manager.chrome import ChromeDriverManager
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import matplotlib
+from matplotlib.figure import Figure
 import sqlite3
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote, quote_plus, urlparse, urlunparse, urlencode, parse_qsl
 matplotlib.use('Agg')  # Use non-interactive backend
 
+
+# Path of the resolved chromedriver binary, persisted so runs skip the installer
+DRIVER_PATH_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.chromedriver_path')
+_driver_path = None
+# Browser pool workers may resolve the driver at the same time
+_driver_path_lock = threading.Lock()
+
+
+def get_driver_path(stale=None):
+    """Return the chromedriver path, running ChromeDriverManager only when nothing usable is cached.
+
+    `stale` is a path Chrome failed to start with (e.g. a driver cached before
+    a Chrome update); it is not reused, so the driver is resolved and cached again.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path and _driver_path != stale and os.path.exists(_driver_path):
+            return _driver_path
+
+        if os.path.exists(DRIVER_PATH_CACHE):
+            with open(DRIVER_PATH_CACHE) as f:
+                cached_path = f.read().strip()
+            if cached_path and cached_path != stale and os.path.exists(cached_path):
+                _driver_path = cached_path
+                return _driver_path
+
+        _driver_path = ChromeDriverManager().install()
+        try:
+            with open(DRIVER_PATH_CACHE, 'w') as f:
+                f.write(_driver_path)
+        except OSError as e:
+            print(f"Could not cache chromedriver path: {e}")
+        return _driver_path
+
+
+# URL patterns (CDP wildcards) the browser never downloads: listings are read from the DOM text only
+DEFAULT_BLOCKLIST = [
+    # Images, including the extension-less CDN URLs used by OLX and Allegro
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*",
+    "*olxcdn.com/v1/files/*", "*allegroimg.com/*",
+    # Fonts and media
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*", "*.mp4*", "*.webm*", "*.mp3*",
+    # Third-party ads and trackers
+    "*doubleclick.net*", "*googlesyndication.com*", "*googletagmanager.com*", "*google-analytics.com*",
+    "*googleadservices.com*", "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*criteo.com*",
+    "*criteo.net*", "*adnxs.com*", "*gemius.pl*", "*scorecardresearch.com*", "*rtbhouse.com*",
+    "*taboola.com*", "*clarity.ms*", "*tiktok.com*",
+]
+
+# Rough transfer size per blocked request by resource type, used to estimate bytes saved
+ESTIMATED_RESOURCE_BYTES = {
+    'Image': 30_000, 'Media': 250_000, 'Font': 35_000, 'Script': 25_000, 'Stylesheet': 15_000,
+}
+
+
+class ResourceBlocker:
+    """Block resource downloads in Chrome via CDP and count what was blocked and downloaded.
+
+    Counters are read from Chrome's performance log after every page, so they
+    are shared safely by all drivers of a BrowserWorkerPool.
+    """
+
+    def __init__(self, blocklist=None, estimated_bytes=None):
+        """Use the given URL patterns, or DEFAULT_BLOCKLIST."""
+        self.blocklist = list(DEFAULT_BLOCKLIST if blocklist is None else blocklist)
+        self.estimated_bytes = estimated_bytes or ESTIMATED_RESOURCE_BYTES
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.requests = 0
+        self.bytes_downloaded = 0
+        self.blocked = {}
+
+    def configure(self, chrome_options):
+        """Turn on the performance log the counters are read from."""
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    def install(self, driver):
+        """Start blocking the configured URL patterns in a freshly started driver."""
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocklist})
+
+    def collect(self, driver):
+        """Drain the driver's performance log into the counters; call once per loaded page."""
+        try:
+            entries = driver.get_log('performance')
+        except Exception as e:
+            print(f"Could not read browser network log: {e}")
+            return
+        
+        requests = 0
+        downloaded = 0
+        blocked = {}
+        for entry in entries:
+            message = json.loads(entry['message'])['message']
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                requests += 1
+            elif method == 'Network.loadingFinished':
+                downloaded += params.get('encodedDataLength', 0)
+            elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+                resource_type = params.get('type', 'Other')
+                blocked[resource_type] = blocked.get(resource_type, 0) + 1
+        
+        with self.lock:
+            self.pages += 1
+            self.requests += requests
+            self.bytes_downloaded += downloaded
+            for resource_type, count in blocked.items():
+                self.blocked[resource_type] = self.blocked.get(resource_type, 0) + count
+
+    def stats(self):
+        """Return page, request and byte counters, with bytes saved estimated per blocked type."""
+        with self.lock:
+            blocked = dict(self.blocked)
+            saved = sum(self.estimated_bytes.get(resource_type, 5_000) * count
+                        for resource_type, count in blocked.items())
+            return {
+                'pages': self.pages,
+                'requests': self.requests,
+                'blocked_requests': sum(blocked.values()),
+                'blocked_by_type': blocked,
+                'bytes_downloaded': self.bytes_downloaded,
+                'estimated_bytes_saved': saved,
+            }
+
+    def print_stats(self):
+        """Print what blocking saved during the run."""
+        stats = self.stats()
+        if not stats['pages']:
+            return
+        print("\nBrowser resource blocking:")
+        print(f"  {stats['pages']} pages, {stats['requests']} requests, "
+              f"{stats['bytes_downloaded'] / 1024 / stats['pages']:.0f} KB downloaded per page")
+        by_type = ', '.join(f"{resource_type} {count}" for resource_type, count in sorted(stats['blocked_by_type'].items()))
+        print(f"  {stats['blocked_requests']} requests blocked ({by_type or 'none'}), "
+              f"~{stats['estimated_bytes_saved'] / 1024 / 1024:.1f} MB saved (estimated)")
+
+
+def create_driver(user_agent, blocker=None):
+    """Launch a headless Chrome driver with the given user agent, blocking resources if a blocker is given."""
+    chrome_options = Options()
+    # Run in headless mode - comment out if you want to see the browser
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--disable-notifications")
+    chrome_options.add_argument(f"user-agent={user_agent}")
+    
+    # Additional options to avoid detection
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option("useAutomationExtension", False)
+    if blocker:
+        blocker.configure(chrome_options)
+    
+    driver_path = get_driver_path()
+    try:
+        driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options)
+    except Exception as e:
+        # The cached driver may not match an updated Chrome: resolve it again and retry once
+        print(f"Chrome failed to start with {driver_path}, resolving chromedriver again: {e}")
+        driver = webdriver.Chrome(service=Service(get_driver_path(stale=driver_path)), options=chrome_options)
+    
+    # Modify navigator properties to avoid detection
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    if blocker:
+        blocker.install(driver)
+    return driver
+
+
+class Metrics:
+    """Counters, histograms and per-stage timings of a run.
+
+    Every stage timing (see time() and stage_timer) goes into the
+    stage_seconds histogram, labelled with the stage. Snapshots can be
+    written as JSON lines or in the Prometheus text format. Safe to record
+    from several crawl threads at once.
+    """
+
+    # Histogram buckets (upper bounds) for durations in seconds
+    TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    # Prefix of every exported metric name
+    PREFIX = "scraper_"
+
+    def __init__(self, labels=None):
+        """Start empty; labels (e.g. the site) are added to every exported series."""
+        self.labels = labels or {}
+        self.lock = threading.Lock()
+        # (name, sorted label items) -> value, or histogram state
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=TIME_BUCKETS, **labels):
+        """Record a value in a histogram; its buckets are fixed by the first observation."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': tuple(buckets), 'counts': [0] * (len(buckets) + 1),
+                                                    'sum': 0.0, 'count': 0}
+            histogram['counts'][bisect.bisect_left(histogram['buckets'], value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextlib.contextmanager
+    def time(self, stage, **labels):
+        """Context manager recording how long its block took as a stage timing."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - started, stage=stage, **labels)
+
+    def stage_totals(self):
+        """Return {stage: (count, total seconds)}, summed over any other labels."""
+        totals = {}
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                if name == 'stage_seconds':
+                    stage = dict(labels)['stage']
+                    count, seconds = totals.get(stage, (0, 0.0))
+                    totals[stage] = (count + histogram['count'], seconds + histogram['sum'])
+        return totals
+
+    def print_summary(self):
+        """Print where the time went per stage, and the counters."""
+        for stage, (count, seconds) in sorted(self.stage_totals().items(), key=lambda item: -item[1][1]):
+            print(f"{stage}: {seconds:.2f}s in {count} calls ({seconds / count * 1000:.1f} ms avg)")
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for (name, labels), value in counters:
+            label_text = ', '.join(f"{key}={label}" for key, label in labels)
+            print(f"{name}{' (' + label_text + ')' if label_text else ''}: {value:g}")
+
+    def records(self):
+        """Return every series as a dict: type, name, labels and value, or count, sum and buckets."""
+        with self.lock:
+            counters = list(self.counters.items())
+            histograms = [(key, dict(histogram, counts=list(histogram['counts'])))
+                          for key, histogram in self.histograms.items()]
+        records = [
+            {'type': 'counter', 'name': name, 'labels': {**self.labels, **dict(labels)}, 'value': value}
+            for (name, labels), value in counters
+        ]
+        for (name, labels), histogram in histograms:
+            cumulative = np.cumsum(histogram['counts']).tolist()
+            records.append({
+                'type': 'histogram', 'name': name, 'labels': {**self.labels, **dict(labels)},
+                'count': histogram['count'], 'sum': histogram['sum'],
+                'buckets': {**{str(bound): count for bound, count in zip(histogram['buckets'], cumulative)},
+                            '+Inf': cumulative[-1]},
+            })
+        return records
+
+    def write_jsonl(self, path, run_id=None):
+        """Append a snapshot to a JSON lines file, one series per line."""
+        stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with open(path, 'a', encoding='utf-8') as f:
+            for record in self.records():
+                f.write(json.dumps({'time': stamp, 'run_id': run_id, **record}, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    def _prometheus_labels(labels):
+        """Format labels as {name="value",...} with Prometheus escaping."""
+        if not labels:
+            return ""
+        escaped = (
+            (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for key, value in labels.items()
+        )
+        return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+    def to_prometheus(self):
+        """Return a snapshot in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+        for record in sorted(self.records(), key=lambda record: (record['name'], sorted(record['labels'].items()))):
+            name = self.PREFIX + record['name'] + ('_total' if record['type'] == 'counter' else '')
+            if name not in typed:
+                lines.append(f"# TYPE {name} {record['type']}")
+                typed.add(name)
+            labels = record['labels']
+            if record['type'] == 'counter':
+                lines.append(f"{name}{self._prometheus_labels(labels)} {record['value']:g}")
+                continue
+            for bound, count in record['buckets'].items():
+                lines.append(f"{name}_bucket{self._prometheus_labels({**labels, 'le': bound})} {count}")
+            lines.append(f"{name}_sum{self._prometheus_labels(labels)} {record['sum']:.6f}")
+            lines.append(f"{name}_count{self._prometheus_labels(labels)} {record['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write a snapshot in Prometheus text format, replacing the file in one step (for textfile collectors)."""
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+
+def stage_timer(metrics, stage, **labels):
+    """Return metrics.time(stage) or, without metrics, a context manager that records nothing."""
+    return metrics.time(stage, **labels) if metrics else contextlib.nullcontext()
+
+
+# Number of listing cards and of network resources loaded so far, read in one round trip
+READINESS_SCRIPT = """
+return [
+    document.readyState,
+    document.querySelectorAll(arguments[0]).length,
+    performance.getEntriesByType('resource').length,
+    arguments[1] ? document.querySelectorAll(arguments[1]).length : 0
+];
+"""
+
+
+def wait_until_ready(driver, listing_selector, previous_url=None, old_card=None, timeout=15, settle=0.5,
+                     poll=0.1, empty_selector=None):
+    """Wait until a results page is ready instead of sleeping a fixed time.
+
+    The page counts as ready once it is a new page (the URL differs from
+    previous_url or old_card has gone stale), the document has loaded, at
+    least one listing card (or the site's empty-results message, matched by
+    empty_selector) exists, and neither the card count nor the number of
+    loaded network resources has changed for `settle` seconds. Returns the
+    seconds waited, or None if the page was not ready within `timeout`.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    
+    # Pagination: wait for navigation away from the old page first
+    while previous_url is not None or old_card is not None:
+        if previous_url is not None and driver.current_url != previous_url:
+            break
+        if old_card is not None:
+            try:
+                old_card.is_enabled()
+            except StaleElementReferenceException:
+                break
+        if time.monotonic() > deadline:
+            print("Warning: Page did not change in time. Continuing anyway...")
+            return None
+        time.sleep(poll)
+    
+    last_state = None
+    stable_since = time.monotonic()
+    while time.monotonic() < deadline:
+        ready_state, cards, resources, empty = driver.execute_script(READINESS_SCRIPT, listing_selector, empty_selector)
+        state = (cards, resources, empty)
+        if state != last_state:
+            last_state = state
+            stable_since = time.monotonic()
+        elif ready_state == 'complete' and (cards or empty) and time.monotonic() - stable_since >= settle:
+            return time.monotonic() - started
+        time.sleep(poll)
+    
+    print("Warning: Could not confirm listings loaded in browser. Continuing anyway...")
+    return None
+
+
+def load_page(driver, url, listing_selector, blocker=None, metrics=None, empty_selector=None):
+    """Load a URL in the driver, wait until its listings are ready and return the page source.
+
+    A page showing the empty-results message (empty_selector) is ready too.
+    With metrics, the navigation, wait and page_source stages are timed.
+    """
+    with stage_timer(metrics, 'navigation'):
+        driver.get(url)
+    with stage_timer(metrics, 'wait'):
+        wait_until_ready(driver, listing_selector, empty_selector=empty_selector)
+    if blocker:
+        blocker.collect(driver)
+    with stage_timer(metrics, 'page_source'):
+        return driver.page_source
+
+
+class HttpFetcher:
+    """Fetch pages over a pooled keep-alive HTTP session instead of a browser."""
+
+    def __init__(self, user_agent, pool_size=10, timeout=15):
+        """Create a session whose connections are reused across requests."""
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "pl-PL,pl;q=0.9,en;q=0.8",
+            "Connection": "keep-alive"
+        })
+
+    def get(self, url, headers=None):
+        """Request a URL; returns the response for 200, 304 (Not Modified) and block statuses, otherwise None."""
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code not in (200, 304) + BLOCK_STATUSES:
+                print(f"HTTP {response.status_code} for {url}")
+                return None
+            # Both sites serve UTF-8; requests assumes Latin-1 when no charset is sent
+            if 'charset' not in response.headers.get('Content-Type', ''):
+                response.encoding = 'utf-8'
+            return response
+        except requests.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            return None
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+
+class PageCache:
+    """On-disk cache of fetched pages with TTL, LRU size limit and HTTP revalidation.
+
+    Pages are stored gzip-compressed under the SHA-256 of their normalized URL;
+    an SQLite index in the cache directory tracks validators, age and last use.
+    """
+
+    def __init__(self, directory="page_cache", ttl=3600, max_bytes=500 * 1024 * 1024):
+        """Open (or create) the cache; entries older than ttl seconds must be revalidated."""
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS pages (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            size INTEGER NOT NULL
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)')
+        self.conn.commit()
+
+    @staticmethod
+    def normalize_url(url):
+        """Normalize a URL so equivalent spellings share one cache entry."""
+        parts = urlparse(url)
+        netloc = parts.netloc.lower()
+        if (parts.scheme == 'http' and netloc.endswith(':80')) or (parts.scheme == 'https' and netloc.endswith(':443')):
+            netloc = netloc.rsplit(':', 1)[0]
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunparse((parts.scheme.lower(), netloc, parts.path or '/', '', query, ''))
+
+    def _key(self, url):
+        """Return the content address of a URL."""
+        return hashlib.sha256(self.normalize_url(url).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        """Return the file holding a cached page."""
+        return os.path.join(self.directory, key[:2], f"{key}.html.gz")
+
+    def get(self, url):
+        """Return the cached entry for a URL as a dict (with 'html' and 'fresh'), or None."""
+        key = self._key(url)
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, fetched_at FROM pages WHERE key = ?', (key,)
+            ).fetchone()
+            if not row:
+                return None
+            try:
+                with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+                    html = f.read()
+            except OSError:
+                # File lost or corrupt: forget the entry
+                with self.conn:
+                    self.conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+                return None
+            with self.conn:
+                self.conn.execute('UPDATE pages SET last_access = ? WHERE key = ?', (time.time(), key))
+        return {
+            'html': html,
+            'etag': row[0],
+            'last_modified': row[1],
+            'fresh': time.time() - row[2] < self.ttl
+        }
+
+    @staticmethod
+    def validators(entry):
+        """Return conditional request headers for a cached entry."""
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, html, etag=None, last_modified=None):
+        """Store a page, then evict least recently used pages beyond max_bytes."""
+        key = self._key(url)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock:
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                f.write(html)
+            now = time.time()
+            with self.conn:
+                self.conn.execute('''
+                INSERT OR REPLACE INTO pages (key, url, etag, last_modified, fetched_at, last_access, size)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (key, self.normalize_url(url), etag, last_modified, now, now, os.path.getsize(path)))
+            self._evict()
+
+    def touch(self, url):
+        """Mark a cached page as fresh again after a 304 Not Modified."""
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE pages SET fetched_at = ?, last_access = ? WHERE key = ?',
+                              (time.time(), time.time(), self._key(url)))
+
+    def _evict(self):
+        """Delete least recently used pages until the cache fits in max_bytes."""
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.conn.execute('SELECT key, size FROM pages ORDER BY last_access'):
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        with self.conn:
+            self.conn.executemany('DELETE FROM pages WHERE key = ?', [(key,) for key in evicted])
+        for key in evicted:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def close(self):
+        """Close the cache index."""
+        self.conn.close()
+
+
+# Responses that mean the site is throttling or blocking us
+BLOCK_STATUSES = (403, 429, 503)
+# How many times a blocked request is retried after the limiter's backoff pause
+BLOCK_RETRIES = 2
+# Text of challenge pages served instead of results (checked only when no listings are present)
+BLOCK_MARKER = re.compile(r'captcha|are you a robot|jeste[sś] robotem|cf-challenge|access denied', re.IGNORECASE)
+
+
+class AdaptiveRateLimiter:
+    """Per-host request pacing that adapts to how the server responds (AIMD).
+
+    Every healthy response raises a host's rate by `increase` requests per
+    second up to max_rate; a block (429/403/503 or a captcha page) halves it
+    down to min_rate and pauses the host for `backoff` seconds, doubling for
+    consecutive blocks. Intervals get `jitter` (a fraction, 0 disables) of
+    random spread so requests don't arrive on an exact beat. An initial rate
+    above max_rate raises max_rate to it, so a fast start is never cut back.
+    """
+
+    def __init__(self, initial_rate=1.0, min_rate=0.05, max_rate=5.0, increase=0.1, decrease=0.5,
+                 backoff=30.0, jitter=0.3):
+        """Configure rates in requests per second and the backoff/jitter policy."""
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, initial_rate)
+        self.initial_rate = max(min_rate, initial_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff = backoff
+        self.jitter = jitter
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def _host(self, url):
+        """Return the state of a URL's host, creating it on first use."""
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {
+                'rate': self.initial_rate, 'next_slot': 0.0, 'consecutive_blocks': 0,
+                'requests': 0, 'successes': 0, 'backoff_events': 0, 'waited': 0.0
+            }
+        return self.hosts[host]
+
+    def wait(self, url):
+        """Sleep until the URL's host may be requested again, reserving the next slot."""
+        with self.lock:
+            state = self._host(url)
+            now = time.monotonic()
+            slot = max(now, state['next_slot'])
+            interval = 1.0 / state['rate']
+            if self.jitter:
+                interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+            state['next_slot'] = slot + interval
+            state['requests'] += 1
+            state['waited'] += slot - now
+        if slot > now:
+            time.sleep(slot - now)
+        return slot - now
+
+    def record(self, url, status=200, blocked=False, retry_after=None):
+        """Adjust the host's rate after a response; returns True if it was treated as a block."""
+        blocked = blocked or status in BLOCK_STATUSES
+        with self.lock:
+            state = self._host(url)
+            if not blocked:
+                state['successes'] += 1
+                state['consecutive_blocks'] = 0
+                state['rate'] = min(self.max_rate, state['rate'] + self.increase)
+                return False
+            
+            state['backoff_events'] += 1
+            state['consecutive_blocks'] += 1
+            state['rate'] = max(self.min_rate, state['rate'] * self.decrease)
+            pause = self.backoff * 2 ** (state['consecutive_blocks'] - 1)
+            if retry_after and str(retry_after).isdigit():
+                pause = max(pause, int(retry_after))
+            state['next_slot'] = max(state['next_slot'], time.monotonic() + pause)
+        print(f"Blocked by {urlparse(url).netloc} (status {status}); slowing to "
+              f"{state['rate']:.2f} req/s and pausing {pause:.0f}s")
+        return True
+
+    def stats(self):
+        """Return per-host metrics: pages/min achieved, current rate and backoff events."""
+        minutes = max((time.monotonic() - self.started) / 60, 1e-9)
+        with self.lock:
+            return {
+                host: {
+                    'requests': state['requests'],
+                    'successes': state['successes'],
+                    'pages_per_minute': state['successes'] / minutes,
+                    'current_rate': state['rate'],
+                    'backoff_events': state['backoff_events'],
+                    'seconds_waited': state['waited']
+                }
+                for host, state in self.hosts.items()
+            }
+
+    def print_stats(self):
+        """Print the per-host metrics."""
+        for host, stats in self.stats().items():
+            print(f"{host}: {stats['successes']}/{stats['requests']} pages ok, "
+                  f"{stats['pages_per_minute']:.1f} pages/min, rate {stats['current_rate']:.2f} req/s, "
+                  f"{stats['backoff_events']} backoff events, {stats['seconds_waited']:.1f}s waited")
+
+
+class SeleniumFetcher:
+    """Fetch pages through the scraper's Chrome driver for sites that need JavaScript."""
+
+    def __init__(self, scraper):
+        """Wrap a scraper whose driver is created lazily on first use."""
+        self.scraper = scraper
+        # A single driver cannot serve concurrent crawl tasks
+        self.lock = threading.Lock()
+        # Set once the browser failed to start, so later pages don't retry it
+        self.unavailable = False
+
+    def fetch(self, url):
+        """Load the URL in the browser and return the rendered page source."""
+        with self.lock:
+            return self._fetch(url)
+
+    def _fetch(self, url):
+        """Load the URL without taking the lock; returns None if the browser is unavailable."""
+        if self.unavailable:
+            return None
+        try:
+            self.scraper.ensure_driver()
+        except Exception as e:
+            print(f"Browser unavailable, skipping pages that need it: {e}")
+            self.unavailable = True
+            return None
+        try:
+            scraper = self.scraper
+            return load_page(scraper.driver, url, scraper.listing_selector(), scraper.resource_blocker,
+                             scraper.metrics, scraper.adapter.empty_selector)
+        except Exception as e:
+            print(f"Error fetching {url} with browser: {e}")
+            return None
+
+    def close(self):
+        """The driver itself is closed by ClassifiedScraper.cleanup."""
+        pass
+
+
+class BrowserWorkerPool:
+    """Scrape (phrase, page) jobs with several long-lived Chrome drivers in parallel."""
+
+    def __init__(self, scraper, workers=4, pages_per_driver=50, max_attempts=2):
+        """Configure the pool; drivers are restarted after `pages_per_driver` pages."""
+        self.scraper = scraper
+        self.workers = workers
+        self.pages_per_driver = pages_per_driver
+        self.max_attempts = max_attempts
+
+    def run(self, search_phrases, max_pages=3, start_pages=None):
+        """Scrape every phrase up to max_pages; returns a dict of phrase -> listings in page order.
+
+        start_pages optionally maps a phrase to the first page to scrape. Pages
+        that fail max_attempts times, or can't be parsed, are recorded in the
+        scraper's failed_pages.
+        """
+        start_pages = start_pages or {}
+        jobs = queue.Queue()
+        # Page 1 of every phrase goes first so empty result sets are found early
+        for page in range(1, max_pages + 1):
+            for phrase in dict.fromkeys(search_phrases):
+                if page >= start_pages.get(phrase, 1):
+                    jobs.put((phrase, page, 1))
+
+        pages_by_phrase = {phrase: {} for phrase in search_phrases}
+        last_page = {}
+        # Pages that used up their attempts
+        failed_pages = {phrase: set() for phrase in search_phrases}
+        lock = threading.Lock()
+
+        def worker(index):
+            user_agent = self.scraper.user_agents[index % len(self.scraper.user_agents)]
+            driver = None
+            pages_done = 0
+            while True:
+                try:
+                    phrase, page, attempt = jobs.get_nowait()
+                except queue.Empty:
+                    break
+
+                with lock:
+                    skip = page >= last_page.get(phrase, max_pages + 1)
+                if skip:
+                    continue
+
+                try:
+                    # Recycle the driver after a fixed number of pages to bound memory growth
+                    if driver and pages_done >= self.pages_per_driver:
+                        driver.quit()
+                        driver = None
+                    if not driver:
+                        with stage_timer(self.scraper.metrics, 'driver_startup'):
+                            driver = create_driver(user_agent, self.scraper.resource_blocker)
+                        pages_done = 0
+                        print(f"Worker {index} started WebDriver with user agent: {user_agent}")
+
+                    url = self.scraper.build_search_url(phrase, page)
+                    self.scraper.rate_limiter.wait(url)
+                    page_source = load_page(driver, url, self.scraper.listing_selector(),
+                                            self.scraper.resource_blocker, self.scraper.metrics,
+                                            self.scraper.adapter.empty_selector)
+                    pages_done += 1
+                    if self.scraper.rate_limiter.record(url, blocked=self.scraper._is_blocked(page_source)):
+                        raise RuntimeError("blocked by the site")
+                except Exception as e:
+                    print(f"Worker {index} failed on page {page} of '{phrase}': {e}")
+                    # Assume the driver crashed: discard it and retry the job on a fresh one
+                    if driver:
+                        try:
+                            driver.quit()
+                        except Exception:
+                            pass
+                        driver = None
+                    if attempt < self.max_attempts:
+                        jobs.put((phrase, page, attempt + 1))
+                    else:
+                        with lock:
+                            failed_pages[phrase].add(page)
+                    continue
+
+                try:
+                    records = self.scraper.submit_parse(page_source, phrase).result()
+                except Exception as e:
+                    # Not the end of the results, so the phrase can't count as fully crawled
+                    print(f"Worker {index} could not parse page {page} of '{phrase}': {e}")
+                    with lock:
+                        failed_pages[phrase].add(page)
+                    continue
+                with lock:
+                    if records:
+                        pages_by_phrase[phrase][page] = self.scraper._emit_page(records)
+                        print(f"Worker {index} scraped {len(records)} listings from page {page} of '{phrase}'")
+                        if self.scraper._page_mostly_seen(records):
+                            last_page[phrase] = min(page + 1, last_page.get(phrase, max_pages + 1))
+                    else:
+                        last_page[phrase] = min(page, last_page.get(phrase, max_pages + 1))
+                        self.scraper.exhausted_phrases.add(phrase)
+
+            if driver:
+                driver.quit()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        results = {}
+        for phrase, pages in pages_by_phrase.items():
+            stop = last_page.get(phrase, max_pages + 1)
+            results[phrase] = [record for page in sorted(pages) if page < stop for record in pages[page]]
+            # Pages past the end of the results were not needed anyway
+            for page in sorted(failed_pages[phrase]):
+                if page < stop:
+                    self.scraper._page_failed(phrase, page)
+        return results
+
+
+# Shared lxml parser; input is always encoded to UTF-8 before parsing
+LXML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+
+
+def first_text(elements, default):
+    """Return the stripped text of the first element, or default if there is none."""
+    return elements[0].text_content().strip() if elements else default
+
+
+class SiteAdapter:
+    """Selectors, URL templates and extraction rules for one classifieds site.
+
+    Everything site-specific lives here, so supporting a new site means
+    registering another adapter instead of editing the scraper. Selectors are
+    compiled once when the adapter is created.
+    """
+
+    def __init__(self, name, base_url, search_url, page_url, phrase_encoder, listing_selector, listing_xpath,
+                 listing_marker, results_marker, fields, field_xpaths, cookie_button, search_input, search_button,
+                 next_page, location_date_separator=None, default_date="Not available", url_prefix=None,
+                 parser_backend="lxml", empty_selector=None):
+        """Describe a site.
+
+        search_url and page_url are format templates; search_url receives
+        base_url and the encoded phrase, page_url receives search_url and page.
+        listing_marker matches a listing card in raw HTML and results_marker
+        the results container (or empty-results message) that a
+        server-rendered results page has even without listings.
+        listing_selector/fields hold CSS selectors for the BeautifulSoup backend
+        and listing_xpath/field_xpaths the equivalent XPath for the lxml
+        backend; fields cover title, location, price and link.
+        With location_date_separator set, the location field also carries the
+        posting date after the separator. empty_selector is the CSS selector
+        of the empty-results message, so the browser doesn't wait for listing
+        cards that will never appear.
+        """
+        self.name = name
+        self.base_url = base_url
+        self.search_url = search_url
+        self.page_url = page_url
+        self.phrase_encoder = phrase_encoder
+        self.listing_selector = listing_selector
+        # Cheap check for listing cards in raw HTML, used to decide whether the browser is needed
+        self.listing_marker = re.compile(listing_marker)
+        # Tells a page past the last results page apart from one that needs JavaScript to render
+        self.results_marker = re.compile(results_marker)
+        self.fields = fields
+        self.card_xpath = etree.XPath(listing_xpath)
+        self.field_xpaths = {field: etree.XPath(xpath) for field, xpath in field_xpaths.items()}
+        self.cookie_button = cookie_button
+        self.search_input = search_input
+        self.search_button = search_button
+        self.next_page = next_page
+        self.location_date_separator = location_date_separator
+        self.default_date = default_date
+        self.url_prefix = url_prefix
+        self.parser_backend = parser_backend
+        self.empty_selector = empty_selector
+        # Extraction function for each parser backend
+        self.extractors = {
+            "lxml": self.extract_lxml,
+            "html.parser": self.extract_bs4
+        }
+
+    def build_search_url(self, base_url, search_phrase, page=1):
+        """Build the search results URL for a phrase and page number."""
+        url = self.search_url.format(base_url=base_url, phrase=self.phrase_encoder(search_phrase))
+        return url if page <= 1 else self.page_url.format(search_url=url, page=page)
+
+    def extract_bs4(self, page_source):
+        """Return raw (title, location, date, price, url) tuples using BeautifulSoup."""
+        cards = []
+        soup = BeautifulSoup(page_source, 'html.parser')
+        for item in soup.select(self.listing_selector):
+            try:
+                title_element = item.select_one(self.fields['title'])
+                title = title_element.text.strip() if title_element else "No Title"
+                
+                location_element = item.select_one(self.fields['location'])
+                location_text = location_element.text.strip() if location_element else "No Location"
+                
+                price_element = item.select_one(self.fields['price'])
+                price_text = price_element.text.strip() if price_element else "0 zł"
+                
+                url_element = item.select_one(self.fields['link'])
+                url = url_element['href'] if url_element and 'href' in url_element.attrs else "No URL"
+                
+                cards.append(self._card(title, location_text, price_text, url))
+            except Exception as e:
+                print(f"Error scraping individual listing: {e}")
+                continue
+        return cards
+
+    def extract_lxml(self, page_source):
+        """Return raw (title, location, date, price, url) tuples using lxml.
+
+        Produces the same tuples as extract_bs4, several times faster.
+        """
+        cards = []
+        root = lxml.html.document_fromstring(page_source.encode('utf-8'), parser=LXML_PARSER)
+        xpaths = self.field_xpaths
+        for item in self.card_xpath(root):
+            try:
+                title = first_text(xpaths['title'](item), "No Title")
+                location_text = first_text(xpaths['location'](item), "No Location")
+                price_text = first_text(xpaths['price'](item), "0 zł")
+                links = xpaths['link'](item)
+                url = links[0].get('href', "No URL") if links else "No URL"
+                
+                cards.append(self._card(title, location_text, price_text, url))
+            except Exception as e:
+                print(f"Error scraping individual listing: {e}")
+                continue
+        return cards
+
+    def _card(self, title, location_text, price_text, url):
+        """Split location and date and make relative URLs absolute."""
+        separator = self.location_date_separator
+        if separator and separator in location_text:
+            location, date_posted = location_text.split(separator)[:2]
+        else:
+            location, date_posted = location_text, self.default_date
+        
+        if self.url_prefix and url.startswith('/'):
+            url = f"{self.url_prefix}{url}"
+        return title, location, date_posted, price_text, url
+
+
+# Registered site adapters by name
+SITE_ADAPTERS = {}
+
+
+def register_site_adapter(adapter):
+    """Make a site available to ClassifiedScraper under adapter.name."""
+    SITE_ADAPTERS[adapter.name] = adapter
+    return adapter
+
+
+register_site_adapter(SiteAdapter(
+    name="olx",
+    base_url="https://www.olx.pl",
+    # OLX encodes the phrase in the path with words joined by dashes
+    search_url="{base_url}/oferty/q-{phrase}/",
+    page_url="{search_url}?page={page}",
+    phrase_encoder=lambda phrase: quote('-'.join(phrase.split())),
+    listing_selector='div[data-cy="l-card"]',
+    listing_xpath='//div[@data-cy="l-card"]',
+    listing_marker=r"""data-cy=["']l-card["']""",
+    results_marker=r"""data-testid=["'](?:listing-grid|listing-count-msg|search-no-results)["']""",
+    fields={
+        'title': 'h6',
+        'location': 'p[data-testid="location-date"]',
+        'price': 'p[data-testid="ad-price"]',
+        'link': 'a'
+    },
+    field_xpaths={
+        'title': '(.//h6)[1]',
+        'location': '(.//p[@data-testid="location-date"])[1]',
+        'price': '(.//p[@data-testid="ad-price"])[1]',
+        'link': '(.//a)[1]'
+    },
+    cookie_button="#onetrust-accept-btn-handler",
+    search_input="input[data-testid='search-input']",
+    search_button="button[data-testid='search-submit']",
+    next_page='a[data-testid="pagination-forward"]',
+    location_date_separator=' - ',
+    default_date="No Date",
+    url_prefix="https://www.olx.pl",
+    empty_selector='[data-testid="search-no-results"]'
+))
+
+register_site_adapter(SiteAdapter(
+    name="allegro",
+    base_url="https://allegro.pl",
+    search_url="{base_url}/listing?string={phrase}",
+    page_url="{search_url}&p={page}",
+    phrase_encoder=quote_plus,
+    listing_selector='article[data-role="offer"]',
+    listing_xpath='//article[@data-role="offer"]',
+    listing_marker=r"""data-role=["']offer["']""",
+    results_marker=r"""data-role=["'](?:offers-list|listing-empty)["']""",
+    fields={
+        'title': 'h2',
+        'location': 'div[data-role="seller-info"] span',
+        'price': 'div[data-role="price"]',
+        'link': 'a'
+    },
+    field_xpaths={
+        'title': '(.//h2)[1]',
+        'location': '(.//div[@data-role="seller-info"]//span)[1]',
+        'price': '(.//div[@data-role="price"])[1]',
+        'link': '(.//a)[1]'
+    },
+    cookie_button="button[data-role='accept-consent']",
+    search_input="input[data-role='search-input']",
+    search_button="button[data-role='search-button']",
+    next_page='a[data-role="next-page"]',
+    # Date posted is not shown on Allegro search pages
+    default_date="Not available",
+    empty_selector='[data-role="listing-empty"]'
+))
+
+
+class ListingDatabase:
+    """SQLite storage for listings: WAL journal, batched transactional upserts keyed by URL.
+
+    `listings` holds the latest state of every ad. Each scrape of an ad also
+    adds a row to `observations` (price and area at that time), which points
+    to the normalized `phrases` and `locations` tables so history queries
+    only touch small integer-keyed indexes. Weekly medians per location are
+    kept in the `weekly_prices` rollup and daily statistics per phrase in
+    `daily_prices`, both refreshed for the periods that got new observations.
+    """
+
+    # Bumped whenever migrate() gains a step; stored in PRAGMA user_version
+    SCHEMA_VERSION = 5
+
+    LISTING_COLUMNS = (
+        'title', 'location', 'price', 'price_value', 'url', 'date_posted',
+        'category', 'square_meters', 'price_per_sqm', 'search_phrase', 'scraped_date'
+    )
+
+    # Re-scraping a known URL refreshes its fields and last_seen instead of adding a row
+    UPSERT_SQL = '''
+    INSERT INTO listings (
+        title, location, price, price_value, url, date_posted,
+        category, square_meters, price_per_sqm, search_phrase, scraped_date,
+        first_seen, last_seen
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        title = excluded.title,
+        location = excluded.location,
+        price = excluded.price,
+        price_value = excluded.price_value,
+        date_posted = excluded.date_posted,
+        category = excluded.category,
+        square_meters = excluded.square_meters,
+        price_per_sqm = excluded.price_per_sqm,
+        search_phrase = excluded.search_phrase,
+        scraped_date = excluded.scraped_date,
+        last_seen = excluded.last_seen,
+        delisted_at = NULL
+    '''
+
+    # One price observation per scrape of a known URL
+    OBSERVATION_SQL = '''
+    INSERT OR IGNORE INTO observations (
+        listing_id, phrase_id, location_id, observed_at, week, price_value, square_meters, price_per_sqm
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    def __init__(self, path='listings.db', batch_size=1000):
+        """Configure the database file and how many rows go into one transaction."""
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = None
+        # Weeks and days with observations not yet reflected in weekly_prices and daily_prices
+        self.dirty_weeks = set()
+        self.dirty_days = set()
+
+    def connect(self):
+        """Open the database, switch it to WAL mode and bring the schema up to date."""
+        # Connect to SQLite database (will be created if it doesn't exist)
+        # Sinks may write from crawl threads; ListingSink serializes those writes
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        # WAL lets readers run during writes; NORMAL sync is safe with WAL and much faster
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        
+        # Create table if it doesn't exist
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS listings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            location TEXT,
+            price TEXT,
+            price_value REAL,
+            url TEXT,
+            date_posted TEXT,
+            category TEXT,
+            square_meters REAL,
+            price_per_sqm REAL,
+            search_phrase TEXT,
+            scraped_date TEXT
+        )
+        ''')
+        self.conn.commit()
+        self.migrate()
+        return self.conn
+
+    def migrate(self):
+        """Apply schema migrations newer than the database's user_version."""
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        
+        try:
+            self.conn.execute('BEGIN')
+            if version < 1:
+                self._migrate_v1()
+            if version < 2:
+                self._migrate_v2()
+            if version < 3:
+                self._migrate_v3()
+            if version < 4:
+                self._migrate_v4()
+            if version < 5:
+                self._migrate_v5()
+            self.conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+            self.conn.commit()
+            print(f"Database migrated to schema version {self.SCHEMA_VERSION}")
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def _migrate_v1(self):
+        """Add first/last seen dates, collapse duplicate rows per URL and make url unique."""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(listings)')}
+        for column in ('first_seen', 'last_seen'):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE listings ADD COLUMN {column} TEXT')
+        
+        # Cards without a link cannot be matched across runs; NULL keeps them out of the unique index
+        self.conn.execute("UPDATE listings SET url = NULL WHERE url = 'No URL'")
+        
+        # Keep the most recent row per URL, remembering when the URL was first and last scraped
+        self.conn.execute('''
+        CREATE TEMP TABLE seen_urls AS
+        SELECT url, MIN(scraped_date) AS first_seen, MAX(scraped_date) AS last_seen, MAX(id) AS keep_id
+        FROM listings WHERE url IS NOT NULL GROUP BY url
+        ''')
+        self.conn.execute('CREATE UNIQUE INDEX temp.idx_seen_urls ON seen_urls(keep_id)')
+        self.conn.execute('''
+        DELETE FROM listings
+        WHERE url IS NOT NULL AND id NOT IN (SELECT keep_id FROM seen_urls)
+        ''')
+        self.conn.execute('''
+        UPDATE listings SET
+            first_seen = (SELECT first_seen FROM seen_urls WHERE keep_id = listings.id),
+            last_seen = (SELECT last_seen FROM seen_urls WHERE keep_id = listings.id)
+        WHERE url IS NOT NULL
+        ''')
+        self.conn.execute('UPDATE listings SET first_seen = scraped_date, last_seen = scraped_date WHERE url IS NULL')
+        self.conn.execute('DROP TABLE temp.seen_urls')
+        
+        self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_listings_url ON listings(url)')
+
+    def _migrate_v2(self):
+        """Add the table recording how far each (site, phrase) crawl got."""
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+            site TEXT NOT NULL,
+            search_phrase TEXT NOT NULL,
+            last_page INTEGER NOT NULL,
+            cursor_url TEXT,
+            completed INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (site, search_phrase)
+        )
+        ''')
+
+    def _migrate_v3(self):
+        """Add phrases, locations and per-scrape observations, indexed for history queries."""
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS phrases (
+            id INTEGER PRIMARY KEY,
+            phrase TEXT NOT NULL UNIQUE
+        )
+        ''')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS locations (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            city TEXT NOT NULL
+        )
+        ''')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS observations (
+            id INTEGER PRIMARY KEY,
+            listing_id INTEGER NOT NULL REFERENCES listings(id),
+            phrase_id INTEGER REFERENCES phrases(id),
+            location_id INTEGER REFERENCES locations(id),
+            observed_at TEXT NOT NULL,
+            week TEXT NOT NULL,
+            price_value REAL,
+            square_meters REAL,
+            price_per_sqm REAL,
+            UNIQUE (listing_id, observed_at)
+        )
+        ''')
+        # Median price per location, phrase (0 for all phrases) and week starting Monday
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS weekly_prices (
+            location_id INTEGER NOT NULL,
+            phrase_id INTEGER NOT NULL,
+            week TEXT NOT NULL,
+            listings INTEGER NOT NULL,
+            median_price REAL,
+            median_price_per_sqm REAL,
+            PRIMARY KEY (location_id, phrase_id, week)
+        ) WITHOUT ROWID
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_observations_location ON observations(location_id, observed_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_observations_phrase ON observations(phrase_id, observed_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_observations_date ON observations(observed_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_observations_week ON observations(week)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_locations_city ON locations(city)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_listings_phrase ON listings(search_phrase)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_listings_location ON listings(location)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_listings_scraped ON listings(scraped_date)')
+        
+        # Existing rows become the first observation of each ad
+        rows = self.conn.execute(
+            f"SELECT {', '.join(self.LISTING_COLUMNS)} FROM listings WHERE url IS NOT NULL AND scraped_date IS NOT NULL"
+        ).fetchall()
+        self._add_observations(rows)
+        self.refresh_weekly_prices(commit=False)
+
+    def _migrate_v4(self):
+        """Add the listing events table and the date an ad was found to be gone."""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(listings)')}
+        if 'delisted_at' not in columns:
+            self.conn.execute('ALTER TABLE listings ADD COLUMN delisted_at TEXT')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS listing_events (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL,
+            event TEXT NOT NULL,
+            search_phrase TEXT,
+            old_price REAL,
+            new_price REAL,
+            detected_at TEXT NOT NULL
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_events_url ON listing_events(url)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_events_type ON listing_events(event, detected_at)')
+
+    def _migrate_v5(self):
+        """Add the daily price statistics rollup per phrase and fill it from existing observations."""
+        # Price statistics per phrase (0 for all phrases) and day
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_prices (
+            phrase_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            listings INTEGER NOT NULL,
+            mean_price REAL,
+            median_price REAL,
+            min_price REAL,
+            max_price REAL,
+            mean_square_meters REAL,
+            median_price_per_sqm REAL,
+            PRIMARY KEY (phrase_id, day)
+        ) WITHOUT ROWID
+        ''')
+        self.dirty_days.update(
+            row[0] for row in self.conn.execute('SELECT DISTINCT substr(observed_at, 1, 10) FROM observations')
+        )
+        self.refresh_daily_prices(commit=False)
+
+    def save_checkpoint(self, site, search_phrase, last_page, cursor_url=None, completed=False):
+        """Record the last page of a phrase whose listings are safely stored."""
+        with self.conn:
+            self.conn.execute('''
+            INSERT OR REPLACE INTO crawl_checkpoints
+                (site, search_phrase, last_page, cursor_url, completed, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (
+                site, search_phrase, last_page, cursor_url, int(completed),
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            ))
+
+    def load_checkpoint(self, site, search_phrase):
+        """Return the phrase's checkpoint as a dict, or None if it was never crawled."""
+        row = self.conn.execute('''
+        SELECT last_page, cursor_url, completed, updated_at FROM crawl_checkpoints
+        WHERE site = ? AND search_phrase = ?
+        ''', (site, search_phrase)).fetchone()
+        if not row:
+            return None
+        return {'last_page': row[0], 'cursor_url': row[1], 'completed': bool(row[2]), 'updated_at': row[3]}
+
+    def _row(self, listing):
+        """Convert a listing record to UPSERT_SQL parameters."""
+        row = [listing[column] for column in self.LISTING_COLUMNS]
+        if row[4] == "No URL":
+            row[4] = None
+        # first_seen and last_seen both start at this scrape
+        row.extend((listing['scraped_date'], listing['scraped_date']))
+        return row
+
+    def upsert_listings(self, listings):
+        """Insert or update listings by URL, batch_size rows per transaction. Returns the row count."""
+        rows = [self._row(listing) for listing in listings]
+        # Writing in URL order keeps unique-index inserts local in the B-tree (about 3x faster
+        # for large batches); the sort is stable, so the last record for a URL still wins
+        rows.sort(key=lambda row: row[4] or '')
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            with self.conn:
+                self.conn.executemany(self.UPSERT_SQL, batch)
+                self._add_observations(batch)
+        return len(rows)
+
+    @staticmethod
+    def week_of(scraped_date):
+        """Return the Monday ("YYYY-MM-DD") of the week a "YYYY-MM-DD HH:MM:SS" date falls in."""
+        day = date.fromisoformat(scraped_date[:10])
+        return (day - timedelta(days=day.weekday())).isoformat()
+
+    def _add_observations(self, rows):
+        """Record a price observation for every row with a URL, adding new phrases and locations first."""
+        rows = [row for row in rows if row[4] and row[10]]
+        weeks = {scraped_date: self.week_of(scraped_date) for scraped_date in {row[10] for row in rows}}
+        self.dirty_weeks.update(weeks.values())
+        self.dirty_days.update(scraped_date[:10] for scraped_date in weeks)
+        phrases = {row[9] for row in rows if row[9]}
+        locations = {row[1] for row in rows if row[1]}
+        self.conn.executemany('INSERT OR IGNORE INTO phrases (phrase) VALUES (?)', [(phrase,) for phrase in phrases])
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO locations (name, city) VALUES (?, ?)',
+            [(location, location.split(',')[0].strip()) for location in locations]
+        )
+        # Ids are looked up once per batch rather than with three subqueries per row
+        listing_ids = self._lookup_ids('listings', 'url', {row[4] for row in rows})
+        phrase_ids = self._lookup_ids('phrases', 'phrase', phrases)
+        location_ids = self._lookup_ids('locations', 'name', locations)
+        self.conn.executemany(self.OBSERVATION_SQL, [
+            (listing_ids[row[4]], phrase_ids.get(row[9]), location_ids.get(row[1]),
+             row[10], weeks[row[10]], row[3], row[7], row[8])
+            for row in rows
+        ])
+
+    def _lookup_ids(self, table, column, values):
+        """Return a dict of value -> id for the rows of a table whose unique column is in values."""
+        values = list(values)
+        ids = {}
+        # Chunks stay under SQLite's limit on query parameters
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            ids.update(self.conn.execute(f'SELECT {column}, id FROM {table} WHERE {column} IN ({placeholders})', chunk))
+        return ids
+
+    def refresh_weekly_prices(self, commit=True):
+        """Recompute the weekly_prices rows of every week that got new observations.
+
+        With commit=False the rows are left in the caller's open transaction (as in migrate).
+        """
+        if not self.dirty_weeks:
+            return
+        weeks = sorted(self.dirty_weeks)
+        placeholders = ', '.join('?' * len(weeks))
+        df = pd.read_sql_query(f'''
+        SELECT location_id, phrase_id, week, price_value, price_per_sqm FROM observations
+        WHERE week IN ({placeholders}) AND location_id IS NOT NULL
+        ''', self.conn, params=weeks)
+        # Prices of 0 mean "not parsed" and must not pull the medians down
+        df[['price_value', 'price_per_sqm']] = df[['price_value', 'price_per_sqm']].where(
+            df[['price_value', 'price_per_sqm']] > 0
+        )
+        df['phrase_id'] = df['phrase_id'].fillna(0).astype(int)
+        
+        rows = []
+        for keys in (['location_id', 'phrase_id', 'week'], ['location_id', 'week']):
+            grouped = df.groupby(keys).agg(
+                listings=('week', 'size'),
+                median_price=('price_value', 'median'),
+                median_price_per_sqm=('price_per_sqm', 'median'),
+            ).reset_index()
+            if 'phrase_id' not in keys:
+                grouped['phrase_id'] = 0
+            grouped = grouped[['location_id', 'phrase_id', 'week', 'listings', 'median_price', 'median_price_per_sqm']]
+            # Plain Python values for sqlite3, with NaN medians stored as NULL
+            rows += grouped.astype(object).where(grouped.notna(), None).itertuples(index=False, name=None)
+        
+        with self.conn if commit else contextlib.nullcontext():
+            self.conn.execute(f'DELETE FROM weekly_prices WHERE week IN ({placeholders})', weeks)
+            self.conn.executemany('INSERT INTO weekly_prices VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self.dirty_weeks.clear()
+
+    def refresh_daily_prices(self, commit=True):
+        """Recompute the daily_prices rows of every day that got new observations.
+
+        With commit=False the rows are left in the caller's open transaction (as in migrate).
+        """
+        if not self.dirty_days:
+            return
+        days = sorted(self.dirty_days)
+        placeholders = ', '.join('?' * len(days))
+        df = pd.read_sql_query(f'''
+        SELECT phrase_id, substr(observed_at, 1, 10) AS day, price_value, square_meters, price_per_sqm
+        FROM observations WHERE substr(observed_at, 1, 10) IN ({placeholders})
+        ''', self.conn, params=days)
+        # Values of 0 mean "not parsed" and are left out of the statistics
+        values = ['price_value', 'square_meters', 'price_per_sqm']
+        df[values] = df[values].where(df[values] > 0)
+        df['phrase_id'] = df['phrase_id'].fillna(0).astype(int)
+        
+        rows = []
+        for keys in (['phrase_id', 'day'], ['day']):
+            grouped = df.groupby(keys).agg(
+                listings=('day', 'size'),
+                mean_price=('price_value', 'mean'),
+                median_price=('price_value', 'median'),
+                min_price=('price_value', 'min'),
+                max_price=('price_value', 'max'),
+                mean_square_meters=('square_meters', 'mean'),
+                median_price_per_sqm=('price_per_sqm', 'median'),
+            ).reset_index()
+            if 'phrase_id' not in keys:
+                grouped['phrase_id'] = 0
+            grouped = grouped[['phrase_id', 'day', 'listings', 'mean_price', 'median_price', 'min_price',
+                               'max_price', 'mean_square_meters', 'median_price_per_sqm']]
+            rows += grouped.astype(object).where(grouped.notna(), None).itertuples(index=False, name=None)
+        
+        with self.conn if commit else contextlib.nullcontext():
+            self.conn.execute(f'DELETE FROM daily_prices WHERE day IN ({placeholders})', days)
+            self.conn.executemany('INSERT INTO daily_prices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.dirty_days.clear()
+
+    def refresh_rollups(self):
+        """Bring the weekly and daily rollup tables up to date."""
+        self.refresh_weekly_prices()
+        self.refresh_daily_prices()
+
+    def daily_prices(self, search_phrase=None, since=None):
+        """Return the daily price statistics of a phrase (or all phrases), oldest first.
+
+        Read from the daily_prices rollup, so months of history cost one row
+        per day rather than a scan of every observation.
+        """
+        self.refresh_daily_prices()
+        conditions = ['phrase_id = ' + ('(SELECT id FROM phrases WHERE phrase = ?)' if search_phrase else '0')]
+        params = [search_phrase] if search_phrase else []
+        if since:
+            conditions.append('day >= ?')
+            params.append(since[:10])
+        return pd.read_sql_query(f'''
+        SELECT day, listings, mean_price, median_price, min_price, max_price, mean_square_meters, median_price_per_sqm
+        FROM daily_prices WHERE {' AND '.join(conditions)}
+        ORDER BY day
+        ''', self.conn, params=params)
+
+    def add_events(self, events):
+        """Store (url, event, search_phrase, old_price, new_price, detected_at) event tuples."""
+        with self.conn:
+            self.conn.executemany('''
+            INSERT INTO listing_events (url, event, search_phrase, old_price, new_price, detected_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', events)
+
+    def mark_delisted(self, listing_ids, search_phrase, detected_at):
+        """Record a 'delisted' event for each listing id and set its delisted_at."""
+        with self.conn:
+            for start in range(0, len(listing_ids), 500):
+                chunk = listing_ids[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                self.conn.execute(f'''
+                INSERT INTO listing_events (url, event, search_phrase, old_price, new_price, detected_at)
+                SELECT url, 'delisted', ?, price_value, NULL, ? FROM listings WHERE id IN ({placeholders})
+                ''', [search_phrase, detected_at, *chunk])
+                self.conn.execute(
+                    f'UPDATE listings SET delisted_at = ? WHERE id IN ({placeholders})', [detected_at, *chunk]
+                )
+
+    def listing_events(self, event=None, search_phrase=None, since=None):
+        """Return recorded events as a DataFrame, newest first, optionally of one type, phrase or from a date."""
+        conditions = ['1 = 1']
+        params = []
+        if event:
+            conditions.append('event = ?')
+            params.append(event)
+        if search_phrase:
+            conditions.append('search_phrase = ?')
+            params.append(search_phrase)
+        if since:
+            conditions.append('detected_at >= ?')
+            params.append(since)
+        return pd.read_sql_query(f'''
+        SELECT detected_at, event, url, search_phrase, old_price, new_price FROM listing_events
+        WHERE {' AND '.join(conditions)}
+        ORDER BY detected_at DESC, id DESC
+        ''', self.conn, params=params)
+
+    def price_history(self, url):
+        """Return every observation of one ad as a DataFrame, oldest first."""
+        return pd.read_sql_query('''
+        SELECT o.observed_at, o.price_value, o.square_meters, o.price_per_sqm
+        FROM observations o JOIN listings l ON l.id = o.listing_id
+        WHERE l.url = ?
+        ORDER BY o.observed_at
+        ''', self.conn, params=(url,))
+
+    def weekly_median_price(self, location=None, search_phrase=None, since=None, per_sqm=False):
+        """Return the median price (or price per m²) and listing count per location and week.
+
+        location matches a full location name or its city ("Warszawa" covers
+        "Warszawa, Mokotów"); since is a "YYYY-MM-DD" date. Weeks start on
+        Monday. Results come from the weekly_prices rollup through its primary
+        key, so they don't depend on how many observations there are.
+        """
+        self.refresh_weekly_prices()
+        value = 'median_price_per_sqm' if per_sqm else 'median_price'
+        conditions = ['w.phrase_id = ' + ('(SELECT id FROM phrases WHERE phrase = ?)' if search_phrase else '0')]
+        params = [search_phrase] if search_phrase else []
+        if location:
+            conditions.append('w.location_id IN (SELECT id FROM locations WHERE name = ? OR city = ?)')
+            params += [location, location]
+        if since:
+            conditions.append('w.week >= ?')
+            params.append(self.week_of(since))
+        
+        return pd.read_sql_query(f'''
+        SELECT loc.name AS location, w.week, w.{value}, w.listings
+        FROM weekly_prices w JOIN locations loc ON loc.id = w.location_id
+        WHERE {' AND '.join(conditions)} AND w.{value} IS NOT NULL
+        ORDER BY loc.name, w.week
+        ''', self.conn, params=params)
+
+    def close(self):
+        """Bring the rollups up to date and close the connection."""
+        if self.conn:
+            try:
+                self.refresh_rollups()
+            except Exception as e:
+                print(f"Error refreshing rollups: {e}")
+            self.conn.close()
+            self.conn = None
+
+
+class BloomFilter:
+    """Fixed-size probabilistic set: no false negatives, a tunable rate of false positives."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        """Size the bit array for `capacity` items at the given false positive rate."""
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        """Yield the bit positions of an item using double hashing over one digest."""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item):
+        """Add an item to the filter."""
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        """Return True if the item was (probably) added."""
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class SeenIndex:
+    """URLs of listings already stored in the database, for incremental crawling."""
+
+    def __init__(self, db, use_bloom=False, error_rate=0.01):
+        """Load every stored URL into a set, or a Bloom filter to save memory at millions of URLs."""
+        count = db.conn.execute('SELECT COUNT(*) FROM listings WHERE url IS NOT NULL').fetchone()[0]
+        self.urls = BloomFilter(count, error_rate) if use_bloom else set()
+        for (url,) in db.conn.execute('SELECT url FROM listings WHERE url IS NOT NULL'):
+            self.urls.add(url)
+        self.count = count
+        print(f"Loaded {count} known listing URLs ({'Bloom filter' if use_bloom else 'set'})")
+
+    def seen_ratio(self, records):
+        """Return the share of records whose URL is already known."""
+        if not records:
+            return 0.0
+        known = sum(1 for record in records if record['url'] in self.urls)
+        return known / len(records)
+
+
+def url_key(url):
+    """Return a compact 8-byte hash of a URL for in-memory indexes."""
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+
+
+class ChangeDetector:
+    """Diff scraped listings against their latest stored state and record what changed.
+
+    The state of every stored ad (id, price, phrase, delisted or not) is loaded
+    once per run into dicts keyed by url_key, so pages are diffed in memory
+    without a query per listing. Events are 'new', 'price_change' and
+    'relisted' as pages arrive, and 'delisted' for ads of a phrase that were
+    not seen when its crawl reached the last page of results.
+    """
+
+    # Share of a phrase's known ads that may disappear in one run before it's treated as a failed crawl
+    MAX_DELISTED_SHARE = 0.5
+
+    def __init__(self, db):
+        """Load the latest known state of every stored ad."""
+        self.db = db
+        # Pages may arrive from several crawl threads at once
+        self.lock = threading.Lock()
+        self.state = {}
+        self.delisted = set()
+        self.by_phrase = {}
+        self.seen = set()
+        # Queued events per search phrase, stored when the phrase finishes
+        self.events = {}
+        for listing_id, url, price_value, phrase, delisted_at in db.conn.execute(
+                'SELECT id, url, price_value, search_phrase, delisted_at FROM listings WHERE url IS NOT NULL'):
+            key = url_key(url)
+            self.state[key] = (listing_id, price_value or 0.0)
+            if delisted_at:
+                self.delisted.add(key)
+            else:
+                self.by_phrase.setdefault(phrase, set()).add(key)
+        print(f"Loaded the latest state of {len(self.state)} listings for change detection")
+
+    def diff(self, records):
+        """Compare a page of records with the known state and queue events for what changed."""
+        with self.lock:
+            for record in records:
+                url = record['url']
+                if not url or url == "No URL":
+                    continue
+                key = url_key(url)
+                self.seen.add(key)
+                price_value = record['price_value'] or 0.0
+                known = self.state.get(key)
+                if known is None:
+                    event, old_price = 'new', None
+                elif key in self.delisted:
+                    self.delisted.discard(key)
+                    event, old_price = 'relisted', known[1]
+                elif price_value > 0 and known[1] > 0 and abs(price_value - known[1]) >= 0.01:
+                    event, old_price = 'price_change', known[1]
+                else:
+                    continue
+                self.state[key] = (known[0] if known else None, price_value)
+                self.events.setdefault(record['search_phrase'], []).append(
+                    (url, event, record['search_phrase'], old_price, price_value, record['scraped_date'])
+                )
+
+    def finish(self, search_phrase, complete):
+        """Store the queued events; if the phrase was crawled to its last page, also record its delistings.
+
+        Returns the number of events stored per type.
+        """
+        with self.lock:
+            events = self.events.pop(search_phrase, [])
+            gone = []
+            known = self.by_phrase.get(search_phrase, ())
+            if complete:
+                gone = [key for key in known if key not in self.seen and key not in self.delisted]
+            if known and len(gone) > self.MAX_DELISTED_SHARE * len(known):
+                # More likely a blocked or broken crawl than a mass removal of ads
+                print(f"Not marking {len(gone)} of {len(known)} '{search_phrase}' listings as delisted: "
+                      f"too many missing at once")
+                gone = []
+            self.delisted.update(gone)
+            gone = [self.state[key][0] for key in gone]
+        
+        counts = {}
+        for event in events:
+            counts[event[1]] = counts.get(event[1], 0) + 1
+        try:
+            if events:
+                self.db.add_events(events)
+            if gone:
+                self.db.mark_delisted(gone, search_phrase, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                counts['delisted'] = len(gone)
+        except Exception as e:
+            print(f"Error saving listing events: {e}")
+        return counts
+
+
+class TaskQueue:
+    """Shared queue of (site, phrase, page) crawl tasks in SQLite, leased by workers on any node.
+
+    A leased task stays invisible to other workers until its lease expires
+    after visibility_timeout seconds; then another worker may take it over,
+    up to max_attempts leases in total. Leasing runs in a BEGIN IMMEDIATE
+    transaction, so two workers never get the same task. The file uses the
+    default rollback journal rather than WAL, so it can sit on storage
+    shared by several machines as long as that storage supports file locks.
+    """
+
+    def __init__(self, path='tasks.db', visibility_timeout=300, max_attempts=3):
+        """Configure the queue file, lease duration and retry limit."""
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.conn = None
+
+    def connect(self):
+        """Open the queue file, creating the tasks table if needed."""
+        # Wait for other workers' transactions instead of failing at once
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            site TEXT NOT NULL,
+            search_phrase TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            lease_expires REAL,
+            listings INTEGER,
+            error TEXT,
+            updated_at TEXT,
+            UNIQUE (site, search_phrase, page)
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, site, lease_expires)')
+        self.conn.commit()
+        return self
+
+    def enqueue(self, site, search_phrases, max_pages):
+        """Add a task per phrase and page; tasks already queued are left as they are. Returns how many were added."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO tasks (site, search_phrase, page, updated_at) VALUES (?, ?, ?, ?)',
+                [(site, phrase, page, now) for phrase in search_phrases for page in range(1, max_pages + 1)]
+            )
+            return self.conn.total_changes - before
+
+    def lease(self, worker, site=None, count=1):
+        """Lease up to `count` pending or expired tasks to a worker, earliest pages first.
+
+        Returns them as dicts with id, site, search_phrase, page and attempts.
+        Expired tasks that used up their attempts are marked failed instead.
+        """
+        now = time.time()
+        site_filter = 'AND site = ?' if site else ''
+        params = [site] if site else []
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute(f'''
+            UPDATE tasks SET status = 'failed', worker = NULL, error = 'lease expired too often'
+            WHERE status = 'leased' AND lease_expires < ? AND attempts >= ? {site_filter}
+            ''', [now, self.max_attempts, *params])
+            rows = self.conn.execute(f'''
+            SELECT id, site, search_phrase, page, attempts FROM tasks
+            WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) {site_filter}
+            ORDER BY page, id LIMIT ?
+            ''', [now, *params, count]).fetchall()
+            self.conn.executemany('''
+            UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+            WHERE id = ?
+            ''', [(worker, now + self.visibility_timeout, row[0]) for row in rows])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return [
+            {'id': row[0], 'site': row[1], 'search_phrase': row[2], 'page': row[3], 'attempts': row[4] + 1}
+            for row in rows
+        ]
+
+    def _finish(self, task_id, worker, status, listings=None, error=None):
+        """Set the outcome of a task still leased by this worker; returns False if the lease was lost."""
+        with self.conn:
+            cursor = self.conn.execute('''
+            UPDATE tasks SET status = ?, worker = NULL, lease_expires = NULL, listings = ?, error = ?, updated_at = ?
+            WHERE id = ? AND worker = ? AND status = 'leased'
+            ''', (status, listings, error, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), task_id, worker))
+            return cursor.rowcount > 0
+
+    def complete(self, task_id, worker, listings):
+        """Mark a task done with the number of listings it produced."""
+        return self._finish(task_id, worker, 'done', listings=listings)
+
+    def fail(self, task_id, worker, error, attempts):
+        """Release a task for another try, or mark it failed once it used up its attempts."""
+        status = 'failed' if attempts >= self.max_attempts else 'pending'
+        return self._finish(task_id, worker, status, error=str(error))
+
+    def skip_after(self, site, search_phrase, page):
+        """Skip the phrase's pending tasks after a page that had no results; returns how many were skipped."""
+        with self.conn:
+            return self.conn.execute('''
+            UPDATE tasks SET status = 'skipped', updated_at = ?
+            WHERE site = ? AND search_phrase = ? AND page > ? AND status = 'pending'
+            ''', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), site, search_phrase, page)).rowcount
+
+    def counts(self, site=None):
+        """Return the number of tasks per status."""
+        if site:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM tasks WHERE site = ? GROUP BY status', (site,))
+        else:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status')
+        return dict(rows.fetchall())
+
+    def close(self):
+        """Close the queue file."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+
+def write_task_results(results_dir, task, records):
+    """Write a task's listing records to <results_dir>/<site>/<task id>.jsonl.gz and return the path.
+
+    The file is renamed into place once complete, and a task run twice
+    (after its lease expired) simply replaces its earlier file.
+    """
+    site_dir = os.path.join(results_dir, task['site'])
+    os.makedirs(site_dir, exist_ok=True)
+    path = os.path.join(site_dir, f"{task['id']}.jsonl.gz")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temp_path, path)
+    return path
+
+
+def read_task_results(path):
+    """Read the listing records of one task results file."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ListingSink:
+    """Destination that receives listing records page by page as they are scraped.
+
+    Records are buffered until buffer_size of them are waiting, then written
+    with write_batch, so memory stays bounded however many pages are scraped.
+    """
+
+    # Stage name under which writes are timed when the sink has metrics
+    stage = 'sink_write'
+
+    def __init__(self, buffer_size=1):
+        """Set how many records may wait in memory before being written."""
+        self.buffer_size = buffer_size
+        self.buffer = []
+        # Pages may arrive from several crawl threads at once
+        self.lock = threading.Lock()
+        # Set by the scraper to time the writes
+        self.metrics = None
+
+    def write(self, records):
+        """Queue records, writing them out once the buffer is full."""
+        with self.lock:
+            self.buffer.extend(records)
+            if len(self.buffer) >= self.buffer_size:
+                self._flush()
+
+    def flush(self):
+        """Write out everything still buffered."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        """Write the buffer without taking the lock."""
+        if self.buffer:
+            with stage_timer(self.metrics, self.stage):
+                self.write_batch(self.buffer)
+            self.buffer = []
+
+    def write_batch(self, records):
+        """Write a batch of records to the destination."""
+        raise NotImplementedError
+
+    def close(self):
+        """Flush remaining records and release the destination."""
+        self.flush()
+
+
+class DatabaseSink(ListingSink):
+    """Upsert each page's listings into a ListingDatabase as soon as it is scraped."""
+
+    stage = 'db_write'
+
+    def __init__(self, db, buffer_size=1):
+        """Write to an already connected ListingDatabase."""
+        super().__init__(buffer_size)
+        self.db = db
+
+    def write_batch(self, records):
+        """Upsert the records by URL."""
+        self.db.upsert_listings(records)
+
+
+class CsvSink(ListingSink):
+    """Append each page's listings to a per-phrase CSV file."""
+
+    stage = 'csv_write'
+
+    def __init__(self, filename_template="{phrase}_{timestamp}.csv", buffer_size=1):
+        """Name files from a template with {phrase} and {timestamp} (the sink's creation time)."""
+        super().__init__(buffer_size)
+        self.filename_template = filename_template
+        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def path_for(self, search_phrase):
+        """Return the CSV file the phrase's listings are appended to."""
+        return self.filename_template.format(phrase=search_phrase.replace(' ', '_'), timestamp=self.timestamp)
+
+    def write_batch(self, records):
+        """Append records to their phrases' files, writing a header to new files."""
+        df = pd.DataFrame(records)
+        for phrase, group in df.groupby('search_phrase', sort=False):
+            path = self.path_for(phrase)
+            group.to_csv(path, mode='a', header=not os.path.exists(path), index=False, encoding='utf-8')
+
+
+def partition_value(text):
+    """Make a phrase safe to use as a partition directory name."""
+    return re.sub(r'[^\w-]+', '_', text.strip().lower()).strip('_') or '_'
+
+
+# Columns of the Parquet export that aren't plain strings
+PARQUET_FLOAT_COLUMNS = ('price_value', 'square_meters', 'price_per_sqm')
+
+
+class ParquetSink(ListingSink):
+    """Append listings to a Parquet dataset partitioned by site, phrase and scrape date.
+
+    Files land in <directory>/site=<site>/phrase=<phrase>/date=<YYYY-MM-DD>/,
+    one file per partition and run with one row group per flushed buffer, so
+    every run adds files next to the earlier ones instead of rewriting them.
+    """
+
+    stage = 'parquet_write'
+
+    def __init__(self, directory="parquet", buffer_size=5000, site="olx"):
+        """Write the dataset under directory; larger buffers give fewer, larger row groups."""
+        super().__init__(buffer_size)
+        self.directory = directory
+        self.site = site
+        # Unique per sink, so runs never overwrite each other's files
+        self.file_name = f"part-{datetime.now():%Y%m%d_%H%M%S}-{os.getpid()}-{random.getrandbits(32):08x}.parquet"
+        self.writers = {}
+        # pyarrow is only needed when Parquet output is requested
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.schema = pa.schema([
+            (column,
+             pa.float64() if column in PARQUET_FLOAT_COLUMNS
+             else pa.timestamp('s') if column == 'scraped_date'
+             else pa.string())
+            for column in ListingDatabase.LISTING_COLUMNS
+        ])
+
+    def path_for(self, search_phrase, date):
+        """Return the file a phrase's listings scraped on a date are appended to during this run."""
+        return os.path.join(
+            self.directory, f"site={self.site}", f"phrase={partition_value(search_phrase)}", f"date={date}",
+            self.file_name
+        )
+
+    def write_batch(self, records):
+        """Append records to their partitions' files as a new row group."""
+        df = pd.DataFrame(records, columns=list(ListingDatabase.LISTING_COLUMNS))
+        for column in PARQUET_FLOAT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        df['scraped_date'] = pd.to_datetime(df['scraped_date'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+        dates = df['scraped_date'].dt.strftime('%Y-%m-%d').fillna('unknown')
+        for (phrase, date), group in df.groupby([df['search_phrase'], dates], sort=False):
+            path = self.path_for(phrase, date)
+            if path not in self.writers:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.writers[path] = self.pq.ParquetWriter(path, self.schema)
+            table = self.pa.Table.from_pandas(group, schema=self.schema, preserve_index=False)
+            self.writers[path].write_table(table)
+
+    def close(self):
+        """Flush and finalize all Parquet files."""
+        super().close()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def read_parquet_listings(directory="parquet", columns=None, site=None, search_phrase=None, since=None):
+    """Read listings from a ParquetSink dataset into a DataFrame.
+
+    Only the given columns are read, and only the partitions matching site,
+    search_phrase and scrape dates from `since` ("YYYY-MM-DD") onwards.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    
+    partitioning = ds.partitioning(
+        pa.schema([('site', pa.string()), ('phrase', pa.string()), ('date', pa.string())]), flavor='hive'
+    )
+    dataset = ds.dataset(directory, format='parquet', partitioning=partitioning)
+    conditions = []
+    if site:
+        conditions.append(ds.field('site') == site)
+    if search_phrase:
+        conditions.append(ds.field('phrase') == partition_value(search_phrase))
+    if since:
+        conditions.append(ds.field('date') >= since)
+    row_filter = None
+    for condition in conditions:
+        row_filter = condition if row_filter is None else row_filter & condition
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+# Field extraction helpers, compiled once at import and shared by every parser and worker process
+
+# Area in any unit, e.g. "50 m2", "50m2", "50,5 mkw", "50 m²", "50 metrów"; the first area in the text wins
+AREA_PATTERN = re.compile(r'(\d+(?:[.,]\d*)?)\s*(?:m2|mkw|m²|metr[óy]w)', re.IGNORECASE)
+
+# First number in a price, with any spaces or separators between its digits
+PRICE_NUMBER = re.compile(r"\d(?:[\d\s.,']*\d)?")
+PRICE_SPACES = re.compile(r"[\s']")
+
+# Keywords per category, checked in this order; the first category with a keyword in the title wins
+CATEGORY_KEYWORDS = {
+    'electronics': ['laptop', 'komputer', 'telefon', 'smartfon', 'tablet', 'tv', 'telewizor', 'elektronika'],
+    'vehicles': ['samochód', 'auto', 'samochod', 'pojazd', 'motocykl', 'skuter', 'rower'],
+    'real estate': ['mieszkanie', 'dom', 'działka', 'dzialka', 'nieruchomość', 'nieruchomosc'],
+    'jobs': ['praca', 'etat', 'zatrudnienie', 'zatrudnię', 'zatrudnie', 'job'],
+    'services': ['usługa', 'usluga', 'usługi', 'uslugi', 'serwis'],
+    'fashion': ['ubranie', 'odzież', 'odziez', 'buty', 'kurtka', 'spodnie', 'sukienka'],
+    'furniture': ['meble', 'stół', 'stol', 'krzesło', 'krzeslo', 'szafa', 'łóżko', 'lozko', 'sofa'],
+}
+
+
+def compile_category_patterns(keywords):
+    """Compile one alternation per category, so each title costs a few C-level scans instead of a loop per keyword."""
+    return [
+        (category, re.compile('|'.join(re.escape(keyword) for keyword in sorted(words, key=len, reverse=True))))
+        for category, words in keywords.items() if words
+    ]
+
+
+CATEGORY_PATTERNS = compile_category_patterns(CATEGORY_KEYWORDS)
+
+
+def parse_price(price_text):
+    """Return the first number in a price text as a float, or 0.0 if there is none.
+
+    Spaces, and dots or commas followed by exactly three digits, are read as
+    thousand separators ("1 200 000 zł", "1.200.000", "1,200.50"); otherwise
+    the last dot or comma is the decimal point ("1200,50 zł").
+    """
+    match = PRICE_NUMBER.search(price_text) if price_text else None
+    if not match:
+        return 0.0
+    number = PRICE_SPACES.sub('', match.group())
+    dot = number.rfind('.')
+    comma = number.rfind(',')
+    if dot >= 0 and comma >= 0:
+        # Both used: whichever comes last is the decimal point
+        thousands, decimal = (',', '.') if dot > comma else ('.', ',')
+        number = number.replace(thousands, '').replace(decimal, '.')
+    elif dot >= 0 or comma >= 0:
+        separator = '.' if dot >= 0 else ','
+        parts = number.split(separator)
+        if len(parts) > 2 or len(parts[-1]) == 3:
+            number = ''.join(parts)
+        else:
+            number = '.'.join(parts)
+    return float(number)
+
+
+def parse_square_meters(text):
+    """Return the first area found in the text in square meters, or 0.0."""
+    match = AREA_PATTERN.search(text) if text else None
+    if not match:
+        return 0.0
+    return float(match.group(1).replace(',', '.'))
+
+
+def classify_category(title, patterns=CATEGORY_PATTERNS):
+    """Return the first category in CATEGORY_KEYWORDS with a keyword in the title, or 'other'."""
+    title_lower = title.lower()
+    for category, pattern in patterns:
+        if pattern.search(title_lower):
+            return category
+    return 'other'
+
+
+class KeywordClassifier:
+    """Category rules: the first category with one of its keywords in the title wins."""
+
+    def __init__(self, keywords=None):
+        """Use a dict of category -> keywords, or CATEGORY_KEYWORDS."""
+        self.keywords = keywords or CATEGORY_KEYWORDS
+        self.patterns = compile_category_patterns(self.keywords)
+
+    @classmethod
+    def load(cls, path):
+        """Load rules from a JSON file holding a dict of category -> keywords."""
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def predict(self, titles):
+        """Return the category of every title."""
+        return [classify_category(title, self.patterns) for title in titles]
+
+
+# Words in a title, for the n-gram classifier
+TITLE_WORD = re.compile(r'\w+')
+
+
+class HashedNgramClassifier:
+    """Linear softmax classifier over hashed word and character n-grams of listing titles.
+
+    Word unigrams and bigrams plus character trigrams within words are hashed
+    into n_features buckets with crc32, which is stable across processes, so
+    a trained model can be saved, loaded by parse workers and run on CPU with
+    NumPy alone. Titles are scored in batches: the weight rows of all their
+    features are gathered at once and summed per title.
+    """
+
+    def __init__(self, classes=(), n_features=2 ** 18, weights=None):
+        """Create an untrained model, or one from saved classes and weights."""
+        self.classes = list(classes)
+        self.n_features = n_features
+        # The extra last row is the bias feature every title has
+        self.weights = weights if weights is not None else np.zeros((n_features + 1, len(self.classes)), np.float32)
+
+    def features(self, title):
+        """Return the hashed feature indices of one title."""
+        words = TITLE_WORD.findall(title.lower())
+        tokens = [f"w:{word}" for word in words]
+        tokens += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            tokens += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return [zlib.crc32(token.encode('utf-8')) % self.n_features for token in tokens] + [self.n_features]
+
+    def _featurize(self, titles):
+        """Return all feature indices of the titles, and where each title's features start."""
+        per_title = [self.features(title) for title in titles]
+        counts = np.fromiter((len(indices) for indices in per_title), np.int64, len(per_title))
+        indices = np.fromiter((index for title_indices in per_title for index in title_indices), np.int64, counts.sum())
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        return indices, starts, counts
+
+    def _scores(self, indices, starts):
+        """Sum the weights of each title's features into a (titles, classes) score matrix."""
+        return np.add.reduceat(self.weights[indices], starts, axis=0)
+
+    def predict_proba(self, titles):
+        """Return a (titles, classes) matrix of class probabilities."""
+        if not titles:
+            return np.zeros((0, len(self.classes)))
+        indices, starts, _ = self._featurize(titles)
+        return softmax(self._scores(indices, starts))
+
+    def predict(self, titles):
+        """Return the most likely category of every title."""
+        if not titles:
+            return []
+        return [self.classes[i] for i in self.predict_proba(titles).argmax(axis=1)]
+
+    def fit(self, titles, labels, epochs=5, learning_rate=0.5, batch_size=256, seed=0):
+        """Train on labeled titles with mini-batch gradient descent on the cross-entropy loss."""
+        self.classes = sorted(set(labels))
+        class_index = {category: i for i, category in enumerate(self.classes)}
+        targets = np.array([class_index[label] for label in labels])
+        self.weights = np.zeros((self.n_features + 1, len(self.classes)), np.float32)
+        indices, starts, counts = self._featurize(titles)
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            for batch in np.array_split(rng.permutation(len(titles)), max(1, len(titles) // batch_size)):
+                batch_indices = np.concatenate([indices[starts[i]:starts[i] + counts[i]] for i in batch])
+                batch_counts = counts[batch]
+                batch_starts = np.concatenate(([0], np.cumsum(batch_counts)[:-1]))
+                gradient = softmax(self._scores(batch_indices, batch_starts))
+                gradient[np.arange(len(batch)), targets[batch]] -= 1
+                # Every feature of a title gets that title's gradient
+                rows = np.repeat(np.arange(len(batch)), batch_counts)
+                np.add.at(self.weights, batch_indices, -learning_rate / len(batch) * gradient[rows])
+        return self
+
+    def evaluate(self, titles, labels):
+        """Return accuracy and throughput (titles per second) on labeled titles."""
+        started = time.perf_counter()
+        predicted = self.predict(titles)
+        elapsed = time.perf_counter() - started
+        correct = sum(p == label for p, label in zip(predicted, labels))
+        return {
+            'titles': len(titles),
+            'accuracy': correct / len(titles) if titles else 0.0,
+            'titles_per_second': len(titles) / elapsed if elapsed else 0.0,
+        }
+
+    def save(self, path):
+        """Save the model as a NumPy .npz file."""
+        np.savez_compressed(path, weights=self.weights, classes=np.array(self.classes), n_features=self.n_features)
+
+    @classmethod
+    def load(cls, path):
+        """Load a model saved with save()."""
+        with np.load(path) as data:
+            return cls([str(category) for category in data['classes']], int(data['n_features']), data['weights'])
+
+
+def softmax(scores):
+    """Row-wise softmax of a score matrix."""
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def load_category_classifier(path=None):
+    """Return the keyword rules (default or a .json rule file) or a trained .npz model."""
+    if not path:
+        return KeywordClassifier()
+    try:
+        if path.endswith('.json'):
+            return KeywordClassifier.load(path)
+        return HashedNgramClassifier.load(path)
+    except Exception as e:
+        print(f"Could not load category model {path}: {e}. Using keyword rules instead.")
+        return KeywordClassifier()
+
+
+def train_category_model(db_path='listings.db', model_path='category_model.npz', holdout=0.2, include_other=True,
+                         epochs=5, seed=0):
+    """Train a HashedNgramClassifier on the labeled listings in the database and save it.
+
+    'other' is learned as a category like the rest, so titles that fit no
+    category aren't forced into one; with include_other=False its rows are
+    left out of training. A shuffled `holdout` share of all rows, 'other'
+    included, is kept for testing; accuracy and throughput on it are printed
+    and returned.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT title, category FROM listings WHERE title IS NOT NULL AND category IS NOT NULL"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    random.Random(seed).shuffle(rows)
+    test_size = max(1, int(len(rows) * holdout))
+    train, test = rows[test_size:], rows[:test_size]
+    if not include_other:
+        train = [(title, label) for title, label in train if label != 'other']
+    if not train:
+        print(f"Not enough labeled listings in {db_path} to train a category model")
+        return None
+    
+    started = time.perf_counter()
+    model = HashedNgramClassifier().fit([title for title, _ in train], [label for _, label in train], epochs=epochs)
+    training_time = time.perf_counter() - started
+    metrics = model.evaluate([title for title, _ in test], [label for _, label in test])
+    metrics['training_titles'] = len(train)
+    metrics['training_seconds'] = training_time
+    model.save(model_path)
+    
+    print(f"Trained on {len(train)} titles in {training_time:.1f} s, {len(model.classes)} categories")
+    print(f"Held-out accuracy: {metrics['accuracy']:.1%} on {metrics['titles']} titles, "
+          f"{metrics['titles_per_second']:,.0f} titles/s")
+    print(f"Model saved to {model_path}")
+    return metrics
+
+
+# Batches at least this large are enriched with Arrow compute kernels; smaller ones with the compiled regexes
+VECTORIZE_MIN_ROWS = 1000
+
+# AREA_PATTERN and PRICE_NUMBER for Arrow's RE2 engine, whose \s doesn't include non-breaking spaces
+ARROW_AREA_PATTERN = r'(?P<area>\d+(?:[.,]\d*)?)\s*(?:m2|mkw|m²|metr[óy]w)'
+ARROW_PRICE_NUMBER = r"(?P<number>\d(?:[\d\s\x{00a0}\x{202f}.,']*\d)?)"
+ARROW_PRICE_SPACES = r"[\s\x{00a0}\x{202f}']"
+
+
+def _parse_or_zero(parse, text):
+    """Run a scalar field parser, treating unparseable text as 0.0."""
+    try:
+        return parse(text)
+    except ValueError:
+        return 0.0
+
+
+def derive_numeric_fields(titles, price_texts):
+    """Return price_value, square_meters and price_per_sqm as float arrays for a batch of cards.
+
+    Large batches run as a few whole-column Arrow string kernels (regex
+    extract, replace, cast) when pyarrow is installed; the results match
+    parse_price and parse_square_meters card for card.
+    """
+    compute = None
+    if len(titles) >= VECTORIZE_MIN_ROWS:
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as compute
+        except ImportError:
+            pass
+    
+    if compute is None:
+        prices = np.fromiter((_parse_or_zero(parse_price, text) for text in price_texts), float, len(price_texts))
+        areas = np.fromiter((_parse_or_zero(parse_square_meters, text) for text in titles), float, len(titles))
+    else:
+        # Area: first match of the unit regex, decimal comma turned into a dot
+        area = compute.extract_regex(compute.utf8_lower(pa.array(titles, pa.string())), ARROW_AREA_PATTERN)
+        area = compute.replace_substring(compute.struct_field(area, [0]), ',', '.')
+        areas = compute.fill_null(compute.cast(area, pa.float64()), 0.0).to_numpy(zero_copy_only=False)
+        
+        # Price: same separator rules as parse_price, decided for all rows at once
+        number = compute.extract_regex(pa.array(price_texts, pa.string()), ARROW_PRICE_NUMBER)
+        number = compute.replace_substring_regex(compute.struct_field(number, [0]), ARROW_PRICE_SPACES, '')
+        fraction = compute.struct_field(compute.extract_regex(number, r'[.,](?P<fraction>\d*)$'), [0])
+        both = compute.and_(compute.match_substring(number, '.'), compute.match_substring(number, ','))
+        single = compute.and_(compute.equal(compute.count_substring_regex(number, '[.,]'), 1),
+                              compute.not_equal(compute.utf8_length(fraction), 3))
+        has_decimal = compute.fill_null(compute.or_(both, single), False)
+        whole = compute.if_else(has_decimal, compute.replace_substring_regex(number, r'[.,]\d*$', ''), number)
+        whole = compute.replace_substring_regex(whole, '[.,]', '')
+        value = compute.if_else(has_decimal, compute.binary_join_element_wise(whole, fraction, '.'), whole)
+        prices = compute.fill_null(compute.cast(value, pa.float64()), 0.0).to_numpy(zero_copy_only=False)
+    
+    price_per_sqm = np.divide(prices, areas, out=np.zeros_like(prices), where=(prices > 0) & (areas > 0))
+    return prices, areas, price_per_sqm
+
+
+def enrich_listings(cards, search_phrase, classifier=None, scraped_date=None):
+    """Turn raw (title, location, date_posted, price, url) card tuples into listing records.
+
+    Derived columns are computed for the whole batch at once, categories are
+    assigned in one classifier call, and every record gets the same
+    scraped_date (now, unless given).
+    """
+    if not cards:
+        return []
+    titles, locations, dates, price_texts, urls = (list(column) for column in zip(*cards))
+    prices, areas, price_per_sqm = derive_numeric_fields(titles, price_texts)
+    categories = (classifier or KeywordClassifier()).predict(titles)
+    scraped_date = scraped_date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    phrases = search_phrase if isinstance(search_phrase, list) else [search_phrase] * len(titles)
+    
+    return [
+        {
+            'title': title,
+            'location': location,
+            'price': price_text,
+            'price_value': price_value,
+            'url': url,
+            'date_posted': date_posted,
+            'category': category,
+            'square_meters': square_meters,
+            'price_per_sqm': sqm_price,
+            'search_phrase': phrase,
+            'scraped_date': scraped_date
+        }
+        for title, location, date_posted, price_text, url, price_value, square_meters, sqm_price, category, phrase
+        in zip(titles, locations, dates, price_texts, urls, prices.tolist(), areas.tolist(), price_per_sqm.tolist(),
+               categories, phrases)
+    ]
+
+
+# Values the extractors fill in when a field's selector matches nothing in a card
+FIELD_DEFAULTS = {'title': "No Title", 'location': "No Location", 'price': "0 zł", 'url': "No URL"}
+
+
 class ClassifiedScraper:
-    def __init__(self, site="olx"):
-        """Initialize the scraper with selected site."""
+    def __init__(self, site="olx", fetch_mode="http", base_url=None, pages_dir=None, parser_backend=None,
+                 cache_dir=None, cache_ttl=3600, offline=False, block_resources=True, blocklist=None,
+                 category_model=None):
+        """Initialize the scraper with selected site.
+
+        site names a registered SiteAdapter. fetch_mode is "http" (pooled HTTP
+        client, falling back to Selenium when a page needs JavaScript) or
+        "browser" (Selenium only, the original flow). base_url overrides the
+        site root, e.g. with a local server serving saved pages. If pages_dir
+        is set, every fetched search page is saved there. parser_backend is
+        "lxml" or "html.parser" (BeautifulSoup); by default the site's own.
+        cache_dir enables the on-disk page cache with cache_ttl seconds of
+        freshness; offline replays runs purely from that cache. With
+        block_resources, Chrome skips images, fonts, media and the trackers in
+        blocklist (DEFAULT_BLOCKLIST by default). category_model is a keyword
+        rule file (.json) or a model trained with train_category_model (.npz);
+        by default the built-in keyword rules are used.
+        """
         self.site = site.lower()
+        if self.site not in SITE_ADAPTERS:
+            print(f"Site {self.site} not supported. Using OLX as default.")
+            self.site = "olx"
+        self.adapter = SITE_ADAPTERS[self.site]
+        self.parser_backend = parser_backend or self.adapter.parser_backend
+        # Resolve the extraction function once instead of per page
+        self._extract_cards = self.adapter.extractors[self.parser_backend]
+        # Categories are assigned per page, a batch of titles at a time
+        self.category_model = category_model
+        self.classifier = load_category_classifier(category_model)
+        self.fetch_mode = fetch_mode
+        self.base_url = (base_url or self.adapter.base_url).rstrip('/')
         self.driver = None
         self.listings = []
+        # Listings scraped for the current phrase, including ones already handed to sinks
+        self.scraped_count = 0
+        # Paces every request per host; replaced by run_scraper with its requests_per_second
+        self.rate_limiter = AdaptiveRateLimiter()
+        # Known URLs for incremental runs; paging stops once a page's known share reaches seen_threshold
+        self.seen_index = None
+        self.seen_threshold = 0.8
+        self.stop_paging = False
+        # Price changes, new and delisted ads; set up by run_scraper(track_changes=True)
+        self.change_detector = None
+        # Phrases whose crawl reached the end of the results, so missing ads count as delisted
+        self.exhausted_phrases = set()
+        # Pages that could not be fetched, per phrase; such a phrase is left for --resume
+        self.failed_pages = {}
+        self.last_page_reached = False
+        # Streaming destinations set up by run_scraper(stream=True); empty means keep listings in memory
+        self.sinks = []
+        self.csv_sink = None
+        # While streaming, the columns the statistics need, per phrase, so its CSV isn't read back
+        self.aggregate_columns = {}
+        # Parquet dataset written at the end of each phrase when not streaming
+        self.parquet_sink = None
+        # Excel workbooks are optional; export_excel can build them later from Parquet
+        self.write_excel = True
+        self.db = None
         self.db_conn = None
+        self.http_fetcher = None
+        self.browser_fetcher = SeleniumFetcher(self)
+        # Shared by every Chrome driver this scraper starts
+        self.resource_blocker = ResourceBlocker(blocklist) if block_resources else None
+        # Stage timings and counters; a fresh set is started by each run_scraper call
+        self.metrics = Metrics({'site': self.site})
+        # Process pool for HTML parsing, created by run_scraper when parse_workers is set
+        self.parse_executor = None
+        # Charts render in their own process pool, started on first use; 0 workers renders inline
+        self.chart_workers = 0
+        self.chart_executor = None
+        self.chart_futures = []
+        # Names the charts/<phrase>/<run_id> directory of this run
+        self.run_id = None
+        # Listings stored per phrase by the last run_scraper call
+        self.phrase_counts = {}
+        # Directory to keep fetched search pages in, for later bulk reparsing
+        self.pages_dir = pages_dir
+        # Offline replay needs the cache and never starts a browser
+        self.offline = offline
+        if offline:
+            cache_dir = cache_dir or "page_cache"
+            self.fetch_mode = "http"
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self.page_cache = None
         
         # User agent rotation list
         self.user_agents = [
@@ -38,119 +2507,326 @@ class ClassifiedScraper:
         ]
         
     def setup_driver(self):
-        """Set up the Selenium WebDriver with rotating user agent."""
-        chrome_options = Options()
-        # Run in headless mode - comment out if you want to see the browser
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--disable-notifications")
-        
+        """Set up the Selenium WebDriver with rotating user agent; raises RuntimeError if Chrome fails to start."""
         # Select a random user agent
         user_agent = random.choice(self.user_agents)
-        chrome_options.add_argument(f"user-agent={user_agent}")
-        
-        # Additional options to avoid detection
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option("useAutomationExtension", False)
         
         try:
-            self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-            
-            # Modify navigator properties to avoid detection
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            with self.metrics.time('driver_startup'):
+                self.driver = create_driver(user_agent, self.resource_blocker)
             print(f"WebDriver setup with user agent: {user_agent}")
         except Exception as e:
             print(f"Error setting up WebDriver: {e}")
-            exit(1)
+            raise RuntimeError(f"WebDriver could not be started: {e}") from e
     
+    def ensure_driver(self):
+        """Start the browser on first use so HTTP-only runs never launch Chrome."""
+        if self.driver:
+            return
+        self.setup_driver()
+        self.navigate_to_site()
+        self.handle_popups()
+
+    def listing_selector(self):
+        """Return the CSS selector matching one listing card on the current site."""
+        return self.adapter.listing_selector
+
+    def build_search_url(self, search_phrase, page=1):
+        """Build the search results URL for a phrase and page number."""
+        return self.adapter.build_search_url(self.base_url, search_phrase, page)
+
+    def fetch_search_page(self, search_phrase, page=1):
+        """Fetch a search results page over HTTP, falling back to the browser if needed.
+
+        With a page cache, fresh cached pages are returned without any request
+        and stale ones are revalidated with ETag/Last-Modified. In offline mode
+        only the cache is used. The browser is only used when a page has no
+        results container at all (it is rendered by JavaScript); a results
+        page without listings is returned as it is and ends the phrase.
+        Returns None if the page could not be fetched.
+        """
+        url = self.build_search_url(search_phrase, page)
+
+        self.open_page_cache()
+        cached = self.page_cache.get(url) if self.page_cache else None
+        if cached and (cached['fresh'] or self.offline):
+            print(f"Loaded page {page} from cache: {url}")
+            self.metrics.inc('pages', source='cache')
+            return cached['html']
+        if self.offline:
+            print(f"Page {page} is not cached, skipping (offline): {url}")
+            return None
+
+        if self.fetch_mode == "http":
+            if not self.http_fetcher:
+                self.http_fetcher = HttpFetcher(random.choice(self.user_agents))
+            # After a block the limiter pauses the host, so retrying is safe
+            for attempt in range(BLOCK_RETRIES + 1):
+                self.rate_limiter.wait(url)
+                with self.metrics.time('fetch'):
+                    response = self.http_fetcher.get(url, PageCache.validators(cached))
+                if response is None:
+                    self.metrics.inc('errors', stage='fetch')
+                    return None
+                self.metrics.inc('http_responses', status=str(response.status_code))
+                page_source = response.text if response.status_code == 200 else None
+                if not self.rate_limiter.record(
+                    url, response.status_code, self._is_blocked(page_source), response.headers.get('Retry-After')
+                ):
+                    break
+            else:
+                print(f"Still blocked after {BLOCK_RETRIES} retries, giving up on page {page}")
+                return None
+            
+            if response.status_code == 304 and cached:
+                print(f"Page {page} not modified, using cache: {url}")
+                self.metrics.inc('pages', source='not_modified')
+                self.page_cache.touch(url)
+                return cached['html']
+
+            if response.status_code != 200:
+                print(f"HTTP {response.status_code} for page {page}: {url}")
+                self.metrics.inc('errors', stage='fetch')
+                return None
+
+            # Listings present in the raw HTML mean no JavaScript rendering is needed,
+            # and a results container without them is a page past the last one.
+            # A plain text search keeps HTML parsing out of the fetch path.
+            has_listings = self.adapter.listing_marker.search(page_source)
+            if has_listings or self.adapter.results_marker.search(page_source):
+                print(f"Fetched page {page} over HTTP{'' if has_listings else ' (no results)'}: {url}")
+                self.metrics.inc('pages', source='http')
+                self._save_page(search_phrase, page, page_source)
+                if self.page_cache:
+                    self.page_cache.put(
+                        url, page_source, response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    )
+                return page_source
+            print(f"No results container in HTTP response for page {page}, falling back to browser")
+
+        self.rate_limiter.wait(url)
+        page_source = self.browser_fetcher.fetch(url)
+        if page_source and self.rate_limiter.record(url, blocked=self._is_blocked(page_source)):
+            return None
+        if page_source:
+            print(f"Fetched page {page} with browser: {url}")
+            self.metrics.inc('pages', source='browser')
+            self._save_page(search_phrase, page, page_source)
+            if self.page_cache:
+                self.page_cache.put(url, page_source)
+        return page_source
+
+    def _is_blocked(self, page_source):
+        """Return True if a page is a captcha/challenge page rather than search results."""
+        return bool(
+            page_source
+            and not self.adapter.listing_marker.search(page_source)
+            and BLOCK_MARKER.search(page_source)
+        )
+
+    def open_page_cache(self):
+        """Open the page cache if one is configured and not open yet."""
+        if self.cache_dir and not self.page_cache:
+            self.page_cache = PageCache(self.cache_dir, ttl=self.cache_ttl)
+
+    def _save_page(self, search_phrase, page, page_source):
+        """Write a fetched page to pages_dir (if set) so it can be reparsed later."""
+        if not self.pages_dir:
+            return
+        try:
+            site_dir = os.path.join(self.pages_dir, self.site)
+            os.makedirs(site_dir, exist_ok=True)
+            filename = f"{search_phrase.replace(' ', '_')}_p{page}.html"
+            with open(os.path.join(site_dir, filename), 'w', encoding='utf-8') as f:
+                f.write(page_source)
+        except OSError as e:
+            print(f"Error saving page {page} of '{search_phrase}': {e}")
+
+    def submit_parse(self, page_source, search_phrase):
+        """Parse a page in the parse process pool; returns a Future of the listing records.
+
+        Without a pool the page is parsed immediately and a completed Future is returned.
+        """
+        future = concurrent.futures.Future()
+        if self.parse_executor:
+            def collect(worker_future):
+                try:
+                    records, timings, counters = worker_future.result()
+                except Exception as e:
+                    future.set_exception(e)
+                    return
+                # The worker's parse and enrich timings and counters go into this run's metrics, like chart renders
+                for stage, seconds in timings:
+                    self.metrics.observe('stage_seconds', seconds, stage=stage)
+                for name, labels, value in counters:
+                    self.metrics.inc(name, value, **labels)
+                future.set_result(records)
+
+            self.parse_executor.submit(
+                _parse_page_worker, self.site, self.parser_backend, page_source, search_phrase, self.category_model
+            ).add_done_callback(collect)
+            return future
+        future.set_result(self.parse_listings(page_source, search_phrase))
+        return future
+
+    def _collect_parsed(self, future):
+        """Store the records of a finished parse and return how many there were."""
+        try:
+            # Time spent blocked on the parse pool (in-process parses are timed in parse_listings)
+            with stage_timer(self.metrics if self.parse_executor else None, 'parse_wait'):
+                records = future.result()
+        except Exception as e:
+            print(f"Error scraping page: {e}")
+            self.metrics.inc('errors', stage='parse')
+            records = []
+        self.listings.extend(self._emit_page(records))
+        self.scraped_count += len(records)
+        print(f"Scraped {self.scraped_count} listings so far")
+        if self._page_mostly_seen(records):
+            self.stop_paging = True
+        return len(records)
+
+    def _page_mostly_seen(self, records):
+        """In incremental runs, return True if enough of the page is already stored to stop paging."""
+        if not self.seen_index or not records:
+            return False
+        ratio = self.seen_index.seen_ratio(records)
+        if ratio < self.seen_threshold:
+            return False
+        print(f"{ratio:.0%} of this page's listings are already known, no further pages needed")
+        return True
+
+    def _emit_page(self, records):
+        """Hand a page of records to the sinks when streaming; returns what to keep in memory."""
+        self._count_page(records)
+        if self.change_detector:
+            self.change_detector.diff(records)
+        if not self.sinks:
+            return records
+        for sink in self.sinks:
+            sink.write(records)
+        if records and not self.write_excel:
+            # A page holds the listings of one phrase
+            columns = self.aggregate_columns.setdefault(
+                records[0]['search_phrase'], {column: [] for column in AGGREGATE_COLUMNS}
+            )
+            for column, values in columns.items():
+                values.extend(record[column] for record in records)
+        return []
+
+    def _count_page(self, records):
+        """Count a parsed page, its listings, and the card fields whose selector matched nothing."""
+        metrics = self.metrics
+        metrics.inc('parsed_pages')
+        metrics.inc('listings', len(records))
+        metrics.observe('listings_per_page', len(records), buckets=(0, 1, 5, 10, 20, 40, 60, 100))
+        if not records:
+            metrics.inc('empty_pages')
+        for field, default in FIELD_DEFAULTS.items():
+            misses = sum(1 for record in records if record[field] == default)
+            if misses:
+                metrics.inc('selector_misses', misses, field=field)
+
+    def reparse_directory(self, directory, search_phrase=None, workers=None):
+        """Parse every saved .html page in a directory in bulk, using a process pool.
+
+        The search phrase of each page is taken from its file name (as written
+        via pages_dir) unless search_phrase is given. Returns the listings,
+        which are also stored in self.listings.
+        """
+        paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.html')
+        )
+        if not paths:
+            print(f"No saved pages found in {directory}")
+            return []
+
+        def page_phrase(path):
+            if search_phrase:
+                return search_phrase
+            stem = os.path.splitext(os.path.basename(path))[0]
+            return re.sub(r'_p\d+$', '', stem).replace('_', ' ')
+
+        def read_pages(batch):
+            for path in batch:
+                with open(path, encoding='utf-8') as f:
+                    yield f.read()
+
+        # Workers only extract the raw card fields; the whole run is then enriched in one batch
+        cards = []
+        phrases = []
+        # Executor.map reads all of its input up front, so pages are mapped in slices
+        # to keep only one slice of HTML in memory
+        slice_size = 64 * (workers or os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(paths), slice_size):
+                batch = paths[start:start + slice_size]
+                results = executor.map(
+                    _extract_page_worker,
+                    [self.site] * len(batch), [self.parser_backend] * len(batch), read_pages(batch),
+                    chunksize=8
+                )
+                for path, page_cards in zip(batch, results):
+                    cards.extend(page_cards)
+                    phrases.extend([page_phrase(path)] * len(page_cards))
+        self.listings = enrich_listings(cards, phrases, self.classifier)
+
+        print(f"Reparsed {len(paths)} pages into {len(self.listings)} listings")
+        return self.listings
+
     def setup_database(self):
         """Set up SQLite database for storing listings."""
         try:
-            # Connect to SQLite database (will be created if it doesn't exist)
-            self.db_conn = sqlite3.connect('listings.db')
-            cursor = self.db_conn.cursor()
-            
-            # Create table if it doesn't exist
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS listings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                location TEXT,
-                price TEXT,
-                price_value REAL,
-                url TEXT,
-                date_posted TEXT,
-                category TEXT,
-                square_meters REAL,
-                price_per_sqm REAL,
-                search_phrase TEXT,
-                scraped_date TEXT
-            )
-            ''')
-            
-            self.db_conn.commit()
+            self.db = ListingDatabase('listings.db')
+            self.db_conn = self.db.connect()
             print("Database setup complete")
             
         except Exception as e:
             print(f"Error setting up database: {e}")
-            if self.db_conn:
-                self.db_conn.close()
+            if self.db:
+                self.db.close()
+            self.db_conn = None
     
-    def random_wait(self, min_seconds=2, max_seconds=5):
-        """Wait for a random amount of time between requests to appear more human-like."""
-        wait_time = random.uniform(min_seconds, max_seconds)
-        time.sleep(wait_time)
-        return wait_time
-                
     def navigate_to_site(self):
-        """Navigate to the classified ads website."""
+        """Navigate to the classified ads website; on failure the driver is closed and RuntimeError raised."""
         try:
-            if self.site == "olx":
-                self.driver.get("https://www.olx.pl/")
-            elif self.site == "allegro":
-                self.driver.get("https://allegro.pl/")
-            else:
-                print(f"Site {self.site} not supported. Using OLX as default.")
-                self.driver.get("https://www.olx.pl/")
-                self.site = "olx"
+            with self.metrics.time('navigation'):
+                self.driver.get(f"{self.base_url}/")
                 
             print(f"Navigated to {self.site}")
             
-            # Dynamic wait for page to load completely
-            wait_time = self.random_wait(3, 6)
-            print(f"Waiting {wait_time:.2f} seconds for page to fully load")
+            # Wait until the search box can be used rather than a fixed time
+            try:
+                WebDriverWait(self.driver, 15).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, self.adapter.search_input))
+                )
+            except TimeoutException:
+                print("Warning: Search box did not appear in time. Continuing anyway...")
         except Exception as e:
             print(f"Error navigating to site: {e}")
-            self.cleanup()
-            exit(1)
+            # Close only the browser: an HTTP run falling back to it keeps its database and sinks
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+            raise RuntimeError(f"Could not open {self.base_url}: {e}") from e
     
     def handle_popups(self):
         """Handle common popups like cookie notices."""
         try:
-            if self.site == "olx":
-                # Handle cookie popup on OLX
-                try:
-                    cookie_button = WebDriverWait(self.driver, 8).until(
-                        EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler"))
-                    )
-                    cookie_button.click()
-                    print("Accepted cookies")
-                    self.random_wait(1, 2)  # Short wait after clicking
-                except TimeoutException:
-                    print("No cookie popup found or it has timed out")
-                    
-            elif self.site == "allegro":
-                # Handle cookie popup on Allegro
-                try:
-                    cookie_button = WebDriverWait(self.driver, 8).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-role='accept-consent']"))
-                    )
-                    cookie_button.click()
-                    print("Accepted cookies")
-                    self.random_wait(1, 2)  # Short wait after clicking
-                except TimeoutException:
-                    print("No cookie popup found or it has timed out")
+            try:
+                cookie_button = WebDriverWait(self.driver, 8).until(
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, self.adapter.cookie_button))
+                )
+                cookie_button.click()
+                print("Accepted cookies")
+                # Wait for the consent overlay to go away so it doesn't swallow clicks
+                WebDriverWait(self.driver, 5).until(
+                    EC.invisibility_of_element_located((By.CSS_SELECTOR, self.adapter.cookie_button))
+                )
+            except TimeoutException:
+                print("No cookie popup found or it has timed out")
                     
         except Exception as e:
             print(f"Error handling popups: {e}")
@@ -158,302 +2834,112 @@ class ClassifiedScraper:
     def search_listings(self, search_phrase):
         """Search for listings using the given search phrase."""
         try:
-            if self.site == "olx":
-                # Find search input and submit
-                search_input = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "input[data-testid='search-input']"))
-                )
-                search_input.clear()
-                
-                # Type search phrase with random delays between characters
-                for char in search_phrase:
-                    search_input.send_keys(char)
-                    time.sleep(random.uniform(0.05, 0.2))  # Random delay between keystrokes
-                
-                # Short pause before clicking search button to mimic human behavior
-                self.random_wait(0.5, 1.5)
-                
-                # Click search button
-                search_button = self.driver.find_element(By.CSS_SELECTOR, "button[data-testid='search-submit']")
-                search_button.click()
-                
-            elif self.site == "allegro":
-                # Find search input and submit
-                search_input = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "input[data-role='search-input']"))
-                )
-                search_input.clear()
-                
-                # Type search phrase with random delays between characters
-                for char in search_phrase:
-                    search_input.send_keys(char)
-                    time.sleep(random.uniform(0.05, 0.2))  # Random delay between keystrokes
-                
-                # Short pause before clicking search button
-                self.random_wait(0.5, 1.5)
-                
-                # Click search button
-                search_button = self.driver.find_element(By.CSS_SELECTOR, "button[data-role='search-button']")
+            # Find search input and submit
+            search_input = WebDriverWait(self.driver, 10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, self.adapter.search_input))
+            )
+            search_input.clear()
+            
+            # Type search phrase with random delays between characters
+            for char in search_phrase:
+                search_input.send_keys(char)
+                time.sleep(random.uniform(0.05, 0.2))  # Random delay between keystrokes
+            
+            # Pace the search like any other request to the site
+            self.rate_limiter.wait(self.base_url)
+            
+            # Click search button
+            previous_url = self.driver.current_url
+            search_button = self.driver.find_element(By.CSS_SELECTOR, self.adapter.search_button)
+            with self.metrics.time('navigation'):
                 search_button.click()
                 
             print(f"Searched for: {search_phrase}")
             
-            # Wait for search results to load with dynamic timing
-            wait_time = self.random_wait(4, 7)
-            print(f"Waiting {wait_time:.2f} seconds for search results to load")
-            
-            # Check if page has loaded properly
-            try:
-                if self.site == "olx":
-                    WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-cy='l-card']"))
-                    )
-                elif self.site == "allegro":
-                    WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, "article[data-role='offer']"))
-                    )
-                print("Search results page loaded successfully")
-            except TimeoutException:
-                print("Warning: Could not confirm search results loaded. Continuing anyway...")
+            # Wait for search results to be ready
+            with self.metrics.time('wait'):
+                wait_time = wait_until_ready(self.driver, self.adapter.listing_selector, previous_url=previous_url,
+                                             empty_selector=self.adapter.empty_selector)
+            if wait_time is not None:
+                print(f"Search results page ready after {wait_time:.2f} seconds")
+            self.rate_limiter.record(self.base_url, blocked=self._is_blocked(self.driver.page_source))
             
         except Exception as e:
             print(f"Error searching listings: {e}")
             
-    def scrape_page(self, search_phrase):
-        """Scrape listing data from the current page."""
+    def scrape_page(self, search_phrase, page_source=None):
+        """Scrape listing data from the given HTML, or from the current browser page."""
         try:
             # Get page source for BeautifulSoup
-            page_source = self.driver.page_source
-            soup = BeautifulSoup(page_source, 'html.parser')
-            
-            if self.site == "olx":
-                # Find all listing items on OLX
-                listing_items = soup.select('div[data-cy="l-card"]')
-                
-                for item in listing_items:
-                    try:
-                        # Extract title
-                        title_element = item.select_one('h6')
-                        title = title_element.text.strip() if title_element else "No Title"
-                        
-                        # Extract location and date
-                        location_element = item.select_one('p[data-testid="location-date"]')
-                        location_text = location_element.text.strip() if location_element else "No Location"
-                        
-                        # Extract location (before the date)
-                        location = location_text.split(' - ')[0] if ' - ' in location_text else location_text
-                        
-                        # Extract date posted (after the location)
-                        date_posted = location_text.split(' - ')[1] if ' - ' in location_text else "No Date"
-                        
-                        # Extract price
-                        price_element = item.select_one('p[data-testid="ad-price"]')
-                        price_text = price_element.text.strip() if price_element else "0 zł"
-                        
-                        # Extract numeric price for analysis
-                        price_value = self._extract_price(price_text)
-                        
-                        # Extract URL
-                        url_element = item.select_one('a')
-                        url = url_element['href'] if url_element and 'href' in url_element.attrs else "No URL"
-                        if url.startswith('/'):
-                            url = f"https://www.olx.pl{url}"
-                        
-                        # Extract square meters from title
-                        square_meters = self._extract_square_meters(title)
-                        
-                        # Calculate price per square meter if both values are available
-                        price_per_sqm = price_value / square_meters if price_value > 0 and square_meters > 0 else 0
-                        
-                        # Extract category if possible
-                        category = self._extract_category(title)
-                        
-                        # Add data to listings
-                        self.listings.append({
-                            'title': title,
-                            'location': location,
-                            'price': price_text,
-                            'price_value': price_value,
-                            'url': url,
-                            'date_posted': date_posted,
-                            'category': category,
-                            'square_meters': square_meters,
-                            'price_per_sqm': price_per_sqm,
-                            'search_phrase': search_phrase,
-                            'scraped_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        })
-                        
-                    except Exception as e:
-                        print(f"Error scraping individual listing: {e}")
-                        continue
-                        
-            elif self.site == "allegro":
-                # Find all listing items on Allegro
-                listing_items = soup.select('article[data-role="offer"]')
-                
-                for item in listing_items:
-                    try:
-                        # Extract title
-                        title_element = item.select_one('h2')
-                        title = title_element.text.strip() if title_element else "No Title"
-                        
-                        # Extract location (if available)
-                        location_element = item.select_one('div[data-role="seller-info"] span')
-                        location = location_element.text.strip() if location_element else "No Location"
-                        
-                        # Extract date posted (not always available on Allegro search page)
-                        date_posted = "Not available"  # Default value
-                        
-                        # Extract price
-                        price_element = item.select_one('div[data-role="price"]')
-                        price_text = price_element.text.strip() if price_element else "0 zł"
-                        
-                        # Extract numeric price for analysis
-                        price_value = self._extract_price(price_text)
-                        
-                        # Extract URL
-                        url_element = item.select_one('a')
-                        url = url_element['href'] if url_element and 'href' in url_element.attrs else "No URL"
-                        
-                        # Extract square meters from title
-                        square_meters = self._extract_square_meters(title)
-                        
-                        # Calculate price per square meter if both values are available
-                        price_per_sqm = price_value / square_meters if price_value > 0 and square_meters > 0 else 0
-                        
-                        # Extract category if possible
-                        category = self._extract_category(title)
-                        
-                        # Add data to listings
-                        self.listings.append({
-                            'title': title,
-                            'location': location,
-                            'price': price_text,
-                            'price_value': price_value,
-                            'url': url,
-                            'date_posted': date_posted,
-                            'category': category,
-                            'square_meters': square_meters,
-                            'price_per_sqm': price_per_sqm,
-                            'search_phrase': search_phrase,
-                            'scraped_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        })
-                        
-                    except Exception as e:
-                        print(f"Error scraping individual listing: {e}")
-                        continue
-                        
-            print(f"Scraped {len(self.listings)} listings so far")
-            
+            if page_source is None:
+                with self.metrics.time('page_source'):
+                    page_source = self.driver.page_source
+                self.metrics.inc('pages', source='browser')
+                if self.resource_blocker:
+                    self.resource_blocker.collect(self.driver)
         except Exception as e:
             print(f"Error scraping page: {e}")
-    
-    def _extract_price(self, price_text):
-        """Extract numeric price value from price text."""
-        try:
-            # Remove currency symbol and spaces, keep only digits and decimal point
-            price_digits = re.sub(r'[^\d.]', '', price_text.replace(',', '.'))
-            if price_digits:
-                return float(price_digits)
-            return 0.0
-        except:
-            return 0.0
-    
-    def _extract_square_meters(self, text):
-        """Extract square meters from text."""
+            return 0
+
+        return self._collect_parsed(self.submit_parse(page_source, search_phrase))
+
+    def parse_listings(self, page_source, search_phrase):
+        """Parse a search results page into a list of listing records."""
+        listings = []
         try:
-            # Look for common patterns like "50 m2", "50m2", "50 mkw", etc.
-            patterns = [
-                r'(\d+[\.,]?\d*)\s*m2',
-                r'(\d+[\.,]?\d*)\s*mkw',
-                r'(\d+[\.,]?\d*)\s*m²',
-                r'(\d+[\.,]?\d*)\s*metr[óy]w'
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
-                if match:
-                    # Replace comma with dot and convert to float
-                    return float(match.group(1).replace(',', '.'))
-            
-            return 0.0
-        except:
-            return 0.0
-    
-    def _extract_category(self, title):
-        """Try to extract a category from the title."""
-        # This is a simple implementation - you might want to improve this with
-        # more sophisticated categorization based on your specific needs
-        title_lower = title.lower()
-        
-        categories = {
-            'electronics': ['laptop', 'komputer', 'telefon', 'smartfon', 'tablet', 'tv', 'telewizor', 'elektronika'],
-            'vehicles': ['samochód', 'auto', 'samochod', 'pojazd', 'motocykl', 'skuter', 'rower'],
-            'real estate': ['mieszkanie', 'dom', 'działka', 'dzialka', 'nieruchomość', 'nieruchomosc'],
-            'jobs': ['praca', 'etat', 'zatrudnienie', 'zatrudnię', 'zatrudnie', 'job'],
-            'services': ['usługa', 'usluga', 'usługi', 'uslugi', 'serwis'],
-            'fashion': ['ubranie', 'odzież', 'odziez', 'buty', 'kurtka', 'spodnie', 'sukienka'],
-            'furniture': ['meble', 'stół', 'stol', 'krzesło', 'krzeslo', 'szafa', 'łóżko', 'lozko', 'sofa'],
-            'other': []
-        }
-        
-        for category, keywords in categories.items():
-            if any(keyword in title_lower for keyword in keywords):
-                return category
+            with self.metrics.time('parse'):
+                cards = list(self._extract_cards(page_source))
+            # Derive prices, areas, categories and the timestamp for the whole page at once
+            with self.metrics.time('enrich'):
+                listings = enrich_listings(cards, search_phrase, self.classifier)
+        except Exception as e:
+            print(f"Error scraping page: {e}")
+            self.metrics.inc('errors', stage='parse')
         
-        return 'other'
-            
+        return listings
+    
     def navigate_to_next_page(self):
         """Navigate to the next page of results if available."""
         try:
-            if self.site == "olx":
-                # Look for next page button on OLX
-                try:
-                    next_button = self.driver.find_element(By.CSS_SELECTOR, 'a[data-testid="pagination-forward"]')
-                    if next_button:
-                        # Random delay before clicking next page
-                        self.random_wait(1, 3)
+            # Look for next page button
+            try:
+                next_button = self.driver.find_element(By.CSS_SELECTOR, self.adapter.next_page)
+                if next_button:
+                    # Pace clicks like any other request to the site
+                    self.rate_limiter.wait(self.base_url)
+                    previous_url = self.driver.current_url
+                    cards = self.driver.find_elements(By.CSS_SELECTOR, self.adapter.listing_selector)
+                    with self.metrics.time('navigation'):
                         next_button.click()
-                        print("Navigating to next page")
-                        
-                        # Wait for the next page to load with dynamic timing
-                        wait_time = self.random_wait(4, 7)
-                        print(f"Waiting {wait_time:.2f} seconds for next page to load")
-                        return True
-                    else:
-                        print("No more pages")
-                        return False
-                except NoSuchElementException:
-                    print("No more pages")
-                    return False
+                    print("Navigating to next page")
                     
-            elif self.site == "allegro":
-                # Look for next page button on Allegro
-                try:
-                    next_button = self.driver.find_element(By.CSS_SELECTOR, 'a[data-role="next-page"]')
-                    if next_button:
-                        # Random delay before clicking next page
-                        self.random_wait(1, 3)
-                        next_button.click()
-                        print("Navigating to next page")
-                        
-                        # Wait for the next page to load with dynamic timing
-                        wait_time = self.random_wait(4, 7)
-                        print(f"Waiting {wait_time:.2f} seconds for next page to load")
-                        return True
-                    else:
-                        print("No more pages")
-                        return False
-                except NoSuchElementException:
+                    # Wait for the next page to replace the current one and settle
+                    with self.metrics.time('wait'):
+                        wait_time = wait_until_ready(
+                            self.driver, self.adapter.listing_selector,
+                            previous_url=previous_url, old_card=cards[0] if cards else None,
+                            empty_selector=self.adapter.empty_selector
+                        )
+                    if wait_time is not None:
+                        print(f"Next page ready after {wait_time:.2f} seconds")
+                    return not self.rate_limiter.record(
+                        self.base_url, blocked=self._is_blocked(self.driver.page_source)
+                    )
+                else:
                     print("No more pages")
+                    self.last_page_reached = True
                     return False
+            except NoSuchElementException:
+                print("No more pages")
+                self.last_page_reached = True
+                return False
                     
         except Exception as e:
             print(f"Error navigating to next page: {e}")
             return False
     
     def save_to_database(self):
-        """Save the scraped data to SQLite database."""
+        """Save the scraped data to SQLite database, updating listings already stored."""
         try:
             if not self.listings:
                 print("No data to save to database")
@@ -461,390 +2947,421 @@ class ClassifiedScraper:
                 
             if not self.db_conn:
                 print("Database connection not established")
-                return False
-                
-            cursor = self.db_conn.cursor()
-            
-            # Insert each listing into the database
-            for listing in self.listings:
-                cursor.execute('''
-                INSERT INTO listings (
-                    title, location, price, price_value, url, date_posted, 
-                    category, square_meters, price_per_sqm, search_phrase, scraped_date
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    listing['title'], listing['location'], listing['price'], 
-                    listing['price_value'], listing['url'], listing['date_posted'],
-                    listing['category'], listing['square_meters'], listing['price_per_sqm'],
-                    listing['search_phrase'], listing['scraped_date']
-                ))
-                
-            self.db_conn.commit()
-            print(f"Data saved to database (listings.db)")
-            return True
-            
-        except Exception as e:
-            print(f"Error saving data to database: {e}")
-            return False
-            
-    def save_to_file(self, filename="ogloszenia.csv", excel_filename="ogloszenia.xlsx"):
-        """Save the scraped data to CSV and Excel files."""
-        try:
-            if not self.listings:
-                print("No data to save")
-                return False
-                
-            # Create DataFrame
-            df = pd.DataFrame(self.listings)
-            
-            # Save to CSV
-            df.to_csv(filename, index=False, encoding='utf-8')
-            print(f"Data saved to {filename}")
-            
-            # Save to Excel with additional summary statistics
-            with pd.ExcelWriter(excel_filename, engine='openpyxl') as writer:
-                # Main data sheet
-                df.to_excel(writer, sheet_name='Listings', index=False)
-                
-                # Summary statistics sheet
-                summary_data = {
-                    'Metric': [
-                        'Total Listings', 
-                        'Average Price', 
-                        'Median Price',
-                        'Highest Price',
-                        'Lowest Price',
-                        'Average Square Meters',
-                        'Average Price per Sqm',
-                        'Median Price per Sqm',
-                        'Highest Price per Sqm'
-                    ],
-                    'Value': [
-                        len(df),
-                        df['price_value'].mean(),
-                        df['price_value'].median(),
-                        df['price_value'].max(),
-                        df['price_value'].min(),
-                        df[df['square_meters'] > 0]['square_meters'].mean(),
-                        df[df['price_per_sqm'] > 0]['price_per_sqm'].mean(),
-                        df[df['price_per_sqm'] > 0]['price_per_sqm'].median(),
-                        df[df['price_per_sqm'] > 0]['price_per_sqm'].max()
-                    ]
-                }
-                
-                summary_df = pd.DataFrame(summary_data)
-                summary_df.to_excel(writer, sheet_name='Summary', index=False)
-                
-            print(f"Data with summary statistics saved to {excel_filename}")
-            return True
-            
-        except Exception as e:
-            print(f"Error saving data to file: {e}")
-            return False
-    
-    def generate_charts(self, search_phrase, region):
-        """Generate charts based on scraped data."""
-        if not self.listings:
-            print("No data available for generating charts")
-            return False
-        
-        try:
-            # Convert listings to DataFrame for analysis
-            df = pd.DataFrame(self.listings)
-            
-            # Create charts directory if it doesn't exist
-            charts_dir = "charts"
-            if not os.path.exists(charts_dir):
-                os.makedirs(charts_dir)
-            
-            # 1. Average price by location
-            self._create_price_by_location_chart(df, charts_dir)
-            
-            # 2. Listings count by category
-            self._create_category_distribution_chart(df, charts_dir)
-            
-            # 3. Price distribution histogram
-            self._create_price_distribution_chart(df, charts_dir)
-            
-            # 4. Region comparison chart if region is specified
-            if region:
-                self._create_region_comparison_chart(df, region, charts_dir)
-            
-            # 5. Price per square meter chart
-            self._create_price_per_sqm_chart(df, charts_dir)
-            
-            # 6. Highest price listings
-            self._create_highest_price_chart(df, charts_dir)
-            
-            # 7. Date distribution chart (new)
-            self._create_date_distribution_chart(df, charts_dir)
-            
+                return False
+                
+            with self.metrics.time('db_write'):
+                count = self.db.upsert_listings(self.listings)
+            print(f"Data saved to database (listings.db): {count} listings")
             return True
             
         except Exception as e:
-            print(f"Error generating charts: {e}")
+            print(f"Error saving data to database: {e}")
+            self.metrics.inc('errors', stage='db_write')
             return False
-    
-    def _create_price_by_location_chart(self, df, charts_dir):
-        """Create chart showing average price by location."""
-        try:
-            plt.figure(figsize=(12, 8))
-            
-            # Group by location and calculate mean price
-            location_price = df.groupby('location')['price_value'].mean().sort_values(ascending=False).head(10)
-            
-            # Create bar chart
-            ax = sns.barplot(x=location_price.index, y=location_price.values)
             
-            # Add value labels on top of bars
-            for i, v in enumerate(location_price.values):
-                ax.text(i, v + (location_price.max() * 0.02), f"{v:.0f}", ha='center')
-            
-            plt.title('Average Price by Top 10 Locations')
-            plt.xlabel('Location')
-            plt.ylabel('Average Price (zł)')
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            # Save chart
-            chart_path = os.path.join(charts_dir, 'avg_price_by_location.png')
-            plt.savefig(chart_path)
-            plt.close()
-            print(f"Chart saved: {chart_path}")
-            
-        except Exception as e:
-            print(f"Error creating location price chart: {e}")
-    
-    def _create_category_distribution_chart(self, df, charts_dir):
-        """Create chart showing distribution of listings by category."""
+    def save_to_file(self, filename="ogloszenia.csv", excel_filename="ogloszenia.xlsx", write_csv=True,
+                     write_excel=True, df=None, aggregates=None):
+        """Save the scraped data to CSV and Excel files (CSV skipped if it was streamed already).
+
+        df and aggregates may be passed in when the caller already built them
+        (see aggregate_listings); a given df is used instead of self.listings.
+        """
         try:
-            plt.figure(figsize=(10, 6))
-            
-            # Count listings per category
-            category_counts = df['category'].value_counts()
-            
-            # Create pie chart with percentages
-            wedges, texts, autotexts = plt.pie(
-                category_counts, 
-                labels=category_counts.index, 
-                autopct='%1.1f%%', 
-                startangle=90,
-                shadow=True,
-                explode=[0.05] * len(category_counts)  # Slightly explode all slices
-            )
-            
-            # Style the percentage text
-            for autotext in autotexts:
-                autotext.set_color('white')
-                autotext.set_fontweight('bold')
+            if df is None and not self.listings:
+                print("No data to save")
+                return False
+                
+            # Create DataFrame
+            if df is None:
+                df = pd.DataFrame(self.listings)
             
-            plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
-            plt.title('Distribution of Listings by Category')
-            plt.tight_layout()
+            # Save to CSV
+            if write_csv:
+                with self.metrics.time('csv_write'):
+                    df.to_csv(filename, index=False, encoding='utf-8')
+                print(f"Data saved to {filename}")
             
-            # Save chart
-            chart_path = os.path.join(charts_dir, 'category_distribution.png')
-            plt.savefig(chart_path)
-            plt.close()
-            print(f"Chart saved: {chart_path}")
+            if write_excel:
+                summary = (aggregates or aggregate_listings(df, charts=False))['summary']
+                with self.metrics.time('excel_write'):
+                    self._write_excel(df, excel_filename, summary)
+            return True
             
         except Exception as e:
-            print(f"Error creating category distribution chart: {e}")
+            print(f"Error saving data to file: {e}")
+            return False
     
-    def _create_price_distribution_chart(self, df, charts_dir):
-        """Create histogram showing price distribution."""
+    def export_excel(self, excel_filename, parquet_dir="parquet", search_phrase=None, since=None):
+        """Build the Excel workbook later, from the Parquet dataset, instead of during the run."""
         try:
-            plt.figure(figsize=(10, 6))
-            
-            # Remove outliers for better visualization (optional)
-            df_filtered = df[df['price_value'] < df['price_value'].quantile(0.95)]
-            
-            # Create histogram with KDE
-            sns.histplot(df_filtered['price_value'], bins=20, kde=True, color='skyblue')
-            
-            # Add vertical line for mean and median
-            mean_price = df_filtered['price_value'].mean()
-            median_price = df_filtered['price_value'].median()
-            
-            plt.axvline(mean_price, color='red', linestyle='--', label=f'Mean: {mean_price:.0f} zł')
-            plt.axvline(median_price, color='green', linestyle='-', label=f'Median: {median_price:.0f} zł')
-            
-            plt.legend()
-            plt.title('Price Distribution (excluding top 5% outliers)')
-            plt.xlabel('Price (zł)')
-            plt.ylabel('Number of Listings')
-            plt.tight_layout()
-            
-            # Save chart
-            chart_path = os.path.join(charts_dir, 'price_distribution.png')
-            plt.savefig(chart_path)
-            plt.close()
-            print(f"Chart saved: {chart_path}")
-            
+            df = read_parquet_listings(parquet_dir, list(ListingDatabase.LISTING_COLUMNS), self.site, search_phrase,
+                                       since)
+            if df.empty:
+                print("No data to save")
+                return False
+            self._write_excel(df, excel_filename, aggregate_listings(df, charts=False)['summary'])
+            return True
         except Exception as e:
-            print(f"Error creating price distribution chart: {e}")
+            print(f"Error exporting Excel file: {e}")
+            return False
+    
+    def _write_excel(self, df, excel_filename, summary):
+        """Write the listings and their summary statistics (from aggregate_listings) to an Excel workbook."""
+        # Save to Excel with additional summary statistics
+        with pd.ExcelWriter(excel_filename, engine='openpyxl') as writer:
+            # Main data sheet
+            df.to_excel(writer, sheet_name='Listings', index=False)
+                
+            # Summary statistics sheet
+            summary_df = pd.DataFrame({'Metric': list(summary), 'Value': list(summary.values())})
+            summary_df.to_excel(writer, sheet_name='Summary', index=False)
+                
+        print(f"Data with summary statistics saved to {excel_filename}")
     
-    def _create_region_comparison_chart(self, df, region, charts_dir):
-        """Create chart comparing prices in specified region vs other regions."""
+    def write_report(self, search_phrase, aggregates):
+        """Write a text report of a phrase's statistics to reports/<phrase>/<run>.txt.
+
+        Alongside this run's aggregates, the report lists the phrase's recent
+        daily history from the database rollup.
+        """
         try:
-            plt.figure(figsize=(8, 6))
-            
-            # Create a new column indicating if the listing is from the specified region
-            region_pattern = re.compile(region, re.IGNORECASE)
-            df['is_target_region'] = df['location'].apply(lambda x: bool(region_pattern.search(x)))
-            
-            # Group by region indicator and calculate mean price
-            region_comparison = df.groupby('is_target_region')['price_value'].agg(['mean', 'count'])
+            report_dir = os.path.join("reports", partition_value(search_phrase))
+            os.makedirs(report_dir, exist_ok=True)
+            report_path = os.path.join(report_dir, f"{self.run_id or datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
             
-            # Rename index for clarity
-            region_comparison.index = [f"Other Regions", f"{region}"]
-            
-            # Create bar chart
-            ax = sns.barplot(x=region_comparison.index, y=region_comparison['mean'])
+            lines = [f"Report for '{search_phrase}' ({self.site}), {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ""]
+            for metric, value in aggregates['summary'].items():
+                lines.append(f"{metric:<24}{value:>16,.2f}" if isinstance(value, float) else f"{metric:<24}{value:>16,}")
             
-            # Add value labels on top of bars
-            for i, v in enumerate(region_comparison['mean']):
-                ax.text(i, v + (region_comparison['mean'].max() * 0.02), 
-                        f"{v:.0f} zł\n({region_comparison['count'][i]} listings)", ha='center')
+            charts = aggregates['charts']
+            if 'avg_price_by_location' in charts:
+                lines += ["", "Average price by location (top 10):"]
+                lines += [f"  {location:<40}{price:>16,.0f}" for location, price in charts['avg_price_by_location'].items()]
+            if 'category_distribution' in charts:
+                lines += ["", "Listings by category:"]
+                lines += [f"  {category:<40}{count:>16}" for category, count in charts['category_distribution'].items()]
+            if 'region_comparison' in charts:
+                region, comparison = charts['region_comparison']
+                lines += ["", f"{region} vs other regions:"]
+                lines += [f"  {name:<40}{row['mean']:>16,.0f} ({row['count']:.0f} listings)"
+                          for name, row in comparison.iterrows()]
             
-            plt.title(f'Average Price: {region} vs Other Regions')
-            plt.ylabel('Average Price (zł)')
-            plt.ylim(0, region_comparison['mean'].max() * 1.2)  # Add some headroom for labels
-            plt.tight_layout()
+            if self.db_conn:
+                history = self.db.daily_prices(search_phrase).tail(30)
+                if not history.empty:
+                    lines += ["", "Daily history (last 30 days with data):",
+                              f"  {'Day':<12}{'Listings':>10}{'Median price':>16}{'Median price/m²':>18}"]
+                    for row in history.itertuples(index=False):
+                        median_price = f"{row.median_price:,.0f}" if pd.notna(row.median_price) else "-"
+                        median_per_sqm = f"{row.median_price_per_sqm:,.0f}" if pd.notna(row.median_price_per_sqm) else "-"
+                        lines.append(f"  {row.day:<12}{row.listings:>10}{median_price:>16}{median_per_sqm:>18}")
             
-            # Save chart
-            chart_path = os.path.join(charts_dir, 'region_comparison.png')
-            plt.savefig(chart_path)
-            plt.close()
-            print(f"Chart saved: {chart_path}")
+            with open(report_path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            print(f"Report saved: {report_path}")
+            return True
             
         except Exception as e:
-            print(f"Error creating region comparison chart: {e}")
+            print(f"Error writing report: {e}")
+            return False
     
-    def _create_price_per_sqm_chart(self, df, charts_dir):
-        """Create chart showing price per square meter."""
+    def generate_charts(self, search_phrase, region, wait=True, aggregates=None):
+        """Generate charts based on scraped data.
+
+        Each chart's data comes from aggregate_listings (computed here unless
+        passed in), plus the phrase's price history from the database rollup,
+        and the figure is rendered in the chart process pool, into
+        charts/<phrase>/<run>/. Charts whose
+        aggregated data hasn't changed since the phrase's last rendering are
+        linked from there instead of being drawn again. Without `wait` the
+        renders continue in the background until wait_for_charts().
+        """
+        if aggregates is None and not self.listings:
+            print("No data available for generating charts")
+            return False
+        
         try:
-            plt.figure(figsize=(10, 6))
-            
-            # Filter out entries with zero or missing square meters and price
-            valid_data = df[(df['square_meters'] > 0) & (df['price_value'] > 0)]
-            
-            if len(valid_data) == 0:
-                print("No valid square meter data for chart")
-                return
+            if aggregates is None:
+                aggregates = aggregate_listings(pd.DataFrame(self.listings), region)
+            datasets = dict(aggregates['charts'])
+            if self.db_conn:
+                history = self.db.daily_prices(search_phrase)[['day', 'median_price', 'median_price_per_sqm']]
+                if len(history) > 1:
+                    datasets['price_history'] = history
             
-            # Remove outliers for better visualization
-            filtered_data = valid_data[valid_data['price_per_sqm'] < valid_data['price_per_sqm'].quantile(0.95)]
+            # Charts of each phrase and run go in their own directory
+            phrase_dir = os.path.join("charts", partition_value(search_phrase))
+            charts_dir = os.path.join(phrase_dir, self.run_id or datetime.now().strftime("%Y%m%d_%H%M%S"))
+            os.makedirs(charts_dir, exist_ok=True)
             
-            # Create scatter plot with regression line
-            ax = sns.regplot(
-                x='square_meters', 
-                y='price_value', 
-                data=filtered_data, 
-                scatter_kws={'alpha':0.5},
-                line_kws={'color':'red'}
-            )
+            manifest_path = os.path.join(phrase_dir, CHART_MANIFEST)
+            manifest = {}
+            if os.path.exists(manifest_path):
+                with open(manifest_path, encoding='utf-8') as f:
+                    manifest = json.load(f)
             
-            plt.title('Price vs Size (m²)')
-            plt.xlabel('Size (m²)')
-            plt.ylabel('Price (zł)')
-            
-            # Add annotation with average price per sqm
-            avg_price_per_sqm = filtered_data['price_per_sqm'].mean()
-            plt.annotate(
-                f'Avg. Price/m²: {avg_price_per_sqm:.0f} zł',
-                xy=(0.95, 0.05),
-                xycoords='axes fraction',
-                bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="gray", alpha=0.8),
-                ha='right',
-                fontsize=10
-            )
+            for name, data in datasets.items():
+                chart_path = os.path.join(charts_dir, f"{name}.png")
+                data_hash = chart_data_hash(name, data)
+                previous = manifest.get(name)
+                if previous and previous['hash'] == data_hash and os.path.exists(previous['path']):
+                    if os.path.abspath(previous['path']) != os.path.abspath(chart_path):
+                        link_or_copy(previous['path'], chart_path)
+                    print(f"Chart unchanged: {chart_path}")
+                    self.metrics.inc('charts_cached')
+                    continue
+                self._submit_chart(name, data, chart_path)
+                manifest[name] = {'hash': data_hash, 'path': chart_path}
             
-            plt.tight_layout()
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=1)
             
-            # Save chart
-            chart_path = os.path.join(charts_dir, 'price_per_sqm.png')
-            plt.savefig(chart_path)
-            plt.close()
-            print(f"Chart saved: {chart_path}")
+            if wait:
+                self.wait_for_charts()
+            return True
             
         except Exception as e:
-            print(f"Error creating price per square meter chart: {e}")
+            print(f"Error generating charts: {e}")
+            return False
+    
+    def _submit_chart(self, name, data, chart_path):
+        """Render a chart in the pool (started on first use), or right away with chart_workers=0."""
+        if not self.chart_workers:
+            future = concurrent.futures.Future()
+            future.set_result(render_chart(name, data, chart_path))
+        else:
+            if not self.chart_executor:
+                self.chart_executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.chart_workers)
+            future = self.chart_executor.submit(render_chart, name, data, chart_path)
+        self.chart_futures.append((name, chart_path, future))
+    
+    def wait_for_charts(self):
+        """Wait for charts still rendering and report each one."""
+        futures, self.chart_futures = self.chart_futures, []
+        for name, chart_path, future in futures:
+            try:
+                self.metrics.observe('stage_seconds', future.result(), stage='chart_render')
+                print(f"Chart saved: {chart_path}")
+            except Exception as e:
+                print(f"Error creating {name.replace('_', ' ')} chart: {e}")
+                self.metrics.inc('errors', stage='chart_render')
     
-    def _create_highest_price_chart(self, df, charts_dir):
-        """Create chart showing highest priced listings."""
+    async def crawl_async(self, search_phrases, max_pages=3, concurrency=8, start_pages=None):
+        """Fetch and parse (phrase, page) pairs concurrently over HTTP.
+
+        At most `concurrency` pages are in flight at once, on a thread pool of
+        that size, and requests to each host are paced by self.rate_limiter.
+        start_pages optionally maps a phrase to the first page to fetch. A page
+        that can't be fetched is recorded in failed_pages and the phrase's
+        other pages are kept. Returns a dict mapping each phrase to its
+        listings in page order.
+        """
+        start_pages = start_pages or {}
+        if not self.http_fetcher:
+            self.http_fetcher = HttpFetcher(random.choice(self.user_agents), pool_size=concurrency)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        # The default executor has at most 32 threads (fewer on small machines), too few for a large concurrency
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        loop = asyncio.get_running_loop()
+        pages_by_phrase = {phrase: {} for phrase in search_phrases}
+        # First page number that came back empty, per phrase; later pages are skipped
+        last_page = {}
+        failed_pages = {phrase: set() for phrase in search_phrases}
+
+        async def crawl_page(phrase, page):
+            async with semaphore:
+                if page >= last_page.get(phrase, max_pages + 1) or page < start_pages.get(phrase, 1):
+                    return
+                page_source = await loop.run_in_executor(executor, self.fetch_search_page, phrase, page)
+                if not page_source:
+                    # Later pages are still wanted; resume fetches this one again
+                    failed_pages[phrase].add(page)
+                    return
+                records = []
+                if self.parse_executor:
+                    records = await asyncio.wrap_future(self.submit_parse(page_source, phrase))
+                else:
+                    records = await loop.run_in_executor(executor, self.parse_listings, page_source, phrase)
+                if records:
+                    pages_by_phrase[phrase][page] = self._emit_page(records)
+                    print(f"Scraped {len(records)} listings from page {page} of '{phrase}'")
+                    if self._page_mostly_seen(records):
+                        last_page[phrase] = min(page + 1, last_page.get(phrase, max_pages + 1))
+                else:
+                    last_page[phrase] = min(page, last_page.get(phrase, max_pages + 1))
+                    self.exhausted_phrases.add(phrase)
+
+        # Schedule page 1 of every phrase first so empty result sets are found early
         try:
-            plt.figure(figsize=(14, 8))
-            
-            # Get top 10 most expensive listings
-            top_listings = df.sort_values(by='price_value', ascending=False).head(10)
-            
-            # Create horizontal bar chart
-            ax = sns.barplot(y=top_listings['title'].str[:50] + '...', x=top_listings['price_value'])
-            
-            # Add value labels
-            for i, v in enumerate(top_listings['price_value']):
-                ax.text(v + (top_listings['price_value'].max() * 0.02), i, f"{v:,.0f} zł", va='center')
-            
-            plt.title('Top 10 Most Expensive Listings')
-            plt.xlabel('Price (zł)')
-            plt.ylabel('Title')
-            plt.tight_layout()
+            await asyncio.gather(*(
+                crawl_page(phrase, page)
+                for page in range(1, max_pages + 1)
+                for phrase in pages_by_phrase
+            ))
+        finally:
+            executor.shutdown(wait=False)
+
+        results = {}
+        for phrase, pages in pages_by_phrase.items():
+            stop = last_page.get(phrase, max_pages + 1)
+            results[phrase] = [record for page in sorted(pages) if page < stop for record in pages[page]]
+            # Pages past the end of the results were not needed anyway
+            for page in sorted(failed_pages[phrase]):
+                if page < stop:
+                    self._page_failed(phrase, page)
+        return results
+
+    def _store_results(self, phrase, region):
+        """Save the current phrase's listings to the database and files, and chart them."""
+        if self.sinks:
+            # Listings are already in the database and CSV. The Excel workbook needs every column,
+            # so only then is the phrase read back; otherwise the columns collected while streaming do
+            for sink in self.sinks:
+                sink.flush()
+            csv_path = self.csv_sink.path_for(phrase)
+            df = None
+            columns = self.aggregate_columns.pop(phrase, None)
+            if self.write_excel and os.path.exists(csv_path):
+                df = pd.read_csv(
+                    csv_path, keep_default_na=False,
+                    dtype={column: str for column in ListingDatabase.LISTING_COLUMNS
+                           if column not in PARQUET_FLOAT_COLUMNS}
+                )
+            elif columns:
+                df = pd.DataFrame(columns)
+            df, aggregates = self._aggregate(phrase, region, df)
+            if df is not None:
+                self.save_to_file(csv_path, f"{os.path.splitext(csv_path)[0]}.xlsx", write_csv=False,
+                                  write_excel=self.write_excel, df=df, aggregates=aggregates)
+                self.generate_charts(phrase, region, wait=False, aggregates=aggregates)
+            return
+        
+        # Save data to database
+        self.save_to_database()
+        if self.parquet_sink and self.listings:
+            self.parquet_sink.write(self.listings)
+            self.parquet_sink.flush()
+        
+        # Statistics are computed once and shared by the Excel summary, the report and the charts
+        df, aggregates = self._aggregate(phrase, region)
+        
+        # Save data to files
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{phrase.replace(' ', '_')}_{timestamp}.csv"
+        excel_filename = f"{phrase.replace(' ', '_')}_{timestamp}.xlsx"
+        self.save_to_file(filename, excel_filename, write_excel=self.write_excel, df=df, aggregates=aggregates)
+        
+        # Generate charts; they render while the next phrase is scraped
+        self.generate_charts(phrase, region, wait=False, aggregates=aggregates)
+
+    def _aggregate(self, phrase, region, df=None):
+        """Build the phrase's DataFrame (unless given) and aggregates once and write its text report.
+
+        Returns (None, None) when there are no listings.
+        """
+        self.phrase_counts[phrase] = len(df) if df is not None else len(self.listings)
+        if not self.phrase_counts[phrase]:
+            return None, None
+        with self.metrics.time('aggregate'):
+            if df is None:
+                df = pd.DataFrame(self.listings)
+            aggregates = aggregate_listings(df, region)
+        self.write_report(phrase, aggregates)
+        return df, aggregates
+
+    def run_scraper(self, search_phrases, max_pages=3, region=None, concurrency=None, requests_per_second=1.0, jitter=0.3,
+                    pages_per_driver=50, parse_workers=None, stream=False, parquet_dir=None, resume=False,
+                    incremental=False, seen_threshold=0.8, use_bloom=False, excel=True, track_changes=True,
+                    chart_workers=None, metrics_dir=None):
+        """Run the full scraper pipeline for multiple search phrases.
+
+        With `concurrency` set, all phrases and pages are crawled in parallel
+        (concurrent HTTP requests, or a pool of that many browsers in browser
+        mode) and then stored phrase by phrase. With `parse_workers` set, HTML
+        is parsed in that many worker processes while the next page is fetched.
+        With `stream` set, each page is written to the database and CSV (and
+        the Parquet dataset in `parquet_dir`, if given) as soon as it is
+        scraped; otherwise each phrase is written when it finishes. `excel`
+        turns the per-phrase Excel workbooks off (see export_excel).
+        With `resume` set, phrases finished by an earlier run are skipped and
+        interrupted ones continue after their last checkpointed page. With
+        `incremental` set, a phrase stops paging once `seen_threshold` of a
+        page's listings are already in the database (looked up in a set, or a
+        Bloom filter with `use_bloom`). Requests start at `requests_per_second`
+        per host and adapt to the server's responses (see AdaptiveRateLimiter).
+        With `track_changes` set, new ads, price changes and delistings are
+        recorded in the listing_events table (see ChangeDetector).
+        Charts are rendered by `chart_workers` processes (by default one per
+        spare CPU, up to 4; 0 renders them inline) into
+        charts/<phrase>/<run start time>/.
+
+        Stage timings and counters are printed at the end and, with
+        `metrics_dir`, exported too (see report_metrics).
+
+        Returns True if the run finished, False if it stopped on an error or
+        some pages could not be fetched; those phrases are checkpointed before
+        their first missing page for `resume`. The number of listings stored per phrase is left in phrase_counts.
+        """
+        try:
+            self.rate_limiter = AdaptiveRateLimiter(initial_rate=requests_per_second, jitter=jitter)
+            self.write_excel = excel
+            self.chart_workers = chart_workers if chart_workers is not None else min(4, (os.cpu_count() or 1) - 1)
+            self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+            self.phrase_counts = {}
+            self.metrics = Metrics({'site': self.site})
+
+            if parse_workers:
+                self.parse_executor = concurrent.futures.ProcessPoolExecutor(max_workers=parse_workers)
             
-            # Save chart
-            chart_path = os.path.join(charts_dir, 'highest_prices.png')
-            plt.savefig(chart_path)
-            plt.close()
-            print(f"Chart saved: {chart_path}")
+            # Setup initial components; in HTTP mode the browser starts only if a page needs it
+            self.setup_database()
+            self.open_page_cache()
+            if stream:
+                self.setup_sinks(parquet_dir)
+            elif parquet_dir:
+                self.parquet_sink = ParquetSink(parquet_dir, site=self.site)
+            if incremental and self.db_conn:
+                self.seen_index = SeenIndex(self.db, use_bloom=use_bloom)
+                self.seen_threshold = seen_threshold
+            if track_changes and self.db_conn:
+                self.change_detector = ChangeDetector(self.db)
+            self.exhausted_phrases = set()
+            self.failed_pages = {}
+            self.aggregate_columns = {}
             
-        except Exception as e:
-            print(f"Error creating highest price chart: {e}")
-    
-    def _create_date_distribution_chart(self, df, charts_dir):
-        """Create chart showing distribution of listings by date posted."""
-        try:
-            plt.figure(figsize=(12, 6))
+            # Work out where each phrase starts: page 1, or after its checkpoint when resuming
+            checkpoints = {}
+            if resume:
+                checkpoints = self.load_checkpoints(search_phrases)
+                search_phrases = [phrase for phrase in search_phrases if phrase in checkpoints]
+            start_pages = {phrase: checkpoint['last_page'] + 1 for phrase, checkpoint in checkpoints.items()}
+            # Record every phrase's starting point up front, which also clears
+            # the completion flags earlier runs left when not resuming
+            for phrase in search_phrases:
+                self._checkpoint(phrase, start_pages.get(phrase, 1) - 1, checkpoints.get(phrase, {}).get('cursor_url'))
             
-            # Extract clean date information if available
-            date_counts = df['date_posted'].value_counts().sort_index()
+            if self.fetch_mode != "http" and not concurrency:
+                self.ensure_driver()
             
-            # Filter out non-date entries (like "No Date")
-            valid_dates = [date for date in date_counts.index if date != "No Date" and date != "Not available"]
-            if not valid_dates:
-                print("No valid date information for chart")
-                return
+            if concurrency:
+                if self.fetch_mode == "http":
+                    results = asyncio.run(self.crawl_async(
+                        search_phrases, max_pages, concurrency, start_pages
+                    ))
+                else:
+                    pool = BrowserWorkerPool(self, workers=concurrency, pages_per_driver=pages_per_driver)
+                    results = pool.run(search_phrases, max_pages, start_pages)
+                for phrase, listings in results.items():
+                    print(f"\n{'='*50}")
+                    print(f"Processing search phrase: {phrase}")
+                    print(f"{'='*50}")
+                    self.listings = listings
+                    if not self.sinks:
+                        print(f"Scraped {len(self.listings)} listings")
+                    self._finish_phrase(phrase, region, start_pages.get(phrase, 1), max_pages)
                 
-            # Create date count chart
-            date_subset = date_counts[valid_dates]
-            ax = sns.barplot(x=date_subset.index, y=date_subset.values)
-            
-            # Add counts on top of bars
-            for i, v in enumerate(date_subset.values):
-                ax.text(i, v + 0.5, str(v), ha='center')
-            
-            plt.title('Listings by Date Posted')
-            plt.xlabel('Date Posted')
-            plt.ylabel('Number of Listings')
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            # Save chart
-            chart_path = os.path.join(charts_dir, 'date_distribution.png')
-            plt.savefig(chart_path)
-            plt.close()
-            print(f"Chart saved: {chart_path}")
-            
-        except Exception as e:
-            print(f"Error creating date distribution chart: {e}")
-    
-    def run_scraper(self, search_phrases, max_pages=3, region=None):
-        """Run the full scraper pipeline for multiple search phrases."""
-        try:
-            # Setup initial components
-            self.setup_driver()
-            self.setup_database()
-            self.navigate_to_site()
-            self.handle_popups()
+                return self._finish_run()
             
             # Process each search phrase
             for phrase in search_phrases:
@@ -854,59 +3371,688 @@ class ClassifiedScraper:
                 
                 # Clear previous listings
                 self.listings = []
+                self.scraped_count = 0
+                self.stop_paging = False
+                self.last_page_reached = False
                 
-                # Search for this phrase
-                self.search_listings(phrase)
-                
-                # Scrape first page
-                self.scrape_page(phrase)
+                start_page = start_pages.get(phrase, 1)
+                if start_page > 1:
+                    print(f"Resuming from page {start_page}")
                 
-                # Navigate through additional pages
-                page_count = 1
-                while page_count < max_pages:
-                    if not self.navigate_to_next_page():
-                        break  # No more pages
-                    self.scrape_page(phrase)
-                    page_count += 1
-                
-                # Save data to database
-                self.save_to_database()
-                
-                # Save data to files
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"{phrase.replace(' ', '_')}_{timestamp}.csv"
-                excel_filename = f"{phrase.replace(' ', '_')}_{timestamp}.xlsx"
-                self.save_to_file(filename, excel_filename)
+                if self.fetch_mode == "http" and self.parse_executor:
+                    # Parse each page in the pool while the next one is being fetched
+                    pending = None
+                    for page in range(start_page, max_pages + 1):
+                        page_source = self.fetch_search_page(phrase, page)
+                        if pending and not self._collect_parsed(pending):
+                            pending = None
+                            self.exhausted_phrases.add(phrase)
+                            break  # No more pages
+                        if pending:
+                            self._checkpoint(phrase, page - 1, self.build_search_url(phrase, page))
+                        if self.stop_paging:
+                            pending = None
+                            break  # Rest of the results were seen before
+                        if not page_source:
+                            pending = None
+                            self._page_failed(phrase, page)
+                            break
+                        pending = self.submit_parse(page_source, phrase)
+                    if pending and not self._collect_parsed(pending):
+                        self.exhausted_phrases.add(phrase)
+                elif self.fetch_mode == "http":
+                    # Request each results page directly by URL
+                    for page in range(start_page, max_pages + 1):
+                        page_source = self.fetch_search_page(phrase, page)
+                        if not page_source:
+                            self._page_failed(phrase, page)
+                            break
+                        if not self.scrape_page(phrase, page_source):
+                            self.exhausted_phrases.add(phrase)
+                            break  # No more pages
+                        self._checkpoint(phrase, page, self.build_search_url(phrase, page + 1))
+                        if self.stop_paging:
+                            break  # Rest of the results were seen before
+                elif start_page <= max_pages:
+                    cursor_url = checkpoints.get(phrase, {}).get('cursor_url')
+                    if start_page > 1 and cursor_url:
+                        # Reopen the last scraped page and continue with its next page link
+                        load_page(self.driver, cursor_url, self.listing_selector(), self.resource_blocker,
+                                  self.metrics, self.adapter.empty_selector)
+                        page_count = start_page - 1
+                    else:
+                        # Search for this phrase
+                        self.search_listings(phrase)
+                        
+                        # Scrape first page
+                        if not self.scrape_page(phrase):
+                            self.last_page_reached = True
+                        page_count = 1
+                        self._checkpoint(phrase, page_count, self.driver.current_url)
+                    
+                    # Navigate through additional pages
+                    while page_count < max_pages and not self.stop_paging:
+                        if not self.navigate_to_next_page():
+                            break  # No more pages
+                        self.scrape_page(phrase)
+                        page_count += 1
+                        self._checkpoint(phrase, page_count, self.driver.current_url)
+                    if self.last_page_reached:
+                        self.exhausted_phrases.add(phrase)
                 
-                # Generate charts
-                self.generate_charts(phrase, region)
+                self._finish_phrase(phrase, region, start_page, max_pages)
                 
-                # Random wait before next search phrase
-                wait_time = self.random_wait(5, 10)
-                print(f"Waiting {wait_time:.2f} seconds before next search")
             
-            print("\nScraping completed successfully!")
+            return self._finish_run()
             
         except Exception as e:
             print(f"Error in scraper run: {e}")
+            self.metrics.inc('errors', stage='run')
+            return False
         finally:
             self.cleanup()
+            self.report_metrics(metrics_dir)
     
+    def _page_failed(self, phrase, page):
+        """Record a results page that could not be fetched."""
+        print(f"Could not fetch page {page} of '{phrase}'")
+        self.failed_pages.setdefault(phrase, set()).add(page)
+        self.metrics.inc('failed_pages')
+
+    def _finish_phrase(self, phrase, region, start_page, max_pages):
+        """Store a crawled phrase and checkpoint it.
+
+        The phrase is only marked completed if none of its pages failed;
+        otherwise it is checkpointed before its first failed page, so that
+        --resume fetches the rest again.
+        """
+        self._store_results(phrase, region)
+        self._finish_changes(phrase, start_page)
+        failed = self.failed_pages.get(phrase)
+        if failed:
+            first_failed = min(failed)
+            self._checkpoint(phrase, first_failed - 1, self.build_search_url(phrase, first_failed), stored=True)
+        else:
+            self._checkpoint(phrase, max_pages, completed=True)
+
+    def _finish_run(self):
+        """Wait for the charts and print the run's statistics; returns False if any phrase is incomplete."""
+        self.wait_for_charts()
+        if self.failed_pages:
+            print(f"\nScraping finished with pages missing for: {', '.join(self.failed_pages)} "
+                  "(run again with --resume to fetch them)")
+        else:
+            print("\nScraping completed successfully!")
+        self.rate_limiter.print_stats()
+        if self.resource_blocker:
+            self.resource_blocker.print_stats()
+        return not self.failed_pages
+
+    def _finish_changes(self, phrase, start_page=1):
+        """Store the phrase's change events and print a summary.
+
+        Missing ads only count as delisted if this run crawled the phrase from
+        its first page to the end of the results without a failed page.
+        """
+        if not self.change_detector:
+            return
+        complete = phrase in self.exhausted_phrases and start_page == 1 and not self.failed_pages.get(phrase)
+        counts = self.change_detector.finish(phrase, complete)
+        summary = ', '.join(f"{count} {event.replace('_', ' ')}" for event, count in sorted(counts.items()))
+        print(f"Changes for '{phrase}': {summary or 'none'}")
+
+    def load_checkpoints(self, search_phrases):
+        """Return checkpoints of the phrases still to do; phrases finished earlier are left out."""
+        checkpoints = {}
+        for phrase in search_phrases:
+            checkpoint = self.db.load_checkpoint(self.site, phrase) if self.db_conn else None
+            if checkpoint and checkpoint['completed']:
+                print(f"Skipping '{phrase}': completed on {checkpoint['updated_at']}")
+                continue
+            checkpoints[phrase] = checkpoint or {'last_page': 0, 'cursor_url': None}
+            if checkpoint:
+                print(f"'{phrase}' was interrupted after page {checkpoint['last_page']}")
+        return checkpoints
+
+    def _checkpoint(self, phrase, page, cursor_url=None, completed=False, stored=False):
+        """Record progress for a phrase.
+
+        Pages only count as done once their listings are in the database, so
+        without streaming a phrase's progress is recorded only when it
+        completes, or with `stored` once its listings have been saved. The
+        file sinks keep buffering (Parquet row groups stay large) until the
+        phrase finishes.
+        """
+        if not self.db_conn or not (completed or stored or page == 0 or self.sinks):
+            return
+        try:
+            for sink in self.sinks:
+                if isinstance(sink, DatabaseSink):
+                    sink.flush()
+            self.db.save_checkpoint(self.site, phrase, page, cursor_url, completed)
+        except Exception as e:
+            print(f"Error saving checkpoint: {e}")
+
+    def run_queue_worker(self, queue, results_dir="queue_results", worker_id=None, requests_per_second=1.0,
+                         poll=5.0, metrics_dir=None):
+        """Lease and scrape this site's pages from a TaskQueue until none are left.
+
+        Each task's listings go to a results file (see write_task_results),
+        to be merged into the database by merge_queue_results. A fetched page
+        without listings ends its phrase, so the phrase's later pages are
+        skipped; pages that can't be fetched (including when the browser they
+        need doesn't start) are retried up to the queue's max_attempts.
+        While only other workers' leases remain, the worker polls every
+        `poll` seconds in case one of them expires. Returns counts of done
+        and failed tasks and of listings; metrics are reported as in run_scraper.
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        stats = {'done': 0, 'failed': 0, 'listings': 0}
+        self.run_id = worker_id
+        self.metrics = Metrics({'site': self.site, 'worker': worker_id})
+        try:
+            self.rate_limiter = AdaptiveRateLimiter(initial_rate=requests_per_second)
+            self.open_page_cache()
+            while True:
+                tasks = queue.lease(worker_id, site=self.site)
+                if not tasks:
+                    counts = queue.counts(self.site)
+                    if not counts.get('pending') and not counts.get('leased'):
+                        break
+                    time.sleep(poll)
+                    continue
+
+                for task in tasks:
+                    phrase, page = task['search_phrase'], task['page']
+                    try:
+                        page_source = self.fetch_search_page(phrase, page)
+                        if page_source is None:
+                            raise RuntimeError("page could not be fetched")
+                        records = self.parse_listings(page_source, phrase)
+                        self._count_page(records)
+                        if records:
+                            write_task_results(results_dir, task, records)
+                        else:
+                            queue.skip_after(self.site, phrase, page)
+                        if not queue.complete(task['id'], worker_id, len(records)):
+                            print(f"Lease on '{phrase}' page {page} expired; its results may be written twice")
+                        stats['done'] += 1
+                        stats['listings'] += len(records)
+                        print(f"[{worker_id}] '{phrase}' page {page}: {len(records)} listings")
+                    except Exception as e:
+                        print(f"[{worker_id}] Error on '{phrase}' page {page}: {e}")
+                        self.metrics.inc('errors', stage='task')
+                        queue.fail(task['id'], worker_id, e, task['attempts'])
+                        stats['failed'] += 1
+
+            print(f"Worker {worker_id} finished: {stats['done']} pages, {stats['listings']} listings, "
+                  f"{stats['failed']} failed attempts")
+            self.rate_limiter.print_stats()
+            return stats
+        finally:
+            self.cleanup()
+            self.report_metrics(metrics_dir)
+
+    def merge_queue_results(self, results_dir="queue_results", track_changes=True):
+        """Merge the task results files of this site into the database, keyed by URL.
+
+        Merging is idempotent: a listing scraped by several tasks or merged
+        twice is still one row, holding its most recently scraped state.
+        Merged files move to a merged/ subdirectory. New ads and price
+        changes are recorded as listing events; delistings are not, since no
+        single worker sees a phrase's complete results. Returns the number of
+        listings merged.
+        """
+        site_dir = os.path.join(results_dir, self.site)
+        if not os.path.isdir(site_dir):
+            print(f"No queue results for {self.site} in {results_dir}")
+            return 0
+        paths = sorted(os.path.join(site_dir, name) for name in os.listdir(site_dir) if name.endswith('.jsonl.gz'))
+
+        merged = 0
+        try:
+            self.setup_database()
+            if not self.db_conn:
+                return 0
+            if track_changes:
+                self.change_detector = ChangeDetector(self.db)
+            merged_dir = os.path.join(site_dir, "merged")
+            os.makedirs(merged_dir, exist_ok=True)
+
+            # Merge in chunks of files to keep memory bounded
+            for start in range(0, len(paths), 200):
+                chunk = paths[start:start + 200]
+                records = [record for path in chunk for record in read_task_results(path)]
+                # Oldest first, so the latest scrape of a URL is the one that stays
+                records.sort(key=lambda record: record['scraped_date'])
+                if self.change_detector:
+                    self.change_detector.diff(records)
+                self.db.upsert_listings(records)
+                merged += len(records)
+                for path in chunk:
+                    os.replace(path, os.path.join(merged_dir, os.path.basename(path)))
+
+            if self.change_detector:
+                for phrase in list(self.change_detector.events):
+                    self._finish_changes(phrase)
+            print(f"Merged {merged} listings from {len(paths)} task results into the database")
+            return merged
+        except Exception as e:
+            print(f"Error merging queue results: {e}")
+            return merged
+        finally:
+            self.cleanup()
+
+    def report_metrics(self, metrics_dir=None):
+        """Print the run's stage timings and counters and, with metrics_dir, export them.
+
+        A snapshot is appended to <metrics_dir>/metrics.jsonl and
+        <metrics_dir>/<site>.prom is replaced, ready for a Prometheus
+        textfile collector. Rate limiter waits and backoffs are added first.
+        """
+        for host, stats in self.rate_limiter.stats().items():
+            self.metrics.inc('throttle_seconds', stats['seconds_waited'], host=host)
+            self.metrics.inc('backoff_events', stats['backoff_events'], host=host)
+        print("\nTime per stage:")
+        self.metrics.print_summary()
+        if not metrics_dir:
+            return
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            self.metrics.write_jsonl(os.path.join(metrics_dir, "metrics.jsonl"), self.run_id)
+            self.metrics.write_prometheus(os.path.join(metrics_dir, f"{self.site}.prom"))
+            print(f"Metrics saved to {metrics_dir}")
+        except OSError as e:
+            print(f"Error saving metrics: {e}")
+
+    def setup_sinks(self, parquet_dir=None):
+        """Stream listings to the database and per-phrase CSV files (and Parquet if requested)."""
+        self.csv_sink = CsvSink()
+        self.sinks = [self.csv_sink]
+        if self.db_conn:
+            self.sinks.append(DatabaseSink(self.db))
+        if parquet_dir:
+            self.sinks.append(ParquetSink(parquet_dir, site=self.site))
+        for sink in self.sinks:
+            sink.metrics = self.metrics
+        print(f"Streaming listings to: {', '.join(type(sink).__name__ for sink in self.sinks)}")
+
     def cleanup(self):
         """Clean up resources."""
         try:
+            # Flush sinks first so buffered listings reach the database before it closes
+            for sink in self.sinks:
+                sink.close()
+            self.sinks = []
+            if self.parquet_sink:
+                self.parquet_sink.close()
+                self.parquet_sink = None
+
+            if self.parse_executor:
+                self.parse_executor.shutdown()
+                self.parse_executor = None
+
+            # Let charts of an interrupted run finish before the pool goes away
+            self.wait_for_charts()
+            if self.chart_executor:
+                self.chart_executor.shutdown()
+                self.chart_executor = None
+
+            if self.http_fetcher:
+                self.http_fetcher.close()
+                self.http_fetcher = None
+
+            if self.page_cache:
+                self.page_cache.close()
+                self.page_cache = None
+
             if self.driver:
                 self.driver.quit()
                 print("WebDriver closed")
                 
             if self.db_conn:
-                self.db_conn.close()
+                self.db.close()
+                self.db_conn = None
                 print("Database connection closed")
                 
         except Exception as e:
             print(f"Error in cleanup: {e}")
 
 
+# Columns aggregate_listings reads; enough for reports and charts without the Excel sheet
+AGGREGATE_COLUMNS = ('title', 'location', 'price_value', 'date_posted', 'category', 'square_meters', 'price_per_sqm')
+
+
+def aggregate_listings(df, region=None, charts=True):
+    """Compute a phrase's statistics in one pass over its listings DataFrame.
+
+    Returns {'summary': {metric: value}, 'charts': {chart name: data}}. The
+    summary feeds the Excel Summary sheet and the text report; the chart
+    data is what the renderers and the chart cache receive, so only these
+    small results ever leave the scraper process.
+    """
+    prices = df['price_value']
+    square_meters = df['square_meters'][df['square_meters'] > 0]
+    price_per_sqm = df['price_per_sqm'][df['price_per_sqm'] > 0]
+    summary = {
+        'Total Listings': len(df),
+        'Average Price': prices.mean(),
+        'Median Price': prices.median(),
+        'Highest Price': prices.max(),
+        'Lowest Price': prices.min(),
+        'Average Square Meters': square_meters.mean(),
+        'Average Price per Sqm': price_per_sqm.mean(),
+        'Median Price per Sqm': price_per_sqm.median(),
+        'Highest Price per Sqm': price_per_sqm.max(),
+    }
+    datasets = {}
+    if not charts:
+        return {'summary': summary, 'charts': datasets}
+    
+    # 1. Average price by location
+    try:
+        datasets['avg_price_by_location'] = (
+            df.groupby('location')['price_value'].mean().sort_values(ascending=False).head(10)
+        )
+    except Exception as e:
+        print(f"Error creating location price chart: {e}")
+    
+    # 2. Listings count by category
+    try:
+        datasets['category_distribution'] = df['category'].value_counts()
+    except Exception as e:
+        print(f"Error creating category distribution chart: {e}")
+    
+    # 3. Price distribution histogram, without the top 5% outliers
+    try:
+        datasets['price_distribution'] = prices[prices < prices.quantile(0.95)]
+    except Exception as e:
+        print(f"Error creating price distribution chart: {e}")
+    
+    # 4. Region comparison chart if region is specified
+    if region:
+        try:
+            region_pattern = re.compile(region, re.IGNORECASE)
+            is_target_region = df['location'].apply(lambda x: bool(region_pattern.search(x)))
+            region_comparison = df.groupby(is_target_region)['price_value'].agg(['mean', 'count'])
+            region_comparison.index = [f"Other Regions", f"{region}"]
+            datasets['region_comparison'] = (region, region_comparison)
+        except Exception as e:
+            print(f"Error creating region comparison chart: {e}")
+    
+    # 5. Price per square meter chart, without the top 5% outliers
+    try:
+        valid_data = df[(df['square_meters'] > 0) & (prices > 0)]
+        if len(valid_data) == 0:
+            print("No valid square meter data for chart")
+        else:
+            datasets['price_per_sqm'] = valid_data[
+                valid_data['price_per_sqm'] < valid_data['price_per_sqm'].quantile(0.95)
+            ][['square_meters', 'price_value', 'price_per_sqm']]
+    except Exception as e:
+        print(f"Error creating price per square meter chart: {e}")
+    
+    # 6. Highest price listings
+    try:
+        datasets['highest_prices'] = df.loc[prices.nlargest(10).index, ['title', 'price_value']]
+    except Exception as e:
+        print(f"Error creating highest price chart: {e}")
+    
+    # 7. Date distribution chart, without entries that have no date
+    try:
+        date_counts = df['date_posted'].value_counts().sort_index()
+        valid_dates = [date for date in date_counts.index if date != "No Date" and date != "Not available"]
+        if not valid_dates:
+            print("No valid date information for chart")
+        else:
+            datasets['date_distribution'] = date_counts[valid_dates]
+    except Exception as e:
+        print(f"Error creating date distribution chart: {e}")
+    
+    return {'summary': summary, 'charts': datasets}
+
+
+# Bumped whenever a renderer changes, so cached charts are drawn again
+CHART_VERSION = 1
+
+# Per-phrase file remembering the data hash and file of each chart's last rendering
+CHART_MANIFEST = "chart_hashes.json"
+
+
+def chart_data_hash(name, data):
+    """Return a hash of a chart's aggregated data (pandas objects, tuples of them, or plain values)."""
+    digest = hashlib.blake2b(f"{name}:{CHART_VERSION}".encode('utf-8'), digest_size=16)
+    for part in data if isinstance(data, tuple) else (data,):
+        if isinstance(part, (pd.Series, pd.DataFrame)):
+            digest.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+            digest.update(repr(list(part.columns) if isinstance(part, pd.DataFrame) else part.name).encode('utf-8'))
+        else:
+            digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def link_or_copy(source, target):
+    """Hard-link an unchanged chart into a new run directory, copying where links aren't possible."""
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def rotate_xticks(ax):
+    """Rotate x tick labels by 45 degrees, right aligned."""
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+
+
+def _render_price_by_location(fig, location_price):
+    """Draw the average price of the top 10 locations."""
+    ax = fig.subplots()
+    sns.barplot(x=location_price.index, y=location_price.values, ax=ax)
+    
+    # Add value labels on top of bars
+    for i, v in enumerate(location_price.values):
+        ax.text(i, v + (location_price.max() * 0.02), f"{v:.0f}", ha='center')
+    
+    ax.set_title('Average Price by Top 10 Locations')
+    ax.set_xlabel('Location')
+    ax.set_ylabel('Average Price (zł)')
+    rotate_xticks(ax)
+
+
+def _render_category_distribution(fig, category_counts):
+    """Draw a pie chart of listings per category."""
+    ax = fig.subplots()
+    wedges, texts, autotexts = ax.pie(
+        category_counts, 
+        labels=category_counts.index, 
+        autopct='%1.1f%%', 
+        startangle=90,
+        shadow=True,
+        explode=[0.05] * len(category_counts)  # Slightly explode all slices
+    )
+    
+    # Style the percentage text
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+    
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
+    ax.set_title('Distribution of Listings by Category')
+
+
+def _render_price_distribution(fig, prices):
+    """Draw a price histogram with KDE, mean and median."""
+    ax = fig.subplots()
+    sns.histplot(prices, bins=20, kde=True, color='skyblue', ax=ax)
+    
+    # Add vertical line for mean and median
+    mean_price = prices.mean()
+    median_price = prices.median()
+    ax.axvline(mean_price, color='red', linestyle='--', label=f'Mean: {mean_price:.0f} zł')
+    ax.axvline(median_price, color='green', linestyle='-', label=f'Median: {median_price:.0f} zł')
+    
+    ax.legend()
+    ax.set_title('Price Distribution (excluding top 5% outliers)')
+    ax.set_xlabel('Price (zł)')
+    ax.set_ylabel('Number of Listings')
+
+
+def _render_region_comparison(fig, data):
+    """Draw the average price in the chosen region against all other regions."""
+    region, region_comparison = data
+    ax = fig.subplots()
+    sns.barplot(x=region_comparison.index, y=region_comparison['mean'], ax=ax)
+    
+    # Add value labels on top of bars
+    for i, v in enumerate(region_comparison['mean']):
+        ax.text(i, v + (region_comparison['mean'].max() * 0.02), 
+                f"{v:.0f} zł\n({region_comparison['count'].iloc[i]} listings)", ha='center')
+    
+    ax.set_title(f'Average Price: {region} vs Other Regions')
+    ax.set_ylabel('Average Price (zł)')
+    ax.set_ylim(0, region_comparison['mean'].max() * 1.2)  # Add some headroom for labels
+
+
+def _render_price_per_sqm(fig, filtered_data):
+    """Draw price against size with a regression line and the average price per m²."""
+    ax = fig.subplots()
+    sns.regplot(
+        x='square_meters', 
+        y='price_value', 
+        data=filtered_data, 
+        scatter_kws={'alpha':0.5},
+        line_kws={'color':'red'},
+        ax=ax
+    )
+    
+    ax.set_title('Price vs Size (m²)')
+    ax.set_xlabel('Size (m²)')
+    ax.set_ylabel('Price (zł)')
+    
+    # Add annotation with average price per sqm
+    avg_price_per_sqm = filtered_data['price_per_sqm'].mean()
+    ax.annotate(
+        f'Avg. Price/m²: {avg_price_per_sqm:.0f} zł',
+        xy=(0.95, 0.05),
+        xycoords='axes fraction',
+        bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="gray", alpha=0.8),
+        ha='right',
+        fontsize=10
+    )
+
+
+def _render_highest_prices(fig, top_listings):
+    """Draw the 10 most expensive listings as horizontal bars."""
+    ax = fig.subplots()
+    sns.barplot(y=top_listings['title'].str[:50] + '...', x=top_listings['price_value'], ax=ax)
+    
+    # Add value labels
+    for i, v in enumerate(top_listings['price_value']):
+        ax.text(v + (top_listings['price_value'].max() * 0.02), i, f"{v:,.0f} zł", va='center')
+    
+    ax.set_title('Top 10 Most Expensive Listings')
+    ax.set_xlabel('Price (zł)')
+    ax.set_ylabel('Title')
+
+
+def _render_date_distribution(fig, date_subset):
+    """Draw the number of listings per posting date."""
+    ax = fig.subplots()
+    sns.barplot(x=date_subset.index, y=date_subset.values, ax=ax)
+    
+    # Add counts on top of bars
+    for i, v in enumerate(date_subset.values):
+        ax.text(i, v + 0.5, str(v), ha='center')
+    
+    ax.set_title('Listings by Date Posted')
+    ax.set_xlabel('Date Posted')
+    ax.set_ylabel('Number of Listings')
+    rotate_xticks(ax)
+
+
+def _render_price_history(fig, history):
+    """Draw the phrase's daily median price and price per m² from the database rollup."""
+    days = pd.to_datetime(history['day'])
+    ax = fig.subplots()
+    ax.plot(days, history['median_price'], marker='o', label='Median price')
+    ax.set_title('Median Price History')
+    ax.set_xlabel('Day')
+    ax.set_ylabel('Median Price (zł)')
+    
+    # Price per m² on its own axis
+    ax_sqm = ax.twinx()
+    ax_sqm.plot(days, history['median_price_per_sqm'], marker='s', color='tab:orange', label='Median price/m²')
+    ax_sqm.set_ylabel('Median Price per m² (zł)')
+    
+    lines = ax.get_lines() + ax_sqm.get_lines()
+    ax.legend(lines, [line.get_label() for line in lines], loc='upper left')
+    fig.autofmt_xdate()
+
+
+# Chart name -> (figure size, renderer); the name is also the file name
+CHART_RENDERERS = {
+    'avg_price_by_location': ((12, 8), _render_price_by_location),
+    'category_distribution': ((10, 6), _render_category_distribution),
+    'price_distribution': ((10, 6), _render_price_distribution),
+    'region_comparison': ((8, 6), _render_region_comparison),
+    'price_per_sqm': ((10, 6), _render_price_per_sqm),
+    'highest_prices': ((14, 8), _render_highest_prices),
+    'date_distribution': ((12, 6), _render_date_distribution),
+    'price_history': ((12, 6), _render_price_history),
+}
+
+
+def render_chart(name, data, chart_path):
+    """Render one chart to a PNG file and return the seconds it took.
+
+    Module level so chart worker processes can run it. Uses a standalone
+    Figure rather than pyplot, so no global figure state is shared between
+    charts or processes.
+    """
+    started = time.perf_counter()
+    figsize, renderer = CHART_RENDERERS[name]
+    fig = Figure(figsize=figsize)
+    renderer(fig, data)
+    fig.tight_layout()
+    fig.savefig(chart_path)
+    return time.perf_counter() - started
+
+
+# Scraper reused by _parse_page_worker within each parse process
+_worker_scraper = None
+
+
+def _extract_page_worker(site, parser_backend, page_source):
+    """Return the raw card fields of one page in a worker process."""
+    try:
+        return list(SITE_ADAPTERS[site].extractors[parser_backend](page_source))
+    except Exception as e:
+        print(f"Error scraping page: {e}")
+        return []
+
+
+def _parse_page_worker(site, parser_backend, page_source, search_phrase, category_model=None):
+    """Parse one page in a worker process (module level so it can be pickled).
+
+    Returns the records, the (stage, seconds) timings and the (name, labels,
+    value) counters recorded while parsing, for the parent to add to its metrics.
+    """
+    global _worker_scraper
+    settings = (site, parser_backend, category_model)
+    if _worker_scraper is None or (
+            _worker_scraper.site, _worker_scraper.parser_backend, _worker_scraper.category_model) != settings:
+        _worker_scraper = ClassifiedScraper(site=site, parser_backend=parser_backend, category_model=category_model)
+    metrics = _worker_scraper.metrics = Metrics()
+    records = _worker_scraper.parse_listings(page_source, search_phrase)
+    timings = [(stage, seconds) for stage, (count, seconds) in metrics.stage_totals().items()]
+    counters = [(name, dict(labels), value) for (name, labels), value in metrics.counters.items()]
+    return records, timings, counters
+
+
 def main():
     """Main function to run the scraper with interactive user input."""
     print("="*50)
@@ -941,6 +4087,26 @@ def main():
     region_choice = input("Enter region name (or leave empty for no region analysis): ").strip()
     region = None if not region_choice else region_choice
     
+    # Ask for fetch mode
+    print("\nHow should pages be fetched?")
+    print("1. Fast HTTP requests (browser used only when a page needs it)")
+    print("2. Browser only")
+    fetch_choice = input("Enter your choice (1/2, default is 1): ").strip()
+    fetch_mode = "browser" if fetch_choice == "2" else "http"
+    
+    # Ask for concurrency (parallel requests, or parallel browsers in browser mode)
+    concurrency = None
+    print("\nHow many pages should be fetched at the same time?")
+    concurrency_input = input("Enter number of parallel requests/browsers (default is 1, no parallelism): ").strip()
+    if concurrency_input.isdigit() and int(concurrency_input) > 1:
+        concurrency = int(concurrency_input)
+    
+    # Ask whether to continue an interrupted run
+    print("\nWould you like to resume the previous run?")
+    print("Phrases it finished are skipped and interrupted ones continue after the last saved page")
+    resume_choice = input("Resume previous run? (y/n, default is n): ").strip().lower()
+    resume = resume_choice in ('y', 'yes')
+    
     # Confirm choices before starting
     print("\n" + "="*50)
     print("Scraping Configuration:")
@@ -948,16 +4114,267 @@ def main():
     print(f"Search phrases: {search_phrases}")
     print(f"Max pages per search: {max_pages}")
     print(f"Region analysis: {'Yes - ' + region if region else 'No'}")
+    print(f"Fetch mode: {fetch_mode}")
+    print(f"Parallel requests: {concurrency or 1}")
+    print(f"Resume previous run: {'Yes' if resume else 'No'}")
     print("="*50)
     
     confirm = input("\nStart scraping with these settings? (y/n): ").strip().lower()
     if confirm == 'y' or confirm == 'yes':
         # Create and run scraper
-        scraper = ClassifiedScraper(site=site)
-        scraper.run_scraper(search_phrases, max_pages=max_pages, region=region)
+        scraper = ClassifiedScraper(site=site, fetch_mode=fetch_mode)
+        scraper.run_scraper(search_phrases, max_pages=max_pages, region=region, concurrency=concurrency,
+                            stream=True, resume=resume)
     else:
         print("Scraping cancelled. Please run the program again to start over.")
 
 
+# Exit codes of the command line: 2 is also what argparse uses for bad arguments
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NO_LISTINGS = 3
+EXIT_INTERRUPTED = 130
+
+# Job options passed to ClassifiedScraper and to run_scraper; also the keys allowed in a config file
+SCRAPER_OPTIONS = (
+    'fetch_mode', 'base_url', 'pages_dir', 'parser_backend', 'cache_dir', 'cache_ttl', 'offline',
+    'block_resources', 'category_model'
+)
+RUN_OPTIONS = (
+    'max_pages', 'region', 'concurrency', 'requests_per_second', 'jitter', 'parse_workers', 'chart_workers',
+    'stream', 'parquet_dir', 'resume', 'incremental', 'seen_threshold', 'use_bloom', 'excel', 'track_changes',
+    'pages_per_driver', 'metrics_dir'
+)
+JOB_DEFAULTS = {'sites': ['olx'], 'phrases': [], 'phrases_file': None, 'stream': True}
+
+
+def shard_of(phrase, shard_count):
+    """Return the shard (0 .. shard_count - 1) a phrase belongs to.
+
+    Based on a hash of the phrase itself, so every process and machine
+    agrees on it without coordination.
+    """
+    digest = hashlib.blake2b(phrase.strip().lower().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+
+def read_phrases_file(path):
+    """Read search phrases from a text file, one per line; blank lines and # comments are skipped."""
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def parse_args(argv):
+    """Parse the command line of a headless run."""
+    parser = argparse.ArgumentParser(
+        description="Scrape classified ads without prompts. Run without arguments for the interactive mode.",
+    )
+    parser.add_argument('--config', help="JSON file with job options, or a list of jobs under \"jobs\"")
+    parser.add_argument('--site', dest='sites', action='append', help="site to scrape; repeat or comma-separate")
+    parser.add_argument('--phrase', dest='phrases', action='append', help="search phrase; may be repeated")
+    parser.add_argument('--phrases-file', help="file with one search phrase per line")
+    parser.add_argument('--max-pages', type=int, help="pages per search phrase (default 3)")
+    parser.add_argument('--region', help="region to compare against the others in charts and reports")
+    parser.add_argument('--fetch-mode', choices=('http', 'browser'))
+    parser.add_argument('--base-url', help="site root override, e.g. a local server")
+    parser.add_argument('--concurrency', type=int, help="parallel requests, or browsers in browser mode")
+    parser.add_argument('--requests-per-second', type=float, help="initial request rate per host")
+    parser.add_argument('--jitter', type=float, help="random share added to every request delay (default 0.3)")
+    parser.add_argument('--parse-workers', type=int, help="processes parsing HTML")
+    parser.add_argument('--parser-backend', choices=('lxml', 'html.parser'), help="HTML parser (default: the site's)")
+    parser.add_argument('--category-model', help="keyword rules (.json) or trained category model (.npz)")
+    parser.add_argument('--chart-workers', type=int, help="processes rendering charts (0 = inline)")
+    parser.add_argument('--stream', action=argparse.BooleanOptionalAction,
+                        help="write every page as soon as it is scraped (default on)")
+    parser.add_argument('--parquet-dir', help="also write listings to this Parquet dataset")
+    parser.add_argument('--excel', action=argparse.BooleanOptionalAction, help="write Excel workbooks (default on)")
+    parser.add_argument('--resume', action=argparse.BooleanOptionalAction, help="continue the previous run")
+    parser.add_argument('--incremental', action=argparse.BooleanOptionalAction,
+                        help="stop paging once listings were seen before")
+    parser.add_argument('--seen-threshold', type=float,
+                        help="share of a page's listings seen before that stops an incremental phrase (default 0.8)")
+    parser.add_argument('--use-bloom', action=argparse.BooleanOptionalAction,
+                        help="look up seen listings in a Bloom filter instead of a set")
+    parser.add_argument('--track-changes', action=argparse.BooleanOptionalAction,
+                        help="record new ads, price changes and delistings (default on)")
+    parser.add_argument('--block-resources', action=argparse.BooleanOptionalAction,
+                        help="block images, fonts and trackers in Chrome (default on)")
+    parser.add_argument('--pages-per-driver', type=int, help="pages before a pooled browser is restarted (default 50)")
+    parser.add_argument('--pages-dir', help="save every fetched search page in this directory")
+    parser.add_argument('--metrics-dir', help="export stage timings and counters (JSON lines, Prometheus) here")
+    parser.add_argument('--cache-dir', help="on-disk page cache directory")
+    parser.add_argument('--cache-ttl', type=float, help="seconds a cached page stays fresh (default 3600)")
+    parser.add_argument('--offline', action=argparse.BooleanOptionalAction, help="replay from the page cache only")
+    parser.add_argument('--shard', default='0/1', help="INDEX/COUNT: run only the phrases of this shard (0-based)")
+    parser.add_argument('--queue', help="task queue file shared by the nodes of a distributed crawl")
+    queue_role = parser.add_mutually_exclusive_group()
+    queue_role.add_argument('--enqueue', action='store_true', help="add the jobs' pages to the queue")
+    queue_role.add_argument('--work', action='store_true', help="scrape pages leased from the queue")
+    queue_role.add_argument('--merge', action='store_true', help="merge the workers' results into listings.db")
+    parser.add_argument('--results-dir', default="queue_results", help="where workers write their results")
+    parser.add_argument('--visibility-timeout', type=float, default=300,
+                        help="seconds before a leased page is handed to another worker")
+    parser.add_argument('--summary', help="write a JSON summary of the jobs to this file")
+    parser.add_argument('--dry-run', action='store_true', help="print the phrases of this shard and exit")
+    return parser.parse_args(argv)
+
+
+def build_jobs(args, require_phrases=True):
+    """Merge config file jobs and command line options into a list of job dicts.
+
+    A config file holds job options (the long option names, with
+    underscores) and optionally a "jobs" list; each job inherits the file's
+    top-level options, and options given on the command line override them
+    all. Raises ValueError on unknown options or sites, and on jobs without
+    phrases when require_phrases is set.
+    """
+    allowed = set(SCRAPER_OPTIONS) | set(RUN_OPTIONS) | set(JOB_DEFAULTS)
+    config = {}
+    if args.config:
+        with open(args.config, encoding='utf-8') as f:
+            config = json.load(f)
+    job_configs = config.pop('jobs', None) or [{}]
+
+    overrides = {key: value for key, value in vars(args).items() if key in allowed and value is not None}
+    jobs = []
+    for job_config in job_configs:
+        job = {**JOB_DEFAULTS, **config, **job_config, **overrides}
+        unknown = set(job) - allowed
+        if unknown:
+            raise ValueError(f"Unknown job option(s): {', '.join(sorted(unknown))}")
+
+        sites = [job['sites']] if isinstance(job['sites'], str) else job['sites']
+        job['sites'] = [site.strip().lower() for entry in sites for site in entry.split(',') if site.strip()]
+        for site in job['sites']:
+            if site not in SITE_ADAPTERS:
+                raise ValueError(f"Unknown site: {site} (available: {', '.join(SITE_ADAPTERS)})")
+
+        phrases = list(job['phrases'] or [])
+        phrases_file = job.pop('phrases_file')
+        if phrases_file:
+            phrases += read_phrases_file(phrases_file)
+        # Keep the first occurrence of each phrase
+        job['phrases'] = list(dict.fromkeys(phrase.strip() for phrase in phrases if phrase.strip()))
+        if require_phrases and not job['phrases']:
+            raise ValueError("No search phrases given (use --phrase, --phrases-file or a config file)")
+        jobs.append(job)
+    return jobs
+
+
+def run_jobs(jobs, shard_index=0, shard_count=1):
+    """Run each job's sites over the phrases of one shard; returns a result dict per job and site."""
+    results = []
+    for job in jobs:
+        phrases = [phrase for phrase in job['phrases'] if shard_of(phrase, shard_count) == shard_index]
+        for site in job['sites']:
+            result = {'site': site, 'phrases': phrases, 'ok': True, 'listings': 0}
+            results.append(result)
+            if not phrases:
+                continue
+            try:
+                scraper = ClassifiedScraper(site=site, **{key: job[key] for key in SCRAPER_OPTIONS if key in job})
+                result['ok'] = bool(scraper.run_scraper(phrases, **{key: job[key] for key in RUN_OPTIONS if key in job}))
+                result['listings'] = sum(scraper.phrase_counts.values())
+            except Exception as e:
+                print(f"Error running {site} job: {e}")
+                result['ok'] = False
+    return results
+
+
+def run_queue_role(args, jobs, shard_index=0, shard_count=1):
+    """Enqueue the jobs' pages, work on the queue or merge its results; returns the exit code."""
+    if args.merge:
+        merged = 0
+        for site in dict.fromkeys(site for job in jobs for site in job['sites']):
+            scraper = ClassifiedScraper(site=site)
+            merged += scraper.merge_queue_results(args.results_dir, jobs[0].get('track_changes', True))
+        return EXIT_OK if merged else EXIT_NO_LISTINGS
+
+    queue = TaskQueue(args.queue, visibility_timeout=args.visibility_timeout).connect()
+    try:
+        if args.enqueue:
+            for job in jobs:
+                phrases = [phrase for phrase in job['phrases'] if shard_of(phrase, shard_count) == shard_index]
+                for site in job['sites']:
+                    added = queue.enqueue(site, phrases, job.get('max_pages', 3))
+                    print(f"Queued {added} new pages of {len(phrases)} phrases for {site}")
+            print(f"Queue: {queue.counts()}")
+            return EXIT_OK
+
+        for job in jobs:
+            for site in job['sites']:
+                scraper = ClassifiedScraper(site=site, **{key: job[key] for key in SCRAPER_OPTIONS if key in job})
+                scraper.run_queue_worker(queue, args.results_dir, requests_per_second=job.get('requests_per_second', 1.0),
+                                         metrics_dir=job.get('metrics_dir'))
+        counts = queue.counts()
+        print(f"Queue: {counts}")
+        # Pages that used up their attempts are lost for this crawl
+        return EXIT_FAILED if counts.get('failed') else EXIT_OK
+    finally:
+        queue.close()
+
+
+def cli(argv=None):
+    """Command line entry point; returns the process exit code.
+
+    Without arguments the interactive prompts of main() are used.
+    EXIT_FAILED means a job stopped on an error, EXIT_USAGE bad options or
+    config, EXIT_NO_LISTINGS that the jobs ran but stored no listings.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        main()
+        return EXIT_OK
+
+    args = parse_args(argv)
+    try:
+        shard_index, shard_count = (int(part) for part in args.shard.split('/'))
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"shard index must be between 0 and {shard_count - 1}")
+        if (args.enqueue or args.work) and not args.queue:
+            raise ValueError("--enqueue and --work need --queue")
+        # Workers and merges take their pages from the queue and results, not from phrases
+        jobs = build_jobs(args, require_phrases=not (args.work or args.merge))
+    except (OSError, ValueError) as e:
+        print(f"Error in configuration: {e}")
+        return EXIT_USAGE
+
+    if args.dry_run:
+        for job in jobs:
+            phrases = [phrase for phrase in job['phrases'] if shard_of(phrase, shard_count) == shard_index]
+            print(f"{', '.join(job['sites'])}: {len(phrases)} of {len(job['phrases'])} phrases in shard "
+                  f"{args.shard}: {phrases}")
+        return EXIT_OK
+
+    if args.enqueue or args.work or args.merge:
+        try:
+            return run_queue_role(args, jobs, shard_index, shard_count)
+        except KeyboardInterrupt:
+            print("Interrupted")
+            return EXIT_INTERRUPTED
+
+    try:
+        results = run_jobs(jobs, shard_index, shard_count)
+    except KeyboardInterrupt:
+        print("Interrupted")
+        return EXIT_INTERRUPTED
+
+    if not all(result['ok'] for result in results):
+        exit_code = EXIT_FAILED
+    elif not any(result['listings'] for result in results):
+        exit_code = EXIT_NO_LISTINGS
+    else:
+        exit_code = EXIT_OK
+
+    for result in results:
+        status = "ok" if result['ok'] else "failed"
+        print(f"{result['site']}: {len(result['phrases'])} phrases, {result['listings']} listings, {status}")
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump({'exit_code': exit_code, 'shard': args.shard, 'jobs': results}, f, indent=1)
+    return exit_code
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(cli())
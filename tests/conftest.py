@@ -0,0 +1,121 @@
+"""Shared fixtures: saved search result pages and a local HTTP server that serves them."""
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import matplotlib
+import pytest
+
+# Charts are rendered without a display
+matplotlib.use("Agg")
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(TESTS_DIR, "fixtures")
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+import classified_scrapper  # noqa: E402
+from classified_scrapper import ListingDatabase  # noqa: E402
+
+
+def read_fixture(name):
+    """Return the text of a saved page in tests/fixtures."""
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class FixtureServer:
+    """Serves fixture pages by request path (query included); other paths get a 404.
+
+    Pages carry an ETag, and a request whose If-None-Match still matches gets
+    a 304. The status of every response is kept in `statuses`.
+    """
+
+    def __init__(self):
+        """Start on a free local port."""
+        self.routes = {}
+        self.requests = []
+        self.statuses = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                name = server.routes.get(self.path)
+                if name is None:
+                    server.statuses.append(404)
+                    self.send_error(404)
+                    return
+                body = read_fixture(name).encode('utf-8')
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    server.statuses.append(304)
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                server.statuses.append(200)
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fixture_server():
+    """A FixtureServer; set its routes to {path: fixture name}."""
+    server = FixtureServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, since the scraper writes its files to the working directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def run_options():
+    """run_scraper options for fast test runs: no pacing, inline charts, no Excel."""
+    return {'requests_per_second': 100, 'jitter': 0, 'chart_workers': 0, 'excel': False}
+
+
+@pytest.fixture
+def no_browser(monkeypatch):
+    """Make every browser start fail as it does without Chrome; returns the list of attempts."""
+    attempts = []
+
+    def create_driver(user_agent, blocker=None):
+        attempts.append(user_agent)
+        raise RuntimeError("Chrome is not installed")
+
+    monkeypatch.setattr(classified_scrapper, 'create_driver', create_driver)
+    return attempts
+
+
+def read_checkpoint(path, site, search_phrase):
+    """Return a phrase's crawl checkpoint from the database at path."""
+    db = ListingDatabase(str(path))
+    db.connect()
+    try:
+        return db.load_checkpoint(site, search_phrase)
+    finally:
+        db.close()
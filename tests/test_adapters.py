@@ -0,0 +1,114 @@
+"""Site adapters checked against saved pages, without a browser."""
+from urllib.parse import quote_plus
+
+import pytest
+from bs4 import BeautifulSoup
+
+from classified_scrapper import SITE_ADAPTERS, ClassifiedScraper, SiteAdapter, register_site_adapter
+from conftest import read_fixture
+
+
+def test_olx_urls():
+    adapter = SITE_ADAPTERS['olx']
+
+    assert adapter.build_search_url("https://www.olx.pl", "dom 100m2") == "https://www.olx.pl/oferty/q-dom-100m2/"
+    assert (adapter.build_search_url("http://localhost:8000", "dom", page=3)
+            == "http://localhost:8000/oferty/q-dom/?page=3")
+
+
+def test_allegro_urls():
+    adapter = SITE_ADAPTERS['allegro']
+
+    assert adapter.build_search_url("https://allegro.pl", "laptop 16gb") == "https://allegro.pl/listing?string=laptop+16gb"
+    assert (adapter.build_search_url("https://allegro.pl", "laptop", page=2)
+            == "https://allegro.pl/listing?string=laptop&p=2")
+
+
+def test_olx_cards():
+    cards = SITE_ADAPTERS['olx'].extract_lxml(read_fixture('olx_search.html'))
+
+    assert cards == [
+        ('Dom 100 m2 Warszawa', 'Warszawa, Mokotów', 'Dzisiaj o 10:00', '850 000 złdo negocjacji',
+         'https://www.olx.pl/d/oferta/dom-100-m2-warszawa-CID3-ID1abcd.html'),
+        ('Mieszkanie 50,5 mkw & balkon', 'Kraków, Podgórze', '12 maja 2025', '1\xa0200,50\xa0zł',
+         'https://www.olx.pl/d/oferta/mieszkanie-50-m2-krakow-CID3-ID2efgh.html'),
+        # Absolute links to partner sites are kept as they are
+        ('Dom wolnostojący 180 m² z ogrodem', 'Piaseczno', 'Odświeżono dnia 10 maja 2025', '1 450 000 zł',
+         'https://www.otodom.pl/pl/oferta/dom-wolnostojacy-ID4xyz'),
+        # Missing fields fall back to the defaults
+        ('Działka budowlana 1000m2', 'Łódź', 'No Date', '0 zł', 'No URL'),
+    ]
+
+
+def test_allegro_cards():
+    cards = SITE_ADAPTERS['allegro'].extract_lxml(read_fixture('allegro_search.html'))
+
+    assert cards == [
+        ('Laptop Lenovo ThinkPad T14 16GB 512SSD', 'Warszawa', 'Not available', '2 499,00\xa0zł',
+         'https://allegro.pl/oferta/laptop-lenovo-thinkpad-t14-16gb-512ssd-13579246801'),
+        ('MacBook Air M1 8GB/256GB "jak nowy"', 'Gdańsk', 'Not available', '3 199 zł',
+         'https://allegro.pl/oferta/macbook-air-m1-8gb-256gb-13579246802'),
+        ('Laptop Dell Latitude 5420 - outlet', 'No Location', 'Not available', '1 899,99 zł', 'No URL'),
+    ]
+
+
+@pytest.mark.parametrize('site', ['olx', 'allegro'])
+def test_markers(site):
+    adapter = SITE_ADAPTERS[site]
+    search, empty = read_fixture(f'{site}_search.html'), read_fixture(f'{site}_empty.html')
+    shell = read_fixture('olx_js_shell.html')
+
+    assert adapter.listing_marker.search(search) and adapter.results_marker.search(search)
+    assert not adapter.listing_marker.search(empty) and adapter.results_marker.search(empty)
+    assert not adapter.listing_marker.search(shell) and not adapter.results_marker.search(shell)
+    # The browser's ready check finds the empty-results message only on the empty page
+    assert BeautifulSoup(empty, 'html.parser').select(adapter.empty_selector)
+    assert not BeautifulSoup(search, 'html.parser').select(adapter.empty_selector)
+
+
+@pytest.fixture
+def example_site():
+    """Register an extra site for one test."""
+    adapter = register_site_adapter(SiteAdapter(
+        name="example",
+        base_url="https://example.pl",
+        search_url="{base_url}/search?q={phrase}",
+        page_url="{search_url}&page={page}",
+        phrase_encoder=quote_plus,
+        listing_selector='li[data-role="ad"]',
+        listing_xpath='//li[@data-role="ad"]',
+        listing_marker=r'data-role="ad"',
+        results_marker=r'id="results"',
+        fields={'title': 'h3', 'location': 'span.city', 'price': 'span.price', 'link': 'a'},
+        field_xpaths={
+            'title': '(.//h3)[1]',
+            'location': '(.//span[@class="city"])[1]',
+            'price': '(.//span[@class="price"])[1]',
+            'link': '(.//a)[1]'
+        },
+        cookie_button="#accept-cookies",
+        search_input="input[name='q']",
+        search_button="button[type='submit']",
+        next_page="a.next",
+        url_prefix="https://example.pl"
+    ))
+    yield adapter
+    del SITE_ADAPTERS[adapter.name]
+
+
+@pytest.mark.parametrize('backend', ['lxml', 'html.parser'])
+def test_registered_site_is_scraped_through_its_adapter(example_site, backend):
+    page = '''<ul id="results">
+    <li data-role="ad"><a href="/ad/1"><h3>Rower miejski</h3></a><span class="city">Poznań</span>
+    <span class="price">450 zł</span></li>
+    </ul>'''
+    scraper = ClassifiedScraper(site="example", parser_backend=backend)
+
+    records = scraper.parse_listings(page, 'rower')
+
+    assert scraper.build_search_url('rower miejski', 2) == "https://example.pl/search?q=rower+miejski&page=2"
+    assert len(records) == 1
+    record = records[0]
+    assert (record['title'], record['location'], record['url']) == ('Rower miejski', 'Poznań', 'https://example.pl/ad/1')
+    assert record['price_value'] == 450.0
+    assert record['category'] == 'vehicles'
@@ -0,0 +1,127 @@
+"""Browser pages: the cached chromedriver path, waiting for results, and BrowserWorkerPool retries."""
+import pytest
+
+import classified_scrapper
+from classified_scrapper import AdaptiveRateLimiter, BrowserWorkerPool, ClassifiedScraper
+from conftest import read_fixture
+
+
+@pytest.fixture
+def driver_files(tmp_path, monkeypatch):
+    """An 'old' cached driver and a 'new' one that ChromeDriverManager installs; returns both paths."""
+    old, new = tmp_path / 'old_chromedriver', tmp_path / 'new_chromedriver'
+    old.touch()
+    new.touch()
+    cache = tmp_path / '.chromedriver_path'
+    cache.write_text(str(old))
+    installs = []
+
+    class ChromeDriverManager:
+        def install(self):
+            installs.append(str(new))
+            return str(new)
+
+    monkeypatch.setattr(classified_scrapper, 'DRIVER_PATH_CACHE', str(cache))
+    monkeypatch.setattr(classified_scrapper, '_driver_path', None)
+    monkeypatch.setattr(classified_scrapper, 'ChromeDriverManager', ChromeDriverManager)
+    return str(old), str(new), cache, installs
+
+
+def test_stale_driver_path_is_resolved_again(driver_files):
+    old, new, cache, installs = driver_files
+    assert classified_scrapper.get_driver_path() == old
+    assert installs == []
+
+    assert classified_scrapper.get_driver_path(stale=old) == new
+    assert installs == [new]
+    assert cache.read_text() == new
+    assert classified_scrapper.get_driver_path() == new
+
+
+def test_create_driver_retries_once_with_a_fresh_driver(driver_files, monkeypatch):
+    old, new, cache, installs = driver_files
+    started = []
+
+    class Chrome:
+        def __init__(self, service, options):
+            started.append(service.path)
+            if service.path == old:
+                raise RuntimeError("session not created: This version of ChromeDriver only supports Chrome 120")
+
+        def execute_script(self, script):
+            pass
+
+    monkeypatch.setattr(classified_scrapper.webdriver, 'Chrome', Chrome)
+    assert isinstance(classified_scrapper.create_driver("test agent"), Chrome)
+    assert started == [old, new]
+    assert cache.read_text() == new
+
+
+class FakeDriver:
+    """A driver whose page reports a fixed readiness state: (readyState, cards, resources, empty messages)."""
+
+    def __init__(self, state=('complete', 0, 10, 0)):
+        self.state = list(state)
+        self.selectors = None
+
+    def execute_script(self, script, *args):
+        self.selectors = args
+        return self.state
+
+    def quit(self):
+        pass
+
+
+def test_empty_results_page_is_ready_without_cards():
+    driver = FakeDriver(('complete', 0, 10, 1))
+    waited = classified_scrapper.wait_until_ready(driver, 'div[data-cy="l-card"]', settle=0.05, poll=0.01,
+                                                  empty_selector='[data-testid="search-no-results"]')
+    assert waited is not None and waited < 1
+    assert driver.selectors == ('div[data-cy="l-card"]', '[data-testid="search-no-results"]')
+
+
+def test_page_without_cards_or_empty_message_times_out():
+    driver = FakeDriver(('complete', 0, 10, 0))
+    assert classified_scrapper.wait_until_ready(driver, 'div[data-cy="l-card"]', timeout=0.2, settle=0.05,
+                                                poll=0.01) is None
+
+
+@pytest.fixture
+def pool_scraper(monkeypatch):
+    """A scraper whose browser pages are the OLX fixtures: listings on page 1, none on page 2."""
+    pages = {1: 'olx_search.html', 2: 'olx_empty.html'}
+
+    def load_page(driver, url, listing_selector, blocker=None, metrics=None, empty_selector=None):
+        return read_fixture(pages[2 if 'page=2' in url else 1])
+
+    monkeypatch.setattr(classified_scrapper, 'load_page', load_page)
+    scraper = ClassifiedScraper(site="olx")
+    scraper.rate_limiter = AdaptiveRateLimiter(initial_rate=100, jitter=0)
+    return scraper
+
+
+def test_pool_retries_page_after_driver_failure(pool_scraper, monkeypatch):
+    attempts = []
+
+    def create_driver(user_agent, blocker=None):
+        attempts.append(user_agent)
+        if len(attempts) == 1:
+            raise RuntimeError("Chrome crashed")
+        return FakeDriver()
+
+    monkeypatch.setattr(classified_scrapper, 'create_driver', create_driver)
+    results = BrowserWorkerPool(pool_scraper, workers=1).run(['dom'], max_pages=2)
+
+    assert len(attempts) == 2
+    assert len(results['dom']) == 4
+    assert pool_scraper.failed_pages == {}
+    assert 'dom' in pool_scraper.exhausted_phrases
+
+
+def test_pool_records_pages_that_use_up_their_attempts(pool_scraper, no_browser):
+    results = BrowserWorkerPool(pool_scraper, workers=1, max_attempts=2).run(['dom'], max_pages=2)
+
+    assert results == {'dom': []}
+    assert len(no_browser) == 4
+    assert pool_scraper.failed_pages == {'dom': {1, 2}}
+    assert 'dom' not in pool_scraper.exhausted_phrases
@@ -0,0 +1,70 @@
+"""Change detection: new ads, price changes and delistings, and when a crawl counts as complete."""
+import pytest
+
+from classified_scrapper import ChangeDetector, ClassifiedScraper, ListingDatabase
+
+
+def listing(url, price, scraped_date="2025-05-07 10:00:00"):
+    """A listing record of the 'dom' phrase with the given URL and price."""
+    return {
+        'title': "Dom 100 m2", 'location': "Warszawa", 'price': f"{price} zł", 'price_value': float(price),
+        'url': url, 'date_posted': "Dzisiaj", 'category': 'real estate', 'square_meters': 100.0,
+        'price_per_sqm': price / 100, 'search_phrase': "dom", 'scraped_date': scraped_date,
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A database holding three 'dom' ads from an earlier run."""
+    db = ListingDatabase(str(tmp_path / 'listings.db'))
+    db.connect()
+    db.upsert_listings([listing(f"https://olx.pl/d/{n}", 500000 + n) for n in range(3)])
+    yield db
+    db.close()
+
+
+def events(db):
+    """Return the recorded events as sorted (event, url, old_price, new_price) tuples."""
+    frame = db.listing_events()
+    return sorted(zip(frame['event'], frame['url'], frame['old_price'].fillna(0), frame['new_price'].fillna(0)))
+
+
+def test_complete_crawl_records_new_changed_and_delisted_ads(db):
+    detector = ChangeDetector(db)
+    detector.diff([
+        listing("https://olx.pl/d/0", 500000, "2025-05-14 10:00:00"),
+        listing("https://olx.pl/d/1", 450000, "2025-05-14 10:00:00"),
+        listing("https://olx.pl/d/3", 700000, "2025-05-14 10:00:00"),
+    ])
+
+    assert detector.finish("dom", complete=True) == {'new': 1, 'price_change': 1, 'delisted': 1}
+    assert events(db) == [
+        ('delisted', "https://olx.pl/d/2", 500002.0, 0),
+        ('new', "https://olx.pl/d/3", 0, 700000.0),
+        ('price_change', "https://olx.pl/d/1", 500001.0, 450000.0),
+    ]
+    delisted = db.conn.execute('SELECT url FROM listings WHERE delisted_at IS NOT NULL').fetchall()
+    assert delisted == [("https://olx.pl/d/2",)]
+
+
+def test_incomplete_crawl_records_no_delistings(db):
+    detector = ChangeDetector(db)
+    detector.diff([listing("https://olx.pl/d/0", 500000), listing("https://olx.pl/d/1", 500001)])
+
+    assert detector.finish("dom", complete=False) == {}
+    assert events(db) == []
+
+
+def test_failed_page_before_the_last_page_records_no_delistings(db, workdir):
+    scraper = ClassifiedScraper(site="olx")
+    scraper.setup_database()
+    try:
+        scraper.change_detector = ChangeDetector(scraper.db)
+        scraper.change_detector.diff([listing("https://olx.pl/d/0", 500000), listing("https://olx.pl/d/1", 500001)])
+        # Page 2 failed and page 3 came back empty: the ad on page 2 may still be listed
+        scraper.exhausted_phrases.add("dom")
+        scraper.failed_pages = {"dom": {2}}
+        scraper._finish_changes("dom")
+        assert events(scraper.db) == []
+    finally:
+        scraper.cleanup()
@@ -0,0 +1,44 @@
+"""Chart cache: charts are only drawn again when their aggregated data changes."""
+import os
+
+import pandas as pd
+
+import classified_scrapper
+from classified_scrapper import SITE_ADAPTERS, ClassifiedScraper, aggregate_listings, enrich_listings
+from conftest import read_fixture
+
+
+def test_unchanged_charts_are_reused_and_changed_ones_redrawn(workdir, monkeypatch):
+    rendered = []
+
+    def render_chart(name, data, chart_path):
+        rendered.append(name)
+        with open(chart_path, 'wb') as f:
+            f.write(name.encode('utf-8'))
+        return 0.0
+
+    monkeypatch.setattr(classified_scrapper, 'render_chart', render_chart)
+    listings = enrich_listings(SITE_ADAPTERS['olx'].extract_lxml(read_fixture('olx_search.html')), "dom")
+    scraper = ClassifiedScraper(site="olx")
+    scraper.chart_workers = 0
+
+    def generate(run_id, listings):
+        rendered.clear()
+        scraper.run_id = run_id
+        assert scraper.generate_charts("dom", None, aggregates=aggregate_listings(pd.DataFrame(listings)))
+        return set(rendered)
+
+    first = generate("run1", listings)
+    assert 'price_distribution' in first and 'category_distribution' in first
+
+    # Same data: nothing is drawn, and the new run's directory still has every chart
+    assert generate("run2", listings) == set()
+    assert sorted(os.listdir(workdir / 'charts' / 'dom' / 'run2')) == sorted(f"{name}.png" for name in first)
+    assert (workdir / 'charts' / 'dom' / 'run2' / 'price_distribution.png').read_bytes() == b'price_distribution'
+
+    # A price change redraws the price charts only
+    changed = [dict(listing) for listing in listings]
+    changed[0]['price_value'] = 800000.0
+    redrawn = generate("run3", changed)
+    assert 'highest_prices' in redrawn and 'avg_price_by_location' in redrawn
+    assert 'category_distribution' not in redrawn and 'date_distribution' not in redrawn
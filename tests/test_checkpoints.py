@@ -0,0 +1,74 @@
+"""Crawl checkpoints: completion flags from earlier runs, and what is flushed per page."""
+import pytest
+
+from classified_scrapper import ClassifiedScraper
+from conftest import read_checkpoint
+
+
+def olx_routes(*phrases):
+    """One page of listings then an empty page for each phrase."""
+    routes = {}
+    for phrase in phrases:
+        routes[f'/oferty/q-{phrase}/'] = 'olx_search.html'
+        routes[f'/oferty/q-{phrase}/?page=2'] = 'olx_empty.html'
+    return routes
+
+
+def test_new_run_clears_completion_flags(fixture_server, workdir, monkeypatch, run_options):
+    fixture_server.routes = olx_routes('dom', 'mieszkanie')
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+    assert scraper.run_scraper(['dom', 'mieszkanie'], **run_options)
+
+    # A second run dies on its first page, before reaching 'mieszkanie'
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+    def fail(phrase, page=1):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(scraper, 'fetch_search_page', fail)
+    assert scraper.run_scraper(['dom', 'mieszkanie'], **run_options) is False
+
+    for phrase in ('dom', 'mieszkanie'):
+        checkpoint = read_checkpoint(workdir / 'listings.db', 'olx', phrase)
+        assert checkpoint['last_page'] == 0
+        assert not checkpoint['completed']
+
+
+def test_streaming_checkpoints_keep_parquet_buffered(fixture_server, workdir, run_options):
+    pq = pytest.importorskip('pyarrow.parquet')
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_search.html',
+        '/oferty/q-dom/?page=2': 'olx_search.html',
+        '/oferty/q-dom/?page=3': 'olx_search.html',
+        '/oferty/q-dom/?page=4': 'olx_empty.html',
+    }
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+    assert scraper.run_scraper(['dom'], max_pages=5, stream=True, parquet_dir=str(workdir / 'parquet'),
+                               **run_options)
+
+    files = list((workdir / 'parquet').rglob('*.parquet'))
+    assert len(files) == 1
+    parquet_file = pq.ParquetFile(str(files[0]))
+    assert parquet_file.metadata.num_rows == 12
+    assert parquet_file.num_row_groups == 1
+
+
+def test_failed_page_leaves_phrase_to_resume(fixture_server, workdir, run_options):
+    # Page 2 of 'dom' is not routed, so the server answers 404
+    fixture_server.routes = {'/oferty/q-dom/': 'olx_search.html', **olx_routes('mieszkanie')}
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+    assert scraper.run_scraper(['dom', 'mieszkanie'], max_pages=3, **run_options) is False
+
+    checkpoint = read_checkpoint(workdir / 'listings.db', 'olx', 'dom')
+    assert checkpoint['last_page'] == 1
+    assert not checkpoint['completed']
+    assert read_checkpoint(workdir / 'listings.db', 'olx', 'mieszkanie')['completed']
+
+    # Once the page is back, resume only fetches 'dom' again, from its failed page
+    fixture_server.routes['/oferty/q-dom/?page=2'] = 'olx_empty.html'
+    fixture_server.requests.clear()
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+    assert scraper.run_scraper(['dom', 'mieszkanie'], max_pages=3, resume=True, **run_options)
+    assert fixture_server.requests == ['/oferty/q-dom/?page=2']
+    assert read_checkpoint(workdir / 'listings.db', 'olx', 'dom')['completed']
@@ -0,0 +1,91 @@
+"""HashedNgramClassifier: training, prediction, saving, and training from the database."""
+import numpy as np
+import pytest
+
+from classified_scrapper import HashedNgramClassifier, ListingDatabase, train_category_model
+
+TITLES = {
+    'electronics': ["Laptop Dell Latitude", "Laptop Lenovo ThinkPad", "Telefon Samsung Galaxy", "Telefon iPhone 13",
+                    "Telewizor LG 55 cali", "Telewizor Samsung 4K"],
+    'furniture': ["Sofa rozkładana szara", "Sofa narożna", "Stół dębowy rozkładany", "Stół z krzesłami",
+                  "Szafa przesuwna biała", "Szafa trzydrzwiowa"],
+    'other': ["Zegarek Casio G-Shock", "Zegarek Casio damski", "Gitara klasyczna", "Gitara elektryczna Fender",
+              "Rower górski", "Rower miejski damski"],
+}
+
+
+def labeled(titles=TITLES):
+    """Return the titles and their labels as two lists."""
+    pairs = [(title, label) for label, label_titles in titles.items() for title in label_titles]
+    return [title for title, _ in pairs], [label for _, label in pairs]
+
+
+@pytest.fixture(scope='module')
+def model():
+    titles, labels = labeled()
+    return HashedNgramClassifier(n_features=2 ** 12).fit(titles, labels, epochs=30, batch_size=8)
+
+
+def test_fit_learns_other_as_a_category(model):
+    assert model.classes == ['electronics', 'furniture', 'other']
+    assert model.predict(["Laptop Dell", "Sofa szara", "Zegarek Casio", "Gitara"]) == [
+        'electronics', 'furniture', 'other', 'other'
+    ]
+    assert model.predict([]) == []
+    probabilities = model.predict_proba(["Telefon Samsung"])
+    assert probabilities.shape == (1, 3)
+    assert probabilities.sum() == pytest.approx(1.0)
+
+
+def test_evaluate_counts_every_label(model):
+    titles, labels = labeled()
+    metrics = model.evaluate(titles, labels)
+    assert metrics['titles'] == 18
+    assert metrics['accuracy'] == 1.0
+
+
+def test_saved_model_predicts_the_same(model, tmp_path):
+    path = str(tmp_path / 'model.npz')
+    model.save(path)
+    loaded = HashedNgramClassifier.load(path)
+
+    titles, _ = labeled()
+    assert loaded.classes == model.classes
+    assert loaded.n_features == model.n_features
+    np.testing.assert_allclose(loaded.predict_proba(titles), model.predict_proba(titles))
+
+
+def store_titles(path, titles):
+    """Store listings with the given {category: titles} in a database at path."""
+    db = ListingDatabase(path)
+    db.connect()
+    try:
+        db.upsert_listings([
+            {'title': title, 'location': "Kraków", 'price': "100 zł", 'price_value': 100.0,
+             'url': f"https://olx.pl/d/{label}-{n}", 'date_posted': "Dzisiaj", 'category': label,
+             'square_meters': 0.0, 'price_per_sqm': 0.0, 'search_phrase': "test",
+             'scraped_date': "2025-05-07 10:00:00"}
+            for label, label_titles in titles.items() for n, title in enumerate(label_titles)
+        ])
+    finally:
+        db.close()
+
+
+def test_train_category_model_keeps_other(tmp_path):
+    db_path, model_path = str(tmp_path / 'listings.db'), str(tmp_path / 'model.npz')
+    store_titles(db_path, TITLES)
+
+    metrics = train_category_model(db_path, model_path, holdout=0.25, epochs=30)
+    assert metrics['titles'] + metrics['training_titles'] == 18
+    assert HashedNgramClassifier.load(model_path).classes == ['electronics', 'furniture', 'other']
+
+
+def test_train_category_model_on_other_only(tmp_path):
+    db_path, model_path = str(tmp_path / 'listings.db'), str(tmp_path / 'model.npz')
+    store_titles(db_path, {'other': TITLES['other']})
+
+    metrics = train_category_model(db_path, model_path)
+    assert metrics['accuracy'] == 1.0
+    assert HashedNgramClassifier.load(model_path).predict(["Laptop Dell"]) == ['other']
+    # Without 'other' there is nothing left to train on
+    assert train_category_model(db_path, model_path, include_other=False) is None
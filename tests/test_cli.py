@@ -0,0 +1,39 @@
+"""Command line: job options from config files and flags."""
+import json
+
+import pytest
+
+from classified_scrapper import RUN_OPTIONS, SCRAPER_OPTIONS, build_jobs, parse_args
+
+
+def test_every_job_option_has_a_flag():
+    flags = vars(parse_args([]))
+
+    assert set(SCRAPER_OPTIONS) | set(RUN_OPTIONS) <= set(flags)
+
+
+def test_flags_override_config(tmp_path):
+    config = tmp_path / 'jobs.json'
+    config.write_text(json.dumps({
+        'use_bloom': True, 'seen_threshold': 0.5, 'pages_per_driver': 20, 'cache_ttl': 60,
+        'jobs': [{'phrases': ['dom'], 'parser_backend': 'html.parser'}, {'phrases': ['laptop'], 'sites': 'allegro'}],
+    }), encoding='utf-8')
+
+    jobs = build_jobs(parse_args([
+        '--config', str(config), '--seen-threshold', '0.9', '--no-use-bloom', '--jitter', '0', '--pages-dir', 'pages',
+        '--category-model', 'rules.json',
+    ]))
+
+    assert [job['phrases'] for job in jobs] == [['dom'], ['laptop']]
+    assert jobs[0]['parser_backend'] == 'html.parser' and 'parser_backend' not in jobs[1]
+    for job in jobs:
+        assert (job['seen_threshold'], job['use_bloom'], job['pages_per_driver'], job['cache_ttl']) == (0.9, False, 20, 60)
+        assert (job['jitter'], job['pages_dir'], job['category_model']) == (0, 'pages', 'rules.json')
+
+
+def test_unknown_config_option(tmp_path):
+    config = tmp_path / 'jobs.json'
+    config.write_text(json.dumps({'phrases': ['dom'], 'max_page': 3}), encoding='utf-8')
+
+    with pytest.raises(ValueError, match='max_page'):
+        build_jobs(parse_args(['--config', str(config)]))
@@ -0,0 +1,149 @@
+"""ListingDatabase storage: upserts by URL, the price rollups and the schema migrations."""
+import sqlite3
+
+import pytest
+
+from classified_scrapper import ListingDatabase
+
+
+def listing(url, price, scraped_date="2025-05-07 10:00:00", **fields):
+    """A listing record with the given URL and price; other fields can be overridden."""
+    return {
+        'title': "Mieszkanie 50 m2", 'location': "Kraków", 'price': f"{price} zł", 'price_value': float(price),
+        'url': url, 'date_posted': "Dzisiaj", 'category': 'real estate', 'square_meters': 50.0,
+        'price_per_sqm': price / 50, 'search_phrase': "mieszkanie", 'scraped_date': scraped_date, **fields,
+    }
+
+
+def test_upsert_updates_listings_by_url(tmp_path):
+    db = ListingDatabase(str(tmp_path / 'listings.db'), batch_size=2)
+    db.connect()
+    try:
+        db.upsert_listings([listing("https://a", 500000), listing("https://b", 600000), listing("No URL", 1)])
+        db.upsert_listings([listing("https://a", 480000, "2025-05-14 10:00:00")])
+
+        rows = db.conn.execute('''
+        SELECT url, price_value, first_seen, last_seen FROM listings WHERE url IS NOT NULL ORDER BY url
+        ''').fetchall()
+        assert rows == [
+            ("https://a", 480000.0, "2025-05-07 10:00:00", "2025-05-14 10:00:00"),
+            ("https://b", 600000.0, "2025-05-07 10:00:00", "2025-05-07 10:00:00"),
+        ]
+        # Listings without a link are kept but never merged
+        assert db.conn.execute('SELECT COUNT(*) FROM listings WHERE url IS NULL').fetchone()[0] == 1
+        assert db.price_history("https://a")['price_value'].tolist() == [500000.0, 480000.0]
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def history(tmp_path):
+    """A database with two weeks of observations in Warszawa and Kraków."""
+    db = ListingDatabase(str(tmp_path / 'listings.db'))
+    db.connect()
+    # Monday 5 and Wednesday 7 May fall in one week, Monday 12 May starts the next
+    db.upsert_listings([
+        listing("https://a", 400000, "2025-05-05 10:00:00", location="Warszawa, Mokotów"),
+        listing("https://b", 600000, "2025-05-05 11:00:00", location="Warszawa, Mokotów"),
+        listing("https://c", 900000, "2025-05-05 12:00:00", location="Warszawa, Mokotów", search_phrase="dom"),
+        listing("https://d", 500000, "2025-05-07 10:00:00", location="Warszawa, Wola"),
+        listing("https://e", 300000, "2025-05-07 10:00:00"),
+        # An unparsed price is left out of the medians but still counted
+        listing("https://f", 0, "2025-05-07 11:00:00", price_per_sqm=0.0),
+    ])
+    db.upsert_listings([listing("https://a", 380000, "2025-05-12 10:00:00", location="Warszawa, Mokotów")])
+    yield db
+    db.close()
+
+
+def test_weekly_median_price(history):
+    weekly = history.weekly_median_price()
+    assert list(weekly.itertuples(index=False, name=None)) == [
+        ("Kraków", "2025-05-05", 300000.0, 2),
+        ("Warszawa, Mokotów", "2025-05-05", 600000.0, 3),
+        ("Warszawa, Mokotów", "2025-05-12", 380000.0, 1),
+        ("Warszawa, Wola", "2025-05-05", 500000.0, 1),
+    ]
+    # A city covers its districts; phrase, date and price per m² filters
+    assert history.weekly_median_price("Warszawa")['location'].unique().tolist() == [
+        "Warszawa, Mokotów", "Warszawa, Wola"
+    ]
+    mokotow = history.weekly_median_price("Warszawa, Mokotów", search_phrase="mieszkanie", per_sqm=True)
+    assert mokotow[['week', 'median_price_per_sqm', 'listings']].values.tolist() == [
+        ["2025-05-05", 10000.0, 2], ["2025-05-12", 7600.0, 1]
+    ]
+    assert history.weekly_median_price(since="2025-05-14")['week'].tolist() == ["2025-05-12"]
+
+
+def test_daily_prices(history):
+    daily = history.daily_prices()
+    assert daily['day'].tolist() == ["2025-05-05", "2025-05-07", "2025-05-12"]
+    assert daily['listings'].tolist() == [3, 3, 1]
+    first = daily.iloc[0]
+    assert (first['mean_price'], first['median_price'], first['min_price'], first['max_price']) == (
+        pytest.approx(633333.33), 600000.0, 400000.0, 900000.0
+    )
+    # The unparsed price doesn't pull the statistics of 7 May down
+    assert daily.iloc[1][['median_price', 'min_price']].tolist() == [400000.0, 300000.0]
+    assert history.daily_prices("dom")[['day', 'listings', 'median_price']].values.tolist() == [
+        ["2025-05-05", 1, 900000.0]
+    ]
+    assert history.daily_prices(since="2025-05-07 00:00:00")['day'].tolist() == ["2025-05-07", "2025-05-12"]
+
+
+def test_rollups_refresh_only_changed_weeks_and_days(history):
+    history.refresh_rollups()
+    history.upsert_listings([listing("https://g", 1000000, "2025-05-12 12:00:00", location="Warszawa, Mokotów")])
+    assert history.dirty_weeks == {"2025-05-12"}
+    assert history.dirty_days == {"2025-05-12"}
+
+    weekly = history.weekly_median_price("Warszawa, Mokotów")
+    assert weekly[['week', 'median_price', 'listings']].values.tolist() == [
+        ["2025-05-05", 600000.0, 3], ["2025-05-12", 690000.0, 2]
+    ]
+    assert history.daily_prices()['max_price'].tolist() == [900000.0, 500000.0, 1000000.0]
+    assert not history.dirty_weeks and not history.dirty_days
+
+
+def test_failed_migration_leaves_database_unchanged(tmp_path, monkeypatch):
+    path = str(tmp_path / 'listings.db')
+    # A database from before the first migration, with a duplicate scrape of one ad
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE listings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, location TEXT, price TEXT, price_value REAL, url TEXT,
+        date_posted TEXT, category TEXT, square_meters REAL, price_per_sqm REAL, search_phrase TEXT, scraped_date TEXT
+    )
+    ''')
+    conn.executemany('INSERT INTO listings VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+        tuple(listing("https://a", price, scraped_date).values())
+        for price, scraped_date in ((500000, "2025-05-07 10:00:00"), (480000, "2025-05-14 10:00:00"))
+    ])
+    conn.commit()
+    conn.close()
+
+    def fail(self):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(ListingDatabase, '_migrate_v5', fail)
+    with pytest.raises(sqlite3.OperationalError):
+        ListingDatabase(path).connect()
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert 'observations' not in tables and 'weekly_prices' not in tables
+        assert conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0] == 2
+    finally:
+        conn.close()
+
+    monkeypatch.undo()
+    db = ListingDatabase(path)
+    db.connect()
+    try:
+        assert db.conn.execute('PRAGMA user_version').fetchone()[0] == ListingDatabase.SCHEMA_VERSION
+        assert db.conn.execute('SELECT COUNT(*) FROM listings').fetchone()[0] == 1
+        assert db.daily_prices()['listings'].tolist() == [1]
+    finally:
+        db.close()
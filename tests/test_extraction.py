@@ -0,0 +1,78 @@
+"""Price, area and category extraction helpers."""
+import itertools
+
+import numpy as np
+import pytest
+
+from classified_scrapper import (
+    VECTORIZE_MIN_ROWS, classify_category, derive_numeric_fields, parse_price, parse_square_meters
+)
+
+PRICES = [
+    ("1 200 000 zł", 1200000.0),
+    ("1.200.000 zł", 1200000.0),
+    ("1,200.50", 1200.5),
+    ("1200,50 zł", 1200.5),
+    ("1\xa0200,50\xa0zł", 1200.5),
+    ("850 000 złdo negocjacji", 850000.0),
+    ("2 499,00 zł", 2499.0),
+    ("Zamienię", 0.0),
+    ("", 0.0),
+    (None, 0.0),
+]
+
+AREAS = [
+    ("Mieszkanie 50,5 mkw", 50.5),
+    ("Dom 100 m2 Warszawa", 100.0),
+    ("Dom wolnostojący 180 m² z ogrodem", 180.0),
+    ("Kawalerka 28 metrów", 28.0),
+    ("Działka budowlana 1000m2", 1000.0),
+    ("Mieszkanie 3 pokoje 60 M2", 60.0),
+    # The first area wins whatever its unit
+    ("Dom 120 mkw, działka 800 m2", 120.0),
+    ("Mieszkanie bez metrażu", 0.0),
+]
+
+
+@pytest.mark.parametrize('text, expected', PRICES)
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', AREAS)
+def test_parse_square_meters(text, expected):
+    assert parse_square_meters(text) == expected
+
+
+def test_arrow_path_matches_scalar_parsers():
+    pytest.importorskip('pyarrow')
+    # Every pairing of the cases above and some generated ones, which is well past the Arrow threshold
+    price_texts = [text for text, _ in PRICES] + [f"{n * 1250:,} zł".replace(',', ' ') for n in range(1, 50)]
+    price_texts += ["1.250,5 zł", "3,5", "12.345", "99.9", "1'200 CHF", "od 1 500 zł"]
+    titles = [text for text, _ in AREAS] + [f"Mieszkanie {n},{n % 10} m2" for n in range(1, 50)]
+    pairs = list(itertools.product(titles, price_texts))
+    assert len(pairs) > VECTORIZE_MIN_ROWS
+    titles, price_texts = [title for title, _ in pairs], [text for _, text in pairs]
+
+    prices, areas, price_per_sqm = derive_numeric_fields(titles, price_texts)
+
+    expected_prices = np.array([parse_price(text) for text in price_texts])
+    expected_areas = np.array([parse_square_meters(title) for title in titles])
+    np.testing.assert_array_equal(prices, expected_prices)
+    np.testing.assert_array_equal(areas, expected_areas)
+    valid = (expected_prices > 0) & (expected_areas > 0)
+    np.testing.assert_allclose(price_per_sqm, np.where(valid, expected_prices / np.where(valid, expected_areas, 1), 0))
+
+
+@pytest.mark.parametrize('title, expected', [
+    ("Laptop Lenovo ThinkPad T14", 'electronics'),
+    ("Rower miejski Kross", 'vehicles'),
+    ("Mieszkanie 50,5 mkw", 'real estate'),
+    ("Sofa rozkładana", 'furniture'),
+    ("Kurtka zimowa", 'fashion'),
+    ("Zegarek", 'other'),
+    # Categories are checked in order, so electronics wins over real estate
+    ("Telewizor z mieszkania", 'electronics'),
+])
+def test_classify_category(title, expected):
+    assert classify_category(title) == expected
@@ -0,0 +1,76 @@
+"""HTTP fetching: pages past the last one, pages that need the browser, failed requests and concurrent crawls."""
+import asyncio
+
+from classified_scrapper import ClassifiedScraper
+from conftest import read_checkpoint
+
+
+def test_empty_page_ends_phrase_without_browser(fixture_server, workdir, no_browser, run_options):
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_search.html',
+        '/oferty/q-dom/?page=2': 'olx_search.html',
+        '/oferty/q-dom/?page=3': 'olx_empty.html',
+    }
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+    assert scraper.run_scraper(["dom"], max_pages=4, **run_options) is True
+
+    assert no_browser == []
+    assert '/oferty/q-dom/?page=4' not in fixture_server.requests
+    assert scraper.phrase_counts['dom'] > 0
+    assert list(workdir.glob('dom_*.csv'))
+    assert list(workdir.glob('reports/dom/*.txt'))
+    assert read_checkpoint(workdir / 'listings.db', 'olx', 'dom')['completed']
+
+
+def test_streaming_run_stops_at_empty_page(fixture_server, workdir, no_browser, run_options):
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_search.html',
+        '/oferty/q-dom/?page=2': 'olx_empty.html',
+    }
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+    assert scraper.run_scraper(["dom"], max_pages=4, stream=True, **run_options) is True
+
+    assert no_browser == []
+    assert scraper.phrase_counts['dom'] == 4
+
+
+def test_page_without_results_container_falls_back_to_browser(fixture_server, workdir, no_browser):
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_js_shell.html',
+        '/oferty/q-dom/?page=2': 'olx_js_shell.html',
+    }
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+    # The browser can't start: the page is skipped instead of ending the process
+    assert scraper.fetch_search_page("dom", 1) is None
+    assert scraper.fetch_search_page("dom", 2) is None
+    assert len(no_browser) == 1
+    scraper.cleanup()
+
+
+def test_http_error_is_not_retried_in_browser(fixture_server, workdir, no_browser):
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+    assert scraper.fetch_search_page("missing", 1) is None
+    assert no_browser == []
+    scraper.cleanup()
+
+
+def test_concurrent_crawl_keeps_pages_after_failed_page(fixture_server, workdir, no_browser):
+    # Page 2 is not routed, so the server answers 404
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_search.html',
+        '/oferty/q-dom/?page=3': 'olx_search.html',
+        '/oferty/q-dom/?page=4': 'olx_empty.html',
+    }
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+    try:
+        results = asyncio.run(scraper.crawl_async(["dom"], max_pages=5, concurrency=2))
+    finally:
+        scraper.cleanup()
+
+    assert len(results['dom']) == 8
+    assert scraper.failed_pages == {'dom': {2}}
+    assert no_browser == []
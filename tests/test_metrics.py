@@ -0,0 +1,19 @@
+"""Run metrics: stage timings recorded in worker processes reach the parent."""
+from classified_scrapper import ClassifiedScraper
+
+
+def test_parse_worker_timings_are_recorded(fixture_server, workdir, run_options):
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_search.html',
+        '/oferty/q-dom/?page=2': 'olx_search.html',
+        '/oferty/q-dom/?page=3': 'olx_empty.html',
+    }
+    scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+    assert scraper.run_scraper(['dom'], max_pages=4, parse_workers=1, **run_options)
+
+    totals = scraper.metrics.stage_totals()
+    assert totals['parse'][0] == 3
+    assert totals['enrich'][0] == 3
+    assert totals['parse_wait'][0] == 3
+    assert scraper.phrase_counts['dom'] == 8
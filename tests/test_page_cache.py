@@ -0,0 +1,76 @@
+"""PageCache: fresh hits, TTL expiry with ETag revalidation, offline replay and LRU eviction."""
+import os
+
+from classified_scrapper import ClassifiedScraper, PageCache
+from conftest import read_fixture
+
+
+def cached_scraper(fixture_server, tmp_path, **options):
+    """A scraper caching pages from the fixture server in tmp_path/cache."""
+    return ClassifiedScraper(site="olx", base_url=fixture_server.base_url, cache_dir=str(tmp_path / 'cache'), **options)
+
+
+def test_fresh_page_is_served_from_cache(fixture_server, tmp_path):
+    fixture_server.routes = {'/oferty/q-dom/': 'olx_search.html'}
+    scraper = cached_scraper(fixture_server, tmp_path, cache_ttl=3600)
+    try:
+        first = scraper.fetch_search_page("dom")
+        assert scraper.fetch_search_page("dom") == first == read_fixture('olx_search.html')
+    finally:
+        scraper.cleanup()
+    assert fixture_server.statuses == [200]
+
+
+def test_expired_page_is_revalidated_with_etag(fixture_server, tmp_path):
+    fixture_server.routes = {'/oferty/q-dom/': 'olx_search.html'}
+    scraper = cached_scraper(fixture_server, tmp_path, cache_ttl=0)
+    try:
+        scraper.fetch_search_page("dom")
+        # Unchanged: the server answers 304 and the cached page is used
+        assert scraper.fetch_search_page("dom") == read_fixture('olx_search.html')
+        assert fixture_server.statuses == [200, 304]
+
+        # Changed: the ETag no longer matches, so the new page replaces the cached one
+        fixture_server.routes['/oferty/q-dom/'] = 'olx_empty.html'
+        assert scraper.fetch_search_page("dom") == read_fixture('olx_empty.html')
+        assert scraper.page_cache.get(scraper.build_search_url("dom"))['html'] == read_fixture('olx_empty.html')
+        assert fixture_server.statuses == [200, 304, 200]
+    finally:
+        scraper.cleanup()
+
+
+def test_offline_run_replays_cached_pages_only(fixture_server, tmp_path):
+    fixture_server.routes = {'/oferty/q-dom/': 'olx_search.html'}
+    scraper = cached_scraper(fixture_server, tmp_path, cache_ttl=0)
+    try:
+        scraper.fetch_search_page("dom")
+    finally:
+        scraper.cleanup()
+
+    # Even an expired page is replayed, and nothing is requested
+    scraper = cached_scraper(fixture_server, tmp_path, cache_ttl=0, offline=True)
+    try:
+        assert scraper.fetch_search_page("dom") == read_fixture('olx_search.html')
+        assert scraper.fetch_search_page("dom", 2) is None
+    finally:
+        scraper.cleanup()
+    assert fixture_server.requests == ['/oferty/q-dom/']
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    html = read_fixture('olx_search.html')
+    cache = PageCache(str(tmp_path / 'cache'))
+    try:
+        cache.put("https://www.olx.pl/a", html)
+        size = cache.conn.execute('SELECT size FROM pages').fetchone()[0]
+        # Room for two pages
+        cache.max_bytes = 2 * size + size // 2
+        cache.put("https://www.olx.pl/b", html)
+        assert cache.get("https://www.olx.pl/a")
+
+        cache.put("https://www.olx.pl/c", html)
+        assert cache.get("https://www.olx.pl/b") is None
+        assert cache.get("https://www.olx.pl/a") and cache.get("https://www.olx.pl/c")
+        assert not os.path.exists(cache._path(cache._key("https://www.olx.pl/b")))
+    finally:
+        cache.close()
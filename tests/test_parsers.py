@@ -0,0 +1,43 @@
+"""Parser backends: lxml must produce exactly what BeautifulSoup does on saved pages."""
+import pytest
+
+from classified_scrapper import SITE_ADAPTERS, ClassifiedScraper
+from conftest import read_fixture
+
+SEARCH_PAGES = [('olx', 'olx_search.html'), ('allegro', 'allegro_search.html')]
+EMPTY_PAGES = [('olx', 'olx_empty.html'), ('allegro', 'allegro_empty.html')]
+
+
+@pytest.mark.parametrize('site, fixture', SEARCH_PAGES)
+def test_backends_extract_identical_cards(site, fixture):
+    adapter = SITE_ADAPTERS[site]
+    page = read_fixture(fixture)
+
+    cards = adapter.extract_lxml(page)
+
+    assert len(cards) >= 3
+    assert cards == adapter.extract_bs4(page)
+
+
+@pytest.mark.parametrize('site, fixture', SEARCH_PAGES)
+def test_backends_produce_identical_records(site, fixture):
+    page = read_fixture(fixture)
+    records = {}
+    for backend in ('lxml', 'html.parser'):
+        scraper = ClassifiedScraper(site=site, parser_backend=backend)
+        records[backend] = [
+            {key: value for key, value in record.items() if key != 'scraped_date'}
+            for record in scraper.parse_listings(page, 'test')
+        ]
+
+    assert records['lxml']
+    assert records['lxml'] == records['html.parser']
+
+
+@pytest.mark.parametrize('site, fixture', EMPTY_PAGES)
+def test_backends_find_no_cards_on_empty_pages(site, fixture):
+    adapter = SITE_ADAPTERS[site]
+    page = read_fixture(fixture)
+
+    assert adapter.extract_lxml(page) == []
+    assert adapter.extract_bs4(page) == []
@@ -0,0 +1,28 @@
+"""Queue workers against a local server: empty pages, failed fetches and a missing browser."""
+from classified_scrapper import ClassifiedScraper, TaskQueue, read_task_results
+
+
+def test_worker_skips_after_empty_page_and_retries_failures(fixture_server, workdir, no_browser):
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_search.html',
+        '/oferty/q-dom/?page=2': 'olx_empty.html',
+        # Needs the browser, which can't start
+        '/oferty/q-js/': 'olx_js_shell.html',
+        # q-missing pages are 404s
+    }
+    queue = TaskQueue(str(workdir / 'tasks.db'), max_attempts=2).connect()
+    try:
+        assert queue.enqueue('olx', ['dom', 'js', 'missing'], max_pages=3) == 9
+        scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+
+        stats = scraper.run_queue_worker(queue, results_dir=str(workdir / 'results'), worker_id='w1',
+                                         requests_per_second=100, poll=0)
+
+        assert queue.counts('olx') == {'done': 2, 'skipped': 1, 'failed': 6}
+        assert stats == {'done': 2, 'failed': 12, 'listings': 4}
+        assert len(no_browser) == 1
+        results = list((workdir / 'results' / 'olx').glob('*.jsonl.gz'))
+        assert len(results) == 1
+        assert len(read_task_results(str(results[0]))) == 4
+    finally:
+        queue.close()
@@ -0,0 +1,52 @@
+"""AdaptiveRateLimiter: speeding up on healthy responses and backing off on blocks."""
+import time
+
+import pytest
+
+from classified_scrapper import AdaptiveRateLimiter
+
+URL = "https://www.olx.pl/oferty/q-dom/"
+
+
+def pause(limiter):
+    """Seconds until the host may be requested again."""
+    return limiter.hosts['www.olx.pl']['next_slot'] - time.monotonic()
+
+
+def test_healthy_responses_raise_rate_up_to_max_rate():
+    limiter = AdaptiveRateLimiter(initial_rate=1.0, max_rate=1.25, increase=0.1)
+    for _ in range(2):
+        assert limiter.record(URL, 200) is False
+    assert limiter.stats()['www.olx.pl']['current_rate'] == pytest.approx(1.2)
+    limiter.record(URL, 200)
+    assert limiter.stats()['www.olx.pl']['current_rate'] == 1.25
+
+
+def test_fast_initial_rate_is_not_cut_to_default_max_rate():
+    limiter = AdaptiveRateLimiter(initial_rate=100.0)
+    limiter.record(URL, 200)
+    assert limiter.stats()['www.olx.pl']['current_rate'] == 100.0
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_block_halves_rate_and_pauses_host(status):
+    limiter = AdaptiveRateLimiter(initial_rate=2.0, backoff=30.0)
+    assert limiter.record(URL, status) is True
+    assert limiter.stats()['www.olx.pl']['current_rate'] == 1.0
+    assert 29 < pause(limiter) <= 30
+
+    # Consecutive blocks double the pause
+    limiter.record(URL, status)
+    assert 59 < pause(limiter) <= 60
+    assert limiter.stats()['www.olx.pl']['backoff_events'] == 2
+
+
+def test_retry_after_extends_pause():
+    limiter = AdaptiveRateLimiter(backoff=30.0)
+    limiter.record(URL, 429, retry_after="120")
+    assert 119 < pause(limiter) <= 120
+
+    # A Retry-After date is not parsed, leaving the usual backoff
+    limiter = AdaptiveRateLimiter(backoff=30.0)
+    limiter.record(URL, 429, retry_after="Wed, 21 Oct 2026 07:28:00 GMT")
+    assert 29 < pause(limiter) <= 30
@@ -0,0 +1,34 @@
+"""Streaming runs must store and aggregate the same listings as runs that keep them in memory."""
+import pandas as pd
+import pytest
+
+from classified_scrapper import ClassifiedScraper
+
+
+@pytest.mark.parametrize('excel', [True, False])
+def test_streaming_aggregates_match_in_memory_run(fixture_server, workdir, monkeypatch, run_options, excel):
+    fixture_server.routes = {
+        '/oferty/q-dom/': 'olx_search.html',
+        '/oferty/q-dom/?page=2': 'olx_empty.html',
+    }
+    summaries = {}
+    for stream in (False, True):
+        # Separate directories, so runs within the same second don't share output files
+        run_dir = workdir / f"stream_{stream}"
+        run_dir.mkdir()
+        monkeypatch.chdir(run_dir)
+        reports = []
+        scraper = ClassifiedScraper(site="olx", base_url=fixture_server.base_url)
+        monkeypatch.setattr(scraper, 'write_report', lambda phrase, aggregates: reports.append(aggregates))
+        if stream and not excel:
+            # Without Excel the statistics come from the columns collected while streaming
+            monkeypatch.setattr(pd, 'read_csv', lambda *args, **kwargs: pytest.fail("CSV read back"))
+
+        assert scraper.run_scraper(['dom'], region="Warszawa", stream=stream, **{**run_options, 'excel': excel})
+
+        assert scraper.phrase_counts == {'dom': 4}
+        summaries[stream] = reports[0]
+
+    pd.testing.assert_series_equal(pd.Series(summaries[True]['summary']), pd.Series(summaries[False]['summary']))
+    assert summaries[True]['charts'].keys() == summaries[False]['charts'].keys()
+    assert len(list(workdir.glob('*/dom_*.xlsx'))) == (2 if excel else 0)